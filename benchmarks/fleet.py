@@ -0,0 +1,72 @@
+"""
+This module contains the synthetic fleet of the benchmarks, made by scaling
+the one year fixture of the tests to a number of sites and years.
+"""
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'tests', 'fixtures',
+    'one_year_power_signals_1.csv')
+SAMPLING_INTERVAL_MILLISECONDS = 5 * 60 * 1000
+# Midnight of 2015-01-01 in PST, as timestamps in Cassandra database are UTC:
+START_TIMESTAMP = int((datetime(2015, 1, 1, 8) -
+    datetime(1970, 1, 1)).total_seconds() * 1000)
+
+class Fleet:
+    """
+    Measurements of ac_power of sites, each one the fixture repeated for a
+    number of years with a scale and noise of its own.
+
+    Arguments
+    -----------------
+    number_of_sites : integer
+        Number of sites.
+    number_of_years : integer
+        Number of years of each site.
+    seed : integer
+        Seed of the noise.
+    """
+
+    def __init__(self, number_of_sites, number_of_years, seed=0):
+        power_signals = np.loadtxt(FIXTURE_PATH, delimiter=',')
+        one_year = power_signals.ravel(order='F')
+        random_generator = np.random.default_rng(seed)
+        self.sites = ['SYNTH{:07d}'.format(i) for i in range(number_of_sites)]
+        number_of_samples = len(one_year) * number_of_years
+        self.timestamps = START_TIMESTAMP + np.arange(number_of_samples,
+            dtype=np.int64) * SAMPLING_INTERVAL_MILLISECONDS
+        self.values = {}
+        for site in self.sites:
+            values = np.tile(one_year, number_of_years) * (
+                random_generator.uniform(0.5, 1.5))
+            values += random_generator.normal(0, 0.01, len(values)) * (
+                values > 0)
+            self.values[site] = values
+
+    @property
+    def number_of_rows(self):
+        return len(self.timestamps) * len(self.sites)
+
+    def get_partitions(self):
+        """
+        Returns
+        -------
+        dictionary
+            Partitions of measurement_raw, as SyntheticSession takes them.
+        """
+        return {(site, 'ac_power'): (self.timestamps, self.values[site])
+            for site in self.sites}
+
+    def write_csv_files(self, directory):
+        """
+        Writes one PVOutput style CSV file per site, with local timestamps.
+        """
+        local_times = pd.to_datetime(self.timestamps - 8 * 60 * 60 * 1000,
+            unit='ms').strftime('%Y-%m-%d %H:%M:%S')
+        for site in self.sites:
+            pd.DataFrame({'Date-Time': local_times,
+                'ac_power': self.values[site]}).to_csv(
+                os.path.join(directory, site + '.csv'), index=False)
@@ -0,0 +1,305 @@
+"""
+This module contains the benchmark harness of the retrieval pipeline. A
+synthetic fleet, scaled from the fixture of the tests, is served by an
+in-process stand-in for Cassandra, and each stage is timed separately:
+
+fetch: Paged scan of all sites by PagedScanner, with pages as columns.
+decode: Decoding of pages of row tuples into column buffers, as done when
+    the NumPy protocol handler of the driver is not available.
+transform: AllDataTransformation.transform of the database.
+sampling: Random choice of days among the power matrices of the sites.
+get: DataRetrieval.get from the stand-in and from CSV files of the fleet.
+
+Throughput and peak memory of each stage are reported, and compared with a
+stored baseline.
+
+Usage: python -m benchmarks.run --sites 4 --years 2 --baseline baseline.json
+"""
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.fleet import Fleet
+from benchmarks.synthetic_session import SyntheticSession,\
+    SyntheticSessionManager, MEASUREMENT_COLUMNS
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.database.utilities.columnar import\
+    columnar_factory, ColumnBuffer
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine
+from solar_data_pipeline.database.utilities.paged_scanner import\
+    PagedScanner, MEASUREMENT_DTYPES
+
+STAGES = ('fetch', 'decode', 'transform', 'sampling', 'get')
+FETCH_SIZE = 5000
+
+class BenchmarkCassandraDataAccess(CassandraDataAccess):
+    """
+    CassandraDataAccess of the synthetic fleet, which lists the sites of the
+    fleet instead of scanning the database.
+    """
+
+    def __init__(self, sites, session):
+        super().__init__('127.0.0.1', fetch_size=FETCH_SIZE,
+            random_generator=0)
+        self._sites = sites
+        self._set_session_manager(SyntheticSessionManager(session))
+
+    def get_sites(self, quality_thresholds=None):
+        return np.array(self._sites)
+
+class _BenchmarkContext:
+    """
+    Inputs of the stages, made when first needed by a stage, so that any
+    subset of the stages can be run.
+    """
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self._session = None
+        self._measurement_columns_list = None
+        self._power_matrices = None
+        self._csv_directory = None
+
+    def get_session(self):
+        if self._session is None:
+            self._session = SyntheticSession(self.fleet.get_partitions())
+        return self._session
+
+    def scan(self):
+        session = self.get_session()
+        return PagedScanner(session, fetch_size=FETCH_SIZE,
+            fetch_engine=ConcurrentFetchEngine(session)).scan_sites(
+            self.fleet.sites)
+
+    def get_measurement_columns_list(self):
+        if self._measurement_columns_list is None:
+            self._measurement_columns_list = self.scan()
+        return self._measurement_columns_list
+
+    def transform(self):
+        from solar_data_pipeline.database.utilities.data_transformation\
+            import AllDataTransformation
+        data_transformation = AllDataTransformation()
+        return [data_transformation.transform(measurement_columns,
+            datetimekey='ts', ac_power_key='ac_power_01')
+            for measurement_columns in self.get_measurement_columns_list()]
+
+    def get_power_matrices(self):
+        if self._power_matrices is None:
+            self._power_matrices = self.transform()
+        return self._power_matrices
+
+    def get_csv_directory(self):
+        if self._csv_directory is None:
+            self._csv_directory = tempfile.TemporaryDirectory()
+            self.fleet.write_csv_files(self._csv_directory.name)
+        return self._csv_directory.name
+
+    def close(self):
+        if self._session is not None:
+            self._session.shutdown()
+        if self._csv_directory is not None:
+            self._csv_directory.cleanup()
+
+def run_benchmarks(number_of_sites, number_of_years, stages=STAGES,
+    repeat=3, trace_memory=False):
+    """
+    Arguments
+    -----------------
+    number_of_sites : integer
+        Number of sites of the synthetic fleet.
+    number_of_years : integer
+        Number of years of each site.
+    stages : list
+        Names of stages to run, among STAGES.
+    repeat : integer
+        Number of runs of each stage. The fastest run is reported.
+    trace_memory : boolean
+        Whether to run each stage once more with tracemalloc, to report its
+        peak allocation.
+
+    Returns
+    -------
+    dictionary
+        Report with the parameters and, for each stage, the time in seconds,
+        number of rows or days processed, throughput per second, peak RSS of
+        the process in megabytes and, if traced, peak allocation in
+        megabytes.
+    """
+    fleet = Fleet(number_of_sites, number_of_years)
+    context = _BenchmarkContext(fleet)
+    report = {'parameters': {'number_of_sites': number_of_sites,
+        'number_of_years': number_of_years, 'repeat': repeat},
+        'stages': {}}
+    try:
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError("Stage must be one of: " + ", ".join(STAGES))
+            run, number_of_items, unit = _prepare_stage(stage, context)
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                seconds.append(time.perf_counter() - start)
+            result = {'seconds': min(seconds),
+                'mean_seconds': sum(seconds) / len(seconds),
+                unit: number_of_items,
+                'throughput': number_of_items / max(min(seconds), 1e-9),
+                'throughput_unit': unit + '/s',
+                'peak_rss_megabytes': _get_peak_rss_megabytes()}
+            if trace_memory:
+                tracemalloc.start()
+                try:
+                    run()
+                    result['peak_allocated_megabytes'] = (
+                        tracemalloc.get_traced_memory()[1] / 2 ** 20)
+                finally:
+                    tracemalloc.stop()
+            report['stages'][stage] = result
+    finally:
+        context.close()
+    return report
+
+def _prepare_stage(stage, context):
+    """
+    Makes the inputs of the stage, which are not timed.
+
+    Returns
+    -------
+    tuple
+        Function running the stage, number of items it processes, and name
+        of the items.
+    """
+    fleet = context.fleet
+    if stage == 'fetch':
+        return context.scan, fleet.number_of_rows, 'rows'
+    if stage == 'decode':
+        pages = _make_row_pages(context.get_measurement_columns_list())
+        return lambda: _decode(pages), fleet.number_of_rows, 'rows'
+    if stage == 'transform':
+        context.get_measurement_columns_list()
+        return context.transform, fleet.number_of_rows, 'rows'
+    if stage == 'sampling':
+        power_matrices = dict(zip(fleet.sites, context.get_power_matrices()))
+        data_access = CassandraDataAccess('127.0.0.1', random_generator=0)
+        number_of_days = next(iter(power_matrices.values())).shape[1]
+        def run():
+            random_choice_list = data_access._construct_random_choice_list(
+                fleet.sites, number_of_days)
+            data_access._random_choice(power_matrices, random_choice_list,
+                number_of_days)
+        return run, number_of_days, 'days'
+    directory = context.get_csv_directory()
+    def run():
+        from solar_data_pipeline.data_retrieval import DataRetrieval
+        from solar_data_pipeline.file.csv import CsvAccess
+        data_retrieval = DataRetrieval(random_generator=0)
+        data_retrieval._set_cassandra_data_access(
+            BenchmarkCassandraDataAccess(fleet.sites,
+            context.get_session()))
+        data_retrieval._set_csv_access(CsvAccess(directory))
+        data_retrieval.get(partition_ratio={'cassandra': 0.5, 'file': 0.5})
+    return run, 2 * fleet.number_of_rows, 'rows'
+
+def _make_row_pages(measurement_columns_list):
+    pages = []
+    for measurement_columns in measurement_columns_list:
+        columns = [measurement_columns.sensor, measurement_columns.ts,
+            measurement_columns.meas_val_f]
+        for start in range(0, len(measurement_columns), FETCH_SIZE):
+            pages.append(list(zip(*[column[start:start + FETCH_SIZE].tolist()
+                for column in columns])))
+    return pages
+
+def _decode(pages):
+    column_buffer = ColumnBuffer(MEASUREMENT_DTYPES, capacity=FETCH_SIZE)
+    for page in pages:
+        column_buffer.append_page(columnar_factory(MEASUREMENT_COLUMNS, page))
+    return column_buffer
+
+def _get_peak_rss_megabytes():
+    # Kilobytes on Linux, bytes on macOS:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak_rss / 2 ** 20
+    return peak_rss / 2 ** 10
+
+def compare_with_baseline(report, baseline, tolerance=0.2):
+    """
+    Arguments
+    -----------------
+    report : dictionary
+        Report of run_benchmarks.
+    baseline : dictionary
+        Report of an earlier run, with the same parameters.
+    tolerance : float
+        Fraction by which throughput may fall below the baseline.
+
+    Returns
+    -------
+    list
+        Descriptions of the stages whose throughput fell below the baseline
+        by more than the tolerance.
+    """
+    regressions = []
+    for stage, result in report['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+        baseline_throughput = baseline['stages'][stage]['throughput']
+        if result['throughput'] < (1 - tolerance) * baseline_throughput:
+            regressions.append("{}: {:.0f} {} against {:.0f} in baseline"
+                .format(stage, result['throughput'],
+                result['throughput_unit'], baseline_throughput))
+    return regressions
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the retrieval pipeline.")
+    parser.add_argument('--sites', type=int, default=4,
+        help="Number of sites of the synthetic fleet.")
+    parser.add_argument('--years', type=int, default=1,
+        help="Number of years of each site.")
+    parser.add_argument('--stages', default=','.join(STAGES),
+        help="Comma separated stages to run.")
+    parser.add_argument('--repeat', type=int, default=3,
+        help="Number of runs of each stage.")
+    parser.add_argument('--trace-memory', action='store_true',
+        help="Report peak allocation of each stage with tracemalloc.")
+    parser.add_argument('--output', help="Path of JSON report to write.")
+    parser.add_argument('--baseline',
+        help="Path of JSON report to compare with.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help="Fraction by which throughput may fall below the baseline.")
+    arguments = parser.parse_args(arguments)
+
+    report = run_benchmarks(arguments.sites, arguments.years,
+        stages=arguments.stages.split(','), repeat=arguments.repeat,
+        trace_memory=arguments.trace_memory)
+    for stage, result in report['stages'].items():
+        print("{:10s} {:10.3f} s {:14.0f} {:8s} {:10.1f} MB peak RSS".format(
+            stage, result['seconds'], result['throughput'],
+            result['throughput_unit'], result['peak_rss_megabytes']))
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        if baseline['parameters'] != report['parameters']:
+            print("Baseline was run with other parameters: " +
+                json.dumps(baseline['parameters']))
+        regressions = compare_with_baseline(report, baseline,
+            tolerance=arguments.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
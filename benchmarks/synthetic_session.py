@@ -0,0 +1,89 @@
+"""
+This module contains an in-process stand-in for Cassandra driver Session,
+serving the measurements of a synthetic fleet with the queries of
+PagedScanner. It is the FakeSession of the tests, with statements, paging and
+callbacks delivered on a separate thread, except that partitions are kept as
+sorted NumPy columns instead of rows, so that a query is a binary search and
+the time measured is the time of the pipeline, not of the stand-in. Pages are
+either columns, as the NumPy protocol handler makes them, or row tuples
+decoded by columnar_factory when they are delivered, as the row factory of
+the columnar execution profile does.
+"""
+import numpy as np
+from solar_data_pipeline.database.utilities.columnar import\
+    columnar_factory, COLUMNAR_PROFILE
+from solar_data_pipeline.database.utilities import paged_scanner
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager
+
+MEASUREMENT_COLUMNS = ('sensor', 'ts_ms', 'meas_val_f')
+
+class SyntheticSession(FakeSession):
+    """
+    Arguments
+    -----------------
+    partitions : dictionary
+        Key: Tuple of name of site and name of measurement.
+        Value: Tuple of arrays of timestamps in milliseconds, sorted, and of
+        values.
+    decode_rows : boolean
+        Whether pages are made of row tuples decoded by columnar_factory,
+        instead of columns sliced from the partition.
+    sensor : string
+        Name of sensor of all samples.
+    """
+
+    def __init__(self, partitions, decode_rows=False, sensor='sensor_1'):
+        super().__init__([])
+        self._partitions = partitions
+        self._decode_rows = decode_rows
+        self._sensor = sensor
+
+    def _make_pages(self, statement, execution_profile=None):
+        cql = statement.cql
+        site, meas_name = statement.values[:2]
+        timestamps, values = self._partitions.get((site, meas_name),
+            (np.empty(0, dtype=np.int64), np.empty(0)))
+
+        if cql == paged_scanner.FIRST_TS_CQL:
+            return [self._make_page(('ts_ms',), [timestamps[:1]],
+                execution_profile)]
+        if cql == paged_scanner.LAST_TS_CQL:
+            return [self._make_page(('ts_ms',), [timestamps[-1:]],
+                execution_profile)]
+        if cql == paged_scanner.PARTITION_CQL:
+            start, end = 0, len(timestamps)
+        elif cql in (paged_scanner.WINDOW_CQL, paged_scanner.LAST_WINDOW_CQL):
+            lower_bound, upper_bound = statement.values[2:4]
+            side = 'right' if cql == paged_scanner.LAST_WINDOW_CQL else 'left'
+            start = np.searchsorted(timestamps, lower_bound, side='left')
+            end = np.searchsorted(timestamps, upper_bound, side=side)
+        else:
+            raise ValueError("Query is not supported: " + cql)
+
+        page_size = statement.fetch_size or 5000
+        pages = []
+        for page_start in range(start, end, page_size):
+            page_end = min(page_start + page_size, end)
+            pages.append(self._make_page(MEASUREMENT_COLUMNS, [
+                np.full(page_end - page_start, self._sensor, dtype=object),
+                timestamps[page_start:page_end],
+                values[page_start:page_end]], execution_profile))
+        return pages or [self._make_page(MEASUREMENT_COLUMNS,
+            [np.empty(0, dtype=object), np.empty(0, dtype=np.int64),
+             np.empty(0)], execution_profile)]
+
+    def _make_page(self, names, columns, execution_profile):
+        if execution_profile != COLUMNAR_PROFILE:
+            raise ValueError("Only the columnar execution profile is " +
+                "supported.")
+        if self._decode_rows:
+            # Rows are made and decoded when the page is delivered:
+            return lambda: columnar_factory(names, list(zip(*[
+                column.tolist() for column in columns])))
+        return dict(zip(names, columns))
+
+class SyntheticSessionManager(FakeSessionManager):
+    """
+    Stand-in for SessionManager of solar_data_pipeline.database.session.
+    """
@@ -130,7 +130,7 @@ setup(
     #
     #   py_modules=["my_module"],
     #
-    packages=find_packages(exclude=['tests', 'data', 'docs', 'notebooks']),  # Required
+    packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'data', 'docs', 'notebooks']),  # Required
 
     # Specify which Python versions you support. In contrast to the
     # 'Programming Language' classifiers above, 'pip install' will check this
@@ -146,7 +146,7 @@ setup(
     #
     # For an analysis of "install_requires" vs pip's requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
-    install_requires=['numpy>=1.16', 'pandas', 'cassandra-driver', 'solar-data-tools', 'statistical-clear-sky'],  # Optional
+    install_requires=['numpy>=1.17', 'pandas', 'cassandra-driver', 'solar-data-tools', 'statistical-clear-sky'],  # Optional
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). Users will be able to install these using the "extras"
@@ -156,10 +156,9 @@ setup(
     #
     # Similar to `install_requires` above, these must be valid existing
     # projects.
-    # extras_require={  # Optional
-    #     'dev': ['check-manifest'],
-    #     'test': ['coverage'],
-    # },
+    extras_require={  # Optional
+        'parquet': ['pyarrow'],
+    },
 
     # If there are data files included in your packages that need to be
     # installed, specify them here.
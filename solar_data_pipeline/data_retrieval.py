@@ -2,16 +2,49 @@
 This module contains the client facing class for data retrieval.
 Details are hidden or delegated to other classes.
 """
-import random
-import functools
 import numpy as np
+from solar_data_pipeline.utilities.dtype_policy import get_dtype_policy
+from solar_data_pipeline.utilities.instrumentation import Instrumentation
+from solar_data_pipeline.utilities.sampling import get_random_generator,\
+    repeat_sources, choose_sources, gather_columns, DAYS_STREAM,\
+    SOURCES_STREAM
 
 class DataRetrieval:
     """
     User facing class for data retrieval.
+
+    Arguments
+    -----------------
+    power_matrix_cache : PowerMatrixCache
+        Cache of power matrices on local disk, used by the data access
+        classes. Matrices are not cached if None.
+    random_generator : numpy.random.Generator or integer
+        Generator, or seed of a generator, of the random choice of days, for
+        reproducible samples. Seeded from the operating system if None.
+    site_catalog : SiteCatalog
+        Catalog of sites in Cassandra database, which sites are listed with
+        instead of scanning the database. Sites are scanned if None.
+    instrumentation : Instrumentation
+        Instrumentation the stages of retrieval are recorded with, down to
+        the steps of data transformations. Stages are not recorded if None.
+    dtype_policy : DtypePolicy or numpy dtype
+        Policy of types, e.g. DtypePolicy(np.float32) or
+        DtypePolicy(np.int16, scale=0.1), which values are decoded in and
+        power matrices are made, cached and returned in by all data sources.
+        float64 if None.
     """
 
-    def get(self, date_index_range=range(365), partition_ratio={}):
+    def __init__(self, power_matrix_cache=None, random_generator=None,
+        site_catalog=None, instrumentation=None, dtype_policy=None):
+        self._power_matrix_cache = power_matrix_cache
+        self._site_catalog = site_catalog
+        self._random_generator = get_random_generator(random_generator)
+        self._instrumentation = instrumentation if instrumentation is not\
+            None else Instrumentation()
+        self._dtype_policy = get_dtype_policy(dtype_policy)
+
+    def get(self, date_index_range=range(365), partition_ratio={},
+        sample_specification=None):
         """
         Get the uniformly distributed data from various data source of solar
         power signals data.
@@ -20,6 +53,14 @@ class DataRetrieval:
         -----------------
         date_index_range : range
             Range of dates.
+        partition_ratio : dictionary
+            Key: Name of data source.
+            Value: Between 0 ane 1. Ratio of data from that data source.
+        sample_specification : SampleSpecification
+            If given, its sites and partition ratio are used, and days and
+            data sources are chosen from streams of its seed instead of the
+            random generator of this object, so that the same sources give
+            the same sample in any process.
 
         Returns
         -------
@@ -28,23 +69,101 @@ class DataRetrieval:
             containing power signals with fixed time shift.
         """
 
-        # Simple implementation as a start with assumption with two data sources
-        # Transpose the matrix, so that in array of array format, each element
-        # of outer array contains daily signal:
-        data_1 = self._get_cassandra_data_access().retrieve().T
-        data_2 = self._get_csv_access().retrieve().T
-        #data_candidates = list(zip(data_1, data_2))
-        data_candidates = {"cassandra": data_1, "file": data_2}
+        with self._instrumentation.span('data_retrieval.get') as span:
+            random_generator = self._random_generator
+            retrieve_arguments = {}
+            if sample_specification is not None:
+                partition_ratio = dict(
+                    sample_specification.partition_ratio or {})
+                random_generator = sample_specification.make_random_generator(
+                    SOURCES_STREAM)
+                sites = sample_specification.sites
+                retrieve_arguments = {
+                    'sites': None if sites is None else list(sites),
+                    'random_generator':
+                    sample_specification.make_random_generator(DAYS_STREAM)}
+            # Simple implementation as a start with assumption with two data
+            # sources
+            with self._instrumentation.span('data_retrieval.cassandra'
+                ) as source_span:
+                data_1 = self._get_cassandra_data_access().retrieve(
+                    **retrieve_arguments)
+                source_span.add_data(data_1)
+            with self._instrumentation.span('data_retrieval.file'
+                ) as source_span:
+                data_2 = self._get_csv_access().retrieve()
+                source_span.add_data(data_2)
+            data_candidates = {"cassandra": data_1, "file": data_2}
+
+            with self._instrumentation.span('data_retrieval.sample'
+                ) as sample_span:
+                total_number_of_elements = data_1.shape[1]
+                random_choice_list = self._construct_random_choice_list(
+                    partition_ratio, total_number_of_elements)
+                power_matrix = self._random_choice(data_candidates,
+                    random_choice_list, total_number_of_elements,
+                    random_generator=random_generator)
+                sample_span.add_data(power_matrix)
+            span.add_data(power_matrix)
+            return power_matrix
+
+    def iter_sites(self, sites=None, start_time=None, end_time=None,
+        prefetch=1, days_per_block=None):
+        """
+        Iterates over the power matrices of sites in Cassandra database one
+        site at a time, so that fleet-wide jobs run in constant memory.
 
-        random_choice_list = self._construct_random_choice_list(
-            partition_ratio, len(data_1))
+        Keyword arguments
+        -----------------
+        sites : list
+            Name of sites. All sites if None.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        prefetch : integer
+            Number of sites prepared while the current one is consumed.
+        days_per_block : integer
+            If given, power matrices are yielded in blocks of this number of
+            days.
 
-        daily_signal_based_data = self._random_choice(data_candidates,
-            random_choice_list, len(data_1))
+        Returns
+        -------
+        generator
+            Tuples of name of site and power matrix with row for time of day
+            and column for dates.
+        """
+        return self._get_cassandra_data_access().iter_sites(sites=sites,
+            start_time=start_time, end_time=end_time, prefetch=prefetch,
+            days_per_block=days_per_block)
 
-        # Transpose to make the matrix with row of yearly data and column of
-        # daily data:
-        return daily_signal_based_data.T
+    def export_power_matrices(self, directory, sites=None, start_time=None,
+        end_time=None, file_format='parquet', time_shift_mode=None):
+        """
+        Exports the power matrices of sites in Cassandra database to a Parquet
+        or Arrow dataset partitioned by site, which read_power_matrices of
+        solar_data_pipeline.utilities.power_matrix_dataset reads offline.
+        Requires pyarrow.
+
+        Keyword arguments
+        -----------------
+        directory : string
+            Root directory of dataset.
+        sites : list
+            Name of sites. All sites if None.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        file_format : string
+            'parquet' or 'arrow'.
+        time_shift_mode : string
+            Mode of fix_time_shifts the power matrices are corrected with,
+            'fast' or 'accurate'. Not corrected if None.
+        """
+        self._get_cassandra_data_access().export_power_matrices(directory,
+            sites=sites, start_time=start_time, end_time=end_time,
+            file_format=file_format, time_shift_mode=time_shift_mode)
 
     def _construct_random_choice_list(self, partition_ratio,
                                       total_number_of_elements):
@@ -56,25 +175,42 @@ class DataRetrieval:
             Value: Between 0 ane 1. Ratio of data from that data source.
         total_number_of_elements: integer
             Total number of elements of the choice list.
+
+        Returns
+        -------
+        numpy array
+            Name of data source of each element.
         """
 
         if len(partition_ratio) == 0:
            # Simple implementation as a start with assumption
            # with two data sources
-           return ["cassandra", "file"]
+           return np.array(["cassandra", "file"])
         else:
-           return functools.reduce(lambda choice_list, key:
-               choice_list + (
-               [key] * int(partition_ratio[key] * total_number_of_elements)),
-               partition_ratio, [])
+           keys = list(partition_ratio)
+           return np.asarray(keys)[repeat_sources([
+               int(partition_ratio[key] * total_number_of_elements)
+               for key in keys])]
 
     def _random_choice(self, data_candidates, random_choice_list,
-        total_number_of_elements):
-        sample = np.random.choice(random_choice_list, total_number_of_elements,
-            replace=False)
-        return np.array(
-            [data_candidates[sample[i]][i]
-             for i in range(total_number_of_elements)])
+        total_number_of_elements, random_generator=None):
+        """
+        Chooses the data source of each day from random_choice_list without
+        replacement, and takes day i from the data source chosen for it, with
+        random_generator or the random generator of this object.
+
+        Returns
+        -------
+        numpy array
+            Matrix with row for time of day and column for dates.
+        """
+        keys, source_indices = np.unique(random_choice_list,
+            return_inverse=True)
+        if random_generator is None:
+            random_generator = self._random_generator
+        sample = choose_sources(source_indices, total_number_of_elements,
+            random_generator)
+        return gather_columns([data_candidates[key] for key in keys], sample)
 
     def _get_cassandra_data_access(self):
         if ((not hasattr(self, '_cassandra_data_access')) or
@@ -85,6 +221,12 @@ class DataRetrieval:
            cassandra_ip_address = '127.0.0.1'
            self._cassandra_data_access = CassandraDataAccess(
                cassandra_ip_address)
+           self._cassandra_data_access.set_power_matrix_cache(
+               self._power_matrix_cache)
+           self._cassandra_data_access.set_site_catalog(self._site_catalog)
+           self._cassandra_data_access.set_instrumentation(
+               self._instrumentation)
+           self._cassandra_data_access.set_dtype_policy(self._dtype_policy)
         return self._cassandra_data_access
 
     def _set_cassandra_data_access(self, data_access):
@@ -102,6 +244,8 @@ class DataRetrieval:
            # This will be read from configuration file:
            file_url = './test.csv'
            self._csv_access = CsvAccess(file_url)
+           self._csv_access.set_instrumentation(self._instrumentation)
+           self._csv_access.set_dtype_policy(self._dtype_policy)
         return self._csv_access
 
     def _set_csv_access(self, access):
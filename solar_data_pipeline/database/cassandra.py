@@ -1,18 +1,70 @@
 """
 This module contains the code to retrieve data from Cassandra database
 """
-import functools
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import numpy as np
-from cassandra.cqlengine import connection
-from cassandra.cqlengine.named import NamedTable
 from solar_data_pipeline.database.models.measurements import MeasurementRaw
+from solar_data_pipeline.utilities.data_trainsformation import\
+    DEFAULT_SAMPLING_INTERVAL_MINUTES
+from solar_data_pipeline.utilities.dtype_policy import get_dtype_policy
+from solar_data_pipeline.utilities.instrumentation import Instrumentation
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix,\
+    make_channel_matrices, get_first_day, measurement_arrays,\
+    MILLISECONDS_PER_DAY
+from solar_data_pipeline.utilities.sampling import get_random_generator,\
+    repeat_sources, choose_sources, gather_columns
+from solar_data_pipeline.utilities.time_shifts import fix_time_shifts,\
+    find_rolls
+
+# make_time_series localizes timestamps to PST:
+LOCALIZE_HOURS = -8
 
 class CassandraDataAccess:
 
-    def __init__(self, ip_address):
+    def __init__(self, ip_address, fetch_size=5000, days_per_scan_window=30,
+        max_requests_in_flight=32, request_timeout=30.0, number_of_retries=2,
+        random_generator=None, session_options=None):
+        """
+        Arguments
+        -----------------
+        ip_address : string
+            IP address of Cassandra cluster.
+        fetch_size : integer
+            Number of rows per page when scanning measurements.
+        days_per_scan_window : integer
+            Number of days of measurements scanned by one query.
+        max_requests_in_flight : integer
+            Maximum number of queries executed at the same time, across sites.
+        request_timeout : float
+            Timeout in seconds of each page request.
+        number_of_retries : integer
+            Number of times a failed query is retried.
+        random_generator : numpy.random.Generator or integer
+            Generator, or seed of a generator, of the random choice of days,
+            for reproducible samples. Seeded from the operating system if
+            None.
+        session_options : dictionary
+            Keyword arguments of SessionManager of
+            solar_data_pipeline.database.session, e.g. local_dc,
+            protocol_version and max_connections_per_host. The session
+            manager is shared by the process, thus all data accesses of one
+            cluster must give the same options, or none.
+        """
         self._ip_address = ip_address
+        self._session_options = session_options or {}
+        self._fetch_size = fetch_size
+        self._days_per_scan_window = days_per_scan_window
+        self._max_requests_in_flight = max_requests_in_flight
+        self._request_timeout = request_timeout
+        self._number_of_retries = number_of_retries
+        self._random_generator = get_random_generator(random_generator)
 
     def find_sites(self, site):
+        if self._get_site_catalog() is not None:
+            return self._get_refreshed_site_catalog().find_sites(site)
         self._set_up_connection()
         query = MeasurementRaw.objects.all()
         query = query.filter(site=site)
@@ -20,37 +72,477 @@ class CassandraDataAccess:
         return np.array([raw_measurement.site
             for raw_measurement in raw_measurement_list])
 
-    def get_sites(self):
+    def get_sites(self, quality_thresholds=None):
+        """
+        Arguments
+        -----------------
+        quality_thresholds : QualityThresholds
+            If given, only sites with enough days qualifying by the quality
+            scores in the site catalog are returned. Requires a site catalog
+            built with score_quality.
+
+        Returns
+        -------
+        numpy array
+            Name of sites.
+        """
+        with self._get_instrumentation().span('cassandra.get_sites') as span:
+            # The catalog replaces the scan of all partitions:
+            if self._get_site_catalog() is not None:
+                sites = self._get_refreshed_site_catalog().get_sites(
+                    quality_thresholds=quality_thresholds)
+            elif quality_thresholds is not None:
+                raise ValueError("Quality thresholds require a site catalog.")
+            else:
+                self._set_up_connection()
+                query = MeasurementRaw.objects.all()
+                raw_measurement_list = list(query.distinct(['site']))
+                sites = np.array([raw_measurement.site
+                    for raw_measurement in raw_measurement_list])
+            span.add_data(sites)
+            return sites
+
+    def retrieve(self, sites=None, start_time=None, end_time=None,
+        random_generator=None):
+        """
+        Arguments
+        -----------------
+        sites : list
+            Name of sites. All sites if None.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        random_generator : numpy.random.Generator
+            Generator of the random choice of days of this retrieval, e.g. a
+            stream of a SampleSpecification. The random generator of this
+            object if None.
+
+        Returns
+        -------
+        numpy array
+            Matrix with row for time of day and column for dates, with days
+            of the sites chosen at random.
+        """
+        instrumentation = self._get_instrumentation()
+        with instrumentation.span('cassandra.retrieve') as span:
+            self._set_up_connection()
+
+            sites = self._get_site_lists_for_retrieve(sites=sites)
+
+            data_candidates = self._get_data_candidate(sites,
+                start_time=start_time, end_time=end_time)
+
+            total_number_of_columns = data_candidates[sites[0]].shape[1]
+
+            with instrumentation.span('cassandra.sample') as sample_span:
+                random_choice_list = self._construct_random_choice_list(
+                    sites, total_number_of_columns)
+                power_matrix = self._random_choice(data_candidates,
+                    random_choice_list, total_number_of_columns,
+                    random_generator=random_generator)
+                sample_span.add_data(power_matrix)
+            span.add_data(power_matrix)
+            return power_matrix
+
+    def retrieve_channels(self, site, channels, start_time=None,
+        end_time=None, zero_nighttime=True, as_dictionary=False):
+        """
+        Retrieves several measurements and sensors of a site in one pass over
+        its partition, as power matrices on one time axis.
+
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        channels : list
+            Name of measurements, e.g. 'ac_power', or tuples of name of
+            measurement and name of sensor. For a name of measurement alone,
+            the first sensor with enough values is used, as for ac_power in
+            retrieve.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        zero_nighttime : boolean or list
+            Whether to set values at night to zero, for all channels or for
+            each channel. Should be False for channels such as temperature.
+        as_dictionary : boolean
+            Whether to return a dictionary of power matrices instead of an
+            array.
+
+        Returns
+        -------
+        numpy array or dictionary
+            Array with axis for time of day, for dates and for channels in
+            the order of channels. Or dictionary of the channels as given to
+            power matrices with row for time of day and column for dates, all
+            with the same dates.
+        """
+        channel_tuples = [(channel, None) if isinstance(channel, str)
+            else tuple(channel) for channel in channels]
+        meas_names = list(dict.fromkeys(meas_name
+            for meas_name, _ in channel_tuples))
         self._set_up_connection()
-        query = MeasurementRaw.objects.all()
-        raw_measurement_list = list(query.distinct(['site']))
-        return np.array([raw_measurement.site
-            for raw_measurement in raw_measurement_list])
 
-    def retrieve(self, sites=None, start_time=None, end_time=None):
+        instrumentation = self._get_instrumentation()
+        with instrumentation.span('cassandra.fetch', number_of_sites=1,
+            number_of_channels=len(channel_tuples)) as span:
+            measurement_columns = self._get_paged_scanner().scan_measurements(
+                [site], meas_names, start_time=start_time,
+                end_time=end_time)[0]
+            span.add_data(measurement_columns)
+        with instrumentation.span('cassandra.transform', site=site) as span:
+            span.add_data(measurement_columns)
+            power_matrices = make_channel_matrices(measurement_columns.ts,
+                measurement_columns.meas_val_f, measurement_columns.meas_name,
+                measurement_columns.sensor, channel_tuples,
+                sampling_interval_minutes=self._get_time_axis_interval(),
+                localize_hours=LOCALIZE_HOURS, zero_nighttime=zero_nighttime)
+        if as_dictionary:
+            return {channel if isinstance(channel, str) else tuple(channel):
+                power_matrices[:, :, i] for i, channel in enumerate(channels)}
+        return power_matrices
+
+    def iter_sites(self, sites=None, start_time=None, end_time=None,
+        prefetch=1, days_per_block=None):
+        """
+        Yields the power matrix of one site at a time, instead of holding the
+        matrices of all sites, so that memory does not grow with the number
+        of sites. The next sites are queried and transformed in a background
+        thread while the current one is consumed.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites. All sites if None.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        prefetch : integer
+            Number of sites prepared ahead of the consumer.
+        days_per_block : integer
+            If given, the power matrix of each site is yielded in blocks of
+            this number of days.
+
+        Returns
+        -------
+        generator
+            Tuples of name of site and power matrix, or block of days of power
+            matrix, in the order of sites.
+        """
+        self._set_up_connection()
+        sites = self._get_site_lists_for_retrieve(sites=sites)
+
+        site_iterator = iter(sites)
+        futures = deque()
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def submit(site):
+            futures.append((site, executor.submit(
+                self._query_power_for_given_site, site,
+                start_time=start_time, end_time=end_time)))
+
+        try:
+            for site in itertools.islice(site_iterator, prefetch + 1):
+                submit(site)
+            while len(futures) > 0:
+                site, future = futures.popleft()
+                power_matrix = future.result()
+                for next_site in itertools.islice(site_iterator, 1):
+                    submit(next_site)
+                if days_per_block is None:
+                    yield site, power_matrix
+                else:
+                    for i in range(0, power_matrix.shape[1], days_per_block):
+                        yield site, power_matrix[:, i:i + days_per_block]
+                del power_matrix
+        finally:
+            # Sites not consumed yet are not queried when the caller stops
+            # early:
+            for _, future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def export_power_matrices(self, directory, sites=None, start_time=None,
+        end_time=None, file_format='parquet', time_shift_mode=None):
+        """
+        Exports the power matrices of sites to a dataset partitioned by site,
+        one site at a time, which read_power_matrices reads without the
+        database. The time shift corrected on each day is recorded. Requires
+        pyarrow.
+
+        Arguments
+        -----------------
+        directory : string
+            Root directory of dataset.
+        sites : list
+            Name of sites. All sites if None.
+        start_time : datetime
+            Inclusive lower bound of time range.
+        end_time : datetime
+            Inclusive upper bound of time range.
+        file_format : string
+            'parquet' or 'arrow'.
+        time_shift_mode : string
+            Mode of fix_time_shifts the power matrices are corrected with
+            before they are written, 'fast' or 'accurate'. Power matrices are
+            written as transformed, with time shifts of zero, if None.
+        """
+        from solar_data_pipeline.utilities.power_matrix_dataset import\
+            write_power_matrix
+        self._set_up_connection()
+        sites = self._get_site_lists_for_retrieve(sites=sites)
+
+        for site in sites:
+            data_array = self._query_power_for_given_site_helper(site,
+                start_time=start_time, end_time=end_time)
+            # Values are written in watts, not in the counts of int16:
+            power_matrix, time_shifts = self._fix_time_shifts(
+                self._get_dtype_policy().decode(self._transform(data_array)),
+                time_shift_mode)
+            write_power_matrix(directory, site, power_matrix,
+                first_date=get_first_date(data_array,
+                self._get_time_axis_interval()),
+                time_shifts=time_shifts,
+                sampling_interval_minutes=self._get_time_axis_interval(),
+                file_format=file_format)
+
+    def export_fleet_store(self, fleet_store, sites=None, dtype=np.float64):
+        """
+        Exports the power matrices of sites to a fleet store, one site at a
+        time. The dates of the store are those between the first and last
+        timestamps of the sites, which are looked up first.
+
+        Arguments
+        -----------------
+        fleet_store : FleetStore
+            Fleet store, whose array is replaced.
+        sites : list
+            Name of sites. All sites if None.
+        dtype : DtypePolicy or numpy dtype
+            Policy or type of stored values, as for FleetStore.create.
+
+        Returns
+        -------
+        list
+            Name of exported sites.
+        """
+        self._set_up_connection()
+        sites = self._get_site_lists_for_retrieve(sites=sites)
+        time_bounds = [bounds for bounds in
+            self._get_paged_scanner().query_time_bounds(sites,
+            meas_name='ac_power') if bounds[0] is not None]
+
+        localize_milliseconds = LOCALIZE_HOURS * 60 * 60 * 1000
+        if len(time_bounds) == 0:
+            first_day, last_day = 0, -1
+        else:
+            # The first and last days are dropped as partial days:
+            first_day = min([first_timestamp for first_timestamp, _
+                in time_bounds]) + localize_milliseconds
+            first_day = first_day // MILLISECONDS_PER_DAY + 1
+            last_day = max([last_timestamp for _, last_timestamp
+                in time_bounds]) + localize_milliseconds
+            last_day = last_day // MILLISECONDS_PER_DAY - 1
+        fleet_store.create(sites, datetime(1970, 1, 1).date() +
+            timedelta(days=first_day), max(last_day - first_day + 1, 0),
+            number_of_rows=24 * 60 // self._get_time_axis_interval(),
+            dtype=dtype)
+
+        exported_sites = []
+        for site in sites:
+            data_array = self._query_power_for_given_site_helper(site)
+            power_matrix = self._get_dtype_policy().decode(
+                self._transform(data_array))
+            if power_matrix.shape[1] == 0:
+                continue
+            fleet_store.write(site, power_matrix, get_first_date(data_array,
+                self._get_time_axis_interval()))
+            exported_sites.append(site)
+        return exported_sites
+
+    def sync(self, power_matrix_store, sites=None):
+        """
+        Appends the days measured since the last synchronization to the power
+        matrices in the store. Only measurements after the high-water mark of
+        each site are queried, and only the new days are transformed, so that
+        a daily synchronization costs one day per site instead of the whole
+        history. The last day is left out until a later day is measured, since
+        it may be partial.
+
+        The power matrices are made by make_power_matrix with the same
+        settings as AllDataTransformation, except that the threshold for
+        nighttime values is relative to the maximum of the new days. They are
+        made in the value type of the dtype policy, and appended in watts
+        even if the policy stores int16.
+
+        Arguments
+        -----------------
+        power_matrix_store : PowerMatrixStore
+            Store of power matrices.
+        sites : list
+            Name of sites. All sites if None.
+
+        Returns
+        -------
+        dictionary
+            Key: Name of site.
+            Value: Number of appended days.
+        """
         self._set_up_connection()
 
         sites = self._get_site_lists_for_retrieve(sites=sites)
+        metadata_list = [power_matrix_store.get_metadata(site)
+            for site in sites]
+        start_times = [None if metadata is None else
+            datetime(1970, 1, 1) + timedelta(
+            milliseconds=metadata['high_water_mark'])
+            for metadata in metadata_list]
 
-        data_candidates = self._get_data_candidate(sites,
-            start_time=start_time, end_time=end_time)
+        data_arrays = self._scan_sites(sites, start_time=start_times)
+
+        localize_milliseconds = LOCALIZE_HOURS * 60 * 60 * 1000
+        number_of_appended_days = {}
+        for site, metadata, data_array in zip(sites, metadata_list,
+            data_arrays):
+            if len(data_array) == 0:
+                number_of_appended_days[site] = 0
+                continue
+            with self._get_instrumentation().span('cassandra.transform',
+                site=site) as span:
+                span.add_data(data_array)
+                if metadata is None:
+                    # The first day is usually partial, thus dropped:
+                    first_day = int((data_array.ts.min() +
+                        localize_milliseconds) // MILLISECONDS_PER_DAY)
+                    power_matrix = make_power_matrix(data_array.ts,
+                        data_array.meas_val_f, sensors=data_array.sensor,
+                        sampling_interval_minutes=
+                        self._get_time_axis_interval(),
+                        localize_hours=LOCALIZE_HOURS, first_day=first_day,
+                        dtype=self._get_dtype_policy().value_dtype)
+                    first_day += 1
+                else:
+                    first_day = (metadata['first_day'] +
+                        metadata['number_of_days'])
+                    power_matrix = make_power_matrix(data_array.ts,
+                        data_array.meas_val_f, sensors=data_array.sensor,
+                        sampling_interval_minutes=
+                        self._get_time_axis_interval(),
+                        localize_hours=LOCALIZE_HOURS, first_day=first_day,
+                        trim_start=False,
+                        dtype=self._get_dtype_policy().value_dtype)
+            number_of_days = power_matrix.shape[1]
+            if number_of_days > 0:
+                high_water_mark = ((first_day + number_of_days) *
+                    MILLISECONDS_PER_DAY - localize_milliseconds)
+                power_matrix_store.append(site, power_matrix, first_day,
+                    high_water_mark)
+            number_of_appended_days[site] = number_of_days
+        return number_of_appended_days
+
+    def write_power_matrix(self, site, power_matrix, first_date,
+        meas_name='ac_power', sensor='', station='', company=''):
+        """
+        Writes a power matrix of a site as raw measurements, in concurrent
+        unlogged batches of one partition, e.g. to backfill a site.
+
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        power_matrix : numpy array
+            Matrix with row for time of day and column for dates, in PST as
+            the power matrices made by this class. NaN values are not
+            written.
+        first_date : date
+            Date of first column.
+        meas_name : string
+            Name of measurement.
+        sensor : string
+            Name of sensor.
+        station : string
+            Name of station.
+        company : string
+            Name of company.
 
-        total_number_of_columns = len(data_candidates[sites[0]][0])
+        Returns
+        -------
+        integer
+            Number of written rows.
+        """
+        with self._get_instrumentation().span('cassandra.write',
+            site=site) as span:
+            span.add_data(power_matrix)
+            return self._get_bulk_writer().write_power_matrix(site,
+                power_matrix, first_date, meas_name=meas_name, sensor=sensor,
+                station=station, company=company,
+                localize_hours=LOCALIZE_HOURS)
 
-        random_choice_list = self._construct_random_choice_list(sites,
-            total_number_of_columns)
+    def write_data_frame(self, site, data_frame, datetimekey='ts',
+        value_key='meas_val_f', sensor_key=None, meas_name='ac_power',
+        station='', company=''):
+        """
+        Writes samples of a site as raw measurements, in concurrent unlogged
+        batches of one partition.
 
-        daily_signal_based_data = self._random_choice(data_candidates,
-            random_choice_list, total_number_of_columns)
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        data_frame : pandas DataFrame
+            Samples of the site, with timestamps in UTC.
+        datetimekey : string
+            Name of column of timestamps.
+        value_key : string
+            Name of column of values. NaN is written as null.
+        sensor_key : string
+            Name of column of names of sensors. Sensor is empty if None.
+        meas_name : string
+            Name of measurement.
+        station : string
+            Name of station.
+        company : string
+            Name of company.
 
-        # Transpose to make the matrix with row of yearly data and column of
-        # daily data:
-        return daily_signal_based_data.T
+        Returns
+        -------
+        integer
+            Number of written rows.
+        """
+        with self._get_instrumentation().span('cassandra.write',
+            site=site) as span:
+            span.add_data(data_frame)
+            return self._get_bulk_writer().write_data_frame(site,
+                data_frame, datetimekey=datetimekey, value_key=value_key,
+                sensor_key=sensor_key, meas_name=meas_name, station=station,
+                company=company)
 
     def _set_up_connection(self):
-        if ((not hasattr(self, '_connection')) or (self._connection is None)):
-            self._connection = connection.setup([self._ip_address],
-                                                "measurements")
+        """
+        Gets the session shared by the process, which is also registered as
+        the session of cqlengine models.
+        """
+        self._session = self._get_session_manager().get_session()
+
+    def _get_session_manager(self):
+        if ((not hasattr(self, '_session_manager')) or
+           (self._session_manager is None)):
+           from solar_data_pipeline.database.session import\
+               get_session_manager
+           self._session_manager = get_session_manager(self._ip_address,
+               **self._session_options)
+        return self._session_manager
+
+    def _set_session_manager(self, session_manager):
+        """
+        For dependency injection for testing, i.e. for injecting mock.
+        This method is set to be private, in order to indicate that it is
+        not accessed from the client code.
+        """
+        self._session_manager = session_manager
 
     def _get_site_lists_for_retrieve(self, sites=None):
         """
@@ -64,12 +556,25 @@ class CassandraDataAccess:
             return sites
 
     def _random_choice(self, data_candidates, random_choice_list,
-        total_number_of_columns):
-        sample = np.random.choice(random_choice_list, total_number_of_columns,
-            replace=False)
-        return np.array(
-            [data_candidates[sample[i]][:,i]
-             for i in range(total_number_of_columns)])
+        total_number_of_columns, random_generator=None):
+        """
+        Chooses the site of each day from random_choice_list without
+        replacement, and takes day i from the power matrix of the site chosen
+        for it, with random_generator or the random generator of this object.
+
+        Returns
+        -------
+        numpy array
+            Matrix with row for time of day and column for dates.
+        """
+        sites, source_indices = np.unique(random_choice_list,
+            return_inverse=True)
+        if random_generator is None:
+            random_generator = self._random_generator
+        sample = choose_sources(source_indices, total_number_of_columns,
+            random_generator)
+        return gather_columns([data_candidates[site] for site in sites],
+            sample)
 
     def _construct_random_choice_list(self, sites, total_number_of_elements):
         """
@@ -79,43 +584,168 @@ class CassandraDataAccess:
             Name of sites.
         total_number_of_elements: integer
             Total number of elements of the choice list.
+
+        Returns
+        -------
+        numpy array
+            Name of site of each element. The first sites have one more
+            element if the total is not divisible by the number of sites.
         """
-        number_per_site = total_number_of_elements // len(sites)
-        return functools.reduce(lambda choice_list, site:
-            choice_list + ([site] * number_per_site), sites, [])
+        number_per_site = np.full(len(sites),
+            total_number_of_elements // len(sites))
+        number_per_site[:total_number_of_elements % len(sites)] += 1
+        return np.asarray(sites)[repeat_sources(number_per_site)]
 
     def _get_data_candidate(self, sites, start_time=None, end_time=None):
-        self._set_up_connection()
+        power_matrix_cache = self._get_power_matrix_cache()
+        data_transformation = self._get_data_transformation()
+
+        data_dictionary = {}
+        if power_matrix_cache is not None:
+            for site in sites:
+                power_matrix = power_matrix_cache.get(site, start_time,
+                    end_time, data_transformation)
+                if power_matrix is not None:
+                    data_dictionary[site] = power_matrix
+
+        missing_sites = [site for site in sites if site not in data_dictionary]
+        if len(missing_sites) > 0:
+            self._set_up_connection()
+
+            # Queries of all sites are issued concurrently:
+            data_arrays = self._scan_sites(missing_sites,
+                start_time=start_time, end_time=end_time)
+
+            for site, data_array in zip(missing_sites, data_arrays):
+                power_matrix = self._transform(data_array)
+                if power_matrix_cache is not None:
+                    power_matrix_cache.put(site, start_time, end_time,
+                        data_transformation, power_matrix)
+                data_dictionary[site] = power_matrix
 
-        data_dictionary = {site: self._query_power_for_given_site(
-            site, start_time=start_time, end_time=end_time)
-            for site in sites}
-        return data_dictionary
+        return {site: data_dictionary[site] for site in sites}
 
     def _query_power_for_given_site(self, site, start_time=None, end_time=None):
+        power_matrix_cache = self._get_power_matrix_cache()
+        data_transformation = self._get_data_transformation()
+        if power_matrix_cache is not None:
+            power_matrix = power_matrix_cache.get(site, start_time, end_time,
+                data_transformation)
+            if power_matrix is not None:
+                return power_matrix
 
         data_array = self._query_power_for_given_site_helper(site,
             start_time=start_time, end_time=end_time)
 
+        power_matrix = self._transform(data_array)
+        if power_matrix_cache is not None:
+            power_matrix_cache.put(site, start_time, end_time,
+                data_transformation, power_matrix)
+        return power_matrix
+
+    def _transform(self, data_array):
         data_transformation = self._get_data_transformation()
 
-        return data_transformation.transform(data_array, datetimekey='ts',
-            ac_power_key='ac_power_01')
+        with self._get_instrumentation().span('cassandra.transform',
+            site=getattr(data_array, 'site', '')) as span:
+            span.add_data(data_array)
+            return data_transformation.transform(data_array,
+                datetimekey='ts', ac_power_key='ac_power_01')
+
+    def _fix_time_shifts(self, power_matrix, time_shift_mode):
+        """
+        Returns
+        -------
+        tuple
+            Power matrix corrected by fix_time_shifts in the mode, or the
+            given one if the mode is None, and the time shift in minutes
+            corrected on each day, positive toward later times of day.
+        """
+        if time_shift_mode is None:
+            return power_matrix, np.zeros(power_matrix.shape[1], dtype=int)
+        fixed_power_matrix, index_set = fix_time_shifts(power_matrix,
+            mode=time_shift_mode, return_ixs=True)
+        return fixed_power_matrix, (find_rolls(power_matrix,
+            fixed_power_matrix, index_set) * self._get_time_axis_interval())
 
     def _query_power_for_given_site_helper(self, site, start_time=None,
         end_time=None):
         self._set_up_connection()
 
-        measurement_raw = NamedTable("measurements", "measurement_raw")
-        query = measurement_raw.objects.limit(1000000).filter(site=site)
-        query = query.filter(meas_name='ac_power')
-        if start_time is not None:
-            query = query.filter(ts__gte=start_time)
-        if end_time is not None:
-            query = query.filter(ts__lte=end_time)
-        data_array = np.array(query)
+        with self._get_instrumentation().span('cassandra.fetch',
+            number_of_sites=1) as span:
+            data_array = self._get_paged_scanner().scan(site,
+                meas_name='ac_power', start_time=start_time,
+                end_time=end_time)
+            span.add_data(data_array)
+            return data_array
+
+    def _scan_sites(self, sites, start_time=None, end_time=None):
+        with self._get_instrumentation().span('cassandra.fetch',
+            number_of_sites=len(sites)) as span:
+            data_arrays = self._get_paged_scanner().scan_sites(sites,
+                meas_name='ac_power', start_time=start_time,
+                end_time=end_time)
+            span.add_data(data_arrays)
+            return data_arrays
+
+    def _get_paged_scanner(self):
+        session = self._get_session_manager().get_session(columnar=True)
+        # The session is replaced after the process is forked:
+        if ((not hasattr(self, '_paged_scanner')) or
+           (self._paged_scanner is None) or
+           (self._paged_scanner_session is not None and
+            self._paged_scanner_session is not session)):
+           from solar_data_pipeline.database.utilities.paged_scanner import\
+               PagedScanner
+           self._paged_scanner_session = session
+           self._paged_scanner = PagedScanner(session,
+               fetch_size=self._fetch_size,
+               window=timedelta(days=self._days_per_scan_window),
+               fetch_engine=self._make_fetch_engine(session),
+               value_dtype=self._get_dtype_policy().value_dtype,
+               sampling_interval_minutes=
+               self._get_sampling_interval_minutes())
+        return self._paged_scanner
+
+    def _get_bulk_writer(self):
+        session = self._get_session_manager().get_session()
+        # The session is replaced after the process is forked:
+        if ((not hasattr(self, '_bulk_writer')) or
+           (self._bulk_writer is None) or
+           (self._bulk_writer_session is not None and
+            self._bulk_writer_session is not session)):
+           from solar_data_pipeline.database.utilities.bulk_writer import\
+               BulkWriter
+           self._bulk_writer_session = session
+           self._bulk_writer = BulkWriter(session,
+               fetch_engine=self._make_fetch_engine(session))
+        return self._bulk_writer
+
+    def _set_bulk_writer(self, bulk_writer):
+        """
+        For dependency injection for testing, i.e. for injecting mock.
+        This method is set to be private, in order to indicate that it is
+        not accessed from the client code.
+        """
+        self._bulk_writer = bulk_writer
+        self._bulk_writer_session = None
+
+    def _make_fetch_engine(self, session):
+        from solar_data_pipeline.database.utilities.fetch_engine import\
+            ConcurrentFetchEngine
+        return ConcurrentFetchEngine(session,
+            max_in_flight=self._max_requests_in_flight,
+            timeout=self._request_timeout, retries=self._number_of_retries)
 
-        return data_array
+    def _set_paged_scanner(self, paged_scanner):
+        """
+        For dependency injection for testing, i.e. for injecting mock.
+        This method is set to be private, in order to indicate that it is
+        not accessed from the client code.
+        """
+        self._paged_scanner = paged_scanner
+        self._paged_scanner_session = None
 
     def _get_data_transformation(self):
         if ((not hasattr(self, '_data_transformation')) or
@@ -123,11 +753,141 @@ class CassandraDataAccess:
            from solar_data_pipeline.database.utilities.data_transformation\
                import AllDataTransformation
            self._data_transformation = AllDataTransformation()
+           self._data_transformation.set_instrumentation(
+               self._get_instrumentation())
+           self._data_transformation.set_dtype_policy(
+               self._get_dtype_policy())
+           self._data_transformation.set_sampling_interval_minutes(
+               self._get_sampling_interval_minutes())
         return self._data_transformation
 
     def set_data_transformation(self, data_transformation):
        self._data_transformation = data_transformation
 
+    def _get_instrumentation(self):
+        if ((not hasattr(self, '_instrumentation')) or
+           (self._instrumentation is None)):
+           self._instrumentation = Instrumentation()
+        return self._instrumentation
+
+    def set_instrumentation(self, instrumentation):
+        """
+        Arguments
+        -----------------
+        instrumentation : Instrumentation
+            Instrumentation the stages of retrieval are recorded with. Also
+            set to the data transformation made by default.
+        """
+        self._instrumentation = instrumentation
+        data_transformation = getattr(self, '_data_transformation', None)
+        if hasattr(data_transformation, 'set_instrumentation'):
+            data_transformation.set_instrumentation(instrumentation)
+
+    def _get_dtype_policy(self):
+        if ((not hasattr(self, '_dtype_policy')) or
+           (self._dtype_policy is None)):
+           self._dtype_policy = get_dtype_policy()
+        return self._dtype_policy
+
+    def set_dtype_policy(self, dtype_policy):
+        """
+        Arguments
+        -----------------
+        dtype_policy : DtypePolicy or numpy dtype
+            Policy of types, e.g. DtypePolicy(np.float32), which values are
+            decoded in and power matrices are made and returned in. Also set
+            to the data transformation made by default.
+        """
+        self._dtype_policy = get_dtype_policy(dtype_policy)
+        data_transformation = getattr(self, '_data_transformation', None)
+        if hasattr(data_transformation, 'set_dtype_policy'):
+            data_transformation.set_dtype_policy(self._dtype_policy)
+        # The scanner made by default is made again with the value type:
+        if getattr(self, '_paged_scanner_session', None) is not None:
+            self._paged_scanner = None
+
+    def _get_sampling_interval_minutes(self):
+        if not hasattr(self, '_sampling_interval_minutes'):
+           self._sampling_interval_minutes = None
+        return self._sampling_interval_minutes
+
+    def _get_time_axis_interval(self):
+        sampling_interval_minutes = self._get_sampling_interval_minutes()
+        if sampling_interval_minutes is None:
+            return DEFAULT_SAMPLING_INTERVAL_MINUTES
+        return sampling_interval_minutes
+
+    def set_sampling_interval_minutes(self, sampling_interval_minutes):
+        """
+        Retrieves power matrices at a coarser resolution, e.g. 15 or 60
+        minutes. Measurements are averaged in time buckets of the interval
+        while pages are decoded, so that transformations get one row per
+        bucket instead of every raw sample, and power matrices have
+        24 * 60 / sampling_interval_minutes rows. Also set to the data
+        transformation made by default.
+
+        Arguments
+        -----------------
+        sampling_interval_minutes : integer
+            Interval in minutes, which a day and the offset of local time
+            must be multiples of, so that buckets do not span local midnight.
+            Raw measurements on a 5-minute time axis if None.
+        """
+        if (sampling_interval_minutes is not None and
+            ((24 * 60) % sampling_interval_minutes != 0 or
+            (LOCALIZE_HOURS * 60) % sampling_interval_minutes != 0)):
+            raise ValueError("A day and the offset of local time must be " +
+                "multiples of the interval.")
+        self._sampling_interval_minutes = sampling_interval_minutes
+        data_transformation = getattr(self, '_data_transformation', None)
+        if hasattr(data_transformation, 'set_sampling_interval_minutes'):
+            data_transformation.set_sampling_interval_minutes(
+                sampling_interval_minutes)
+        # The scanner made by default is made again with the interval:
+        if getattr(self, '_paged_scanner_session', None) is not None:
+            self._paged_scanner = None
+
+    def _get_power_matrix_cache(self):
+        if not hasattr(self, '_power_matrix_cache'):
+           self._power_matrix_cache = None
+        return self._power_matrix_cache
+
+    def set_power_matrix_cache(self, power_matrix_cache):
+        """
+        Arguments
+        -----------------
+        power_matrix_cache : PowerMatrixCache
+            Cache of power matrices on local disk, which is looked up before
+            querying Cassandra. Matrices are not cached if None.
+        """
+        self._power_matrix_cache = power_matrix_cache
+
+    def _get_site_catalog(self):
+        if not hasattr(self, '_site_catalog'):
+           self._site_catalog = None
+        return self._site_catalog
+
+    def set_site_catalog(self, site_catalog):
+        """
+        Arguments
+        -----------------
+        site_catalog : SiteCatalog
+            Catalog of sites, which sites are listed and found with instead of
+            scanning all partitions of the database. Built from the database
+            when it is stale. Sites are listed by scanning if None.
+        """
+        self._site_catalog = site_catalog
+
+    def _get_refreshed_site_catalog(self):
+        site_catalog = self._get_site_catalog()
+        if site_catalog.is_stale():
+            self._set_up_connection()
+            session = self._get_session_manager().get_session(columnar=True)
+            site_catalog.refresh(session,
+                fetch_engine=self._make_fetch_engine(session),
+                fetch_size=self._fetch_size)
+        return site_catalog
+
     def _set_csv_access(self, data_transformation):
         """
         For dependency injection for testing, i.e. for injecting mock.
@@ -135,3 +895,29 @@ class CassandraDataAccess:
         not accessed from the client code.
         """
         self._data_transformation = data_transformation
+
+def get_first_date(data_array,
+    sampling_interval_minutes=DEFAULT_SAMPLING_INTERVAL_MINUTES):
+    """
+    Arguments
+    -----------------
+    data_array : numpy array or MeasurementColumns
+        Measurements the power matrix is made from, with timestamps in UTC.
+    sampling_interval_minutes : integer
+        Interval of the time axis of the power matrix.
+
+    Returns
+    -------
+    date
+        Date of the first column of the power matrix made from the
+        measurements, which is the day after the first sample used by
+        make_power_matrix in local time, since the first day is dropped as
+        partial. None if no sample is used.
+    """
+    timestamps, values, sensors = measurement_arrays(data_array)
+    first_day = get_first_day(timestamps, values, sensors=sensors,
+        sampling_interval_minutes=sampling_interval_minutes,
+        localize_hours=LOCALIZE_HOURS)
+    if first_day is None:
+        return None
+    return datetime(1970, 1, 1).date() + timedelta(days=first_day + 1)
@@ -4,92 +4,436 @@ It uses more raw construct due to the limitation that has been encountered
 when using CassandraDataAccess.
 """
 from os.path import expanduser
-import functools
 import numpy as np
-import pandas as pd
-from cassandra.cluster import Cluster
-from solardatatools import standardize_time_axis, make_2d
-from statistical_clear_sky.utilities.data_conversion import make_time_series
-from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.database.cassandra import CassandraDataAccess,\
+    LOCALIZE_HOURS, get_first_date
+from solar_data_pipeline.database.utilities.site_catalog import SiteCatalog
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix,\
+    get_first_day, MILLISECONDS_PER_DAY
+from solar_data_pipeline.utilities.sampling import SITES_STREAM, DAYS_STREAM
 
 class RawCassandraDataAccess(CassandraDataAccess):
 
-    def __init__(self):
+    def __init__(self, number_of_transformation_workers=1, ip_address=None,
+        random_generator=None, site_catalog_path=None, session_options=None):
+        """
+        Arguments
+        -----------------
+        number_of_transformation_workers : integer
+            Number of processes transforming the measurements of sites into
+            power matrices in parallel. Transformations run in the calling
+            process if 1.
+        ip_address : string
+            IP address of Cassandra cluster. Read from ~/.aws/cassandra_cluster
+            if None.
+        random_generator : numpy.random.Generator or integer
+            Generator, or seed of a generator, of the random choice of sites
+            and days.
+        site_catalog_path : string
+            Path of the file of the catalog of sites, which sites and their
+            time bounds are looked up in, e.g. ~/.cache/solar_data_pipeline/
+            site_catalog.npz. Sites and time bounds are queried from the
+            database if None.
+        session_options : dictionary
+            Keyword arguments of SessionManager, as in CassandraDataAccess.
+        """
         home = expanduser("~")
-        with open(home + '/.aws/cassandra_cluster') as f:
-            ip_address = f.readline().strip('\n')
-        super().__init__(ip_address)
+        if ip_address is None:
+            with open(home + '/.aws/cassandra_cluster') as f:
+                ip_address = f.readline().strip('\n')
+        super().__init__(ip_address, random_generator=random_generator,
+            session_options=session_options)
+        if site_catalog_path is not None:
+            self.set_site_catalog(SiteCatalog(site_catalog_path))
+        self._number_of_transformation_workers =\
+            number_of_transformation_workers
 
-    def retrieve(self, number_of_sites = 4, number_of_days_per_site = 10):
-        selected_sites = self._select_sites(number_of_sites = number_of_sites)
+    def retrieve(self, number_of_sites = 4, number_of_days_per_site = 10,
+        lazy=False, quality_thresholds=None, sample_specification=None,
+        shard_index=0, number_of_shards=1):
+        """
+        Arguments
+        -----------------
+        number_of_sites : integer
+            Number of randomly selected sites.
+        number_of_days_per_site : integer
+            Number of randomly selected days of each site.
+        lazy : boolean
+            Whether to choose the days before querying, from the first and
+            last timestamps of each site, and to query and transform only the
+            chosen days. Otherwise, whole history of each site is queried and
+            transformed, and the days are chosen from the power matrix.
+            Nighttime values are found with the maximum of the chosen days
+            instead of whole history in the lazy mode, thus values near
+            sunrise and sunset may differ. False by default, so that the
+            days are the same as those of the whole power matrix.
+        quality_thresholds : QualityThresholds
+            If given, sites and days are chosen only among those qualifying
+            by the quality scores in the site catalog, which must be built
+            with score_quality. Other sites are never queried.
+        sample_specification : SampleSpecification
+            If given, sites and days are chosen as specified, each from its
+            own stream of the seed of the specification instead of the
+            random generator of this object, so that the sample is the same
+            in any process. Replaces number_of_sites and
+            number_of_days_per_site.
+        shard_index : integer
+            With sample_specification, index of the part of the sample
+            retrieved by this call, which has the days of every
+            number_of_shards-th chosen site from shard_index.
+        number_of_shards : integer
+            With sample_specification, number of parts of the sample.
 
-        data_frame = self._get_data_frame_for_sites(selected_sites)
-        data_frame_list = self._list_grouped_by_sites(data_frame,
+        Returns
+        -------
+        numpy array
+            Representing a matrix with row for time of day and column for
+            dates, containing the chosen days of each site one after another.
+        """
+        with self._get_instrumentation().span('cassandra.retrieve',
+            lazy=lazy) as span:
+            power_matrix = self._retrieve(number_of_sites,
+                number_of_days_per_site, lazy, quality_thresholds,
+                sample_specification, shard_index, number_of_shards)
+            span.add_data(power_matrix)
+            return power_matrix
+
+    def _retrieve(self, number_of_sites, number_of_days_per_site, lazy,
+        quality_thresholds, sample_specification, shard_index,
+        number_of_shards):
+        if sample_specification is None:
+            if number_of_shards != 1:
+                raise ValueError("Shards require a sample specification.")
+            selected_sites = self._select_sites(
+                number_of_sites = number_of_sites,
+                quality_thresholds=quality_thresholds)
+            random_generators = [self._random_generator] * len(
+                selected_sites)
+        else:
+            number_of_days_per_site =\
+                sample_specification.number_of_days_per_site
+            selected_sites = self._select_sites(
+                number_of_sites=sample_specification.number_of_sites,
+                quality_thresholds=quality_thresholds,
+                sites=sample_specification.sites,
+                random_generator=sample_specification.make_random_generator(
+                SITES_STREAM))
+            # Days of a site are drawn from the stream of its position, thus
+            # the same in any shard:
+            positions = sample_specification.get_shard(shard_index,
+                number_of_shards)
+            selected_sites = selected_sites[positions]
+            random_generators = [sample_specification.make_random_generator(
+                DAYS_STREAM, position) for position in positions]
+
+        if lazy:
+            return self._retrieve_selected_days(selected_sites,
+                number_of_days_per_site,
+                quality_thresholds=quality_thresholds,
+                random_generators=random_generators)
+
+        measurement_columns_list = self._get_measurement_columns_list(
             selected_sites)
-        time_series_data_frame_list = self._make_time_series_list(
-            data_frame_list)
-        standardized_data_frame_list = self._standardize_data_frame(
-            time_series_data_frame_list)
-        power_matrix_list =  self._make_2d_list(
-            standardized_data_frame_list)
+        power_matrix_list = self._make_power_matrix_list(
+            measurement_columns_list)
+
+        candidate_columns_list = None
+        if quality_thresholds is not None:
+            site_catalog = self._get_refreshed_site_catalog()
+            candidate_columns_list = []
+            for measurement_columns in measurement_columns_list:
+                # Day of the first sample of the power matrix, whose first
+                # column is the next day:
+                first_day = get_first_day(measurement_columns.ts,
+                    measurement_columns.meas_val_f,
+                    sensors=measurement_columns.sensor,
+                    sampling_interval_minutes=self._get_time_axis_interval(),
+                    localize_hours=LOCALIZE_HOURS)
+                if first_day is None:
+                    candidate_columns_list.append(np.empty(0, dtype=int))
+                    continue
+                candidate_columns_list.append(site_catalog.get_days(
+                    measurement_columns.site,
+                    quality_thresholds=quality_thresholds) - first_day - 1)
 
         return self._make_selected_power_matrix(power_matrix_list,
-            number_of_days_per_site)
+            number_of_days_per_site,
+            candidate_columns_list=candidate_columns_list,
+            random_generators=random_generators)
+
+    def export_power_matrices(self, directory, number_of_sites=4,
+        file_format='parquet', time_shift_mode=None):
+        """
+        Exports the whole power matrices of randomly selected sites to a
+        dataset partitioned by site. The time shift corrected on each day is
+        recorded. Requires pyarrow.
 
-    def _select_sites(self, number_of_sites = 4):
-        sites = self.get_sites()
-        return np.random.choice(sites, number_of_sites)
+        Arguments
+        -----------------
+        directory : string
+            Root directory of dataset.
+        number_of_sites : integer
+            Number of sites.
+        file_format : string
+            'parquet' or 'arrow'.
+        time_shift_mode : string
+            Mode of fix_time_shifts the power matrices are corrected with, as
+            for CassandraDataAccess.export_power_matrices.
 
-    def _get_data_frame_for_sites(self, selected_sites):
-        cql = self._construct_cql_query(selected_sites)
+        Returns
+        -------
+        list
+            Name of exported sites.
+        """
+        from solar_data_pipeline.utilities.power_matrix_dataset import\
+            write_power_matrix
+        selected_sites = self._select_sites(number_of_sites=number_of_sites)
 
-        cluster = Cluster([self._ip_address])
-        session = cluster.connect('measurements')
+        measurement_columns_list = self._get_measurement_columns_list(
+            selected_sites)
+        power_matrix_list = self._get_parallel_transformation(
+            ).make_power_matrices(measurement_columns_list,
+            sampling_interval_minutes=self._get_time_axis_interval(),
+            localize_hours=LOCALIZE_HOURS)
 
-        rows = session.execute(cql)
-        return pd.DataFrame(list(rows))
+        exported_sites = []
+        for measurement_columns, power_matrix in zip(measurement_columns_list,
+            power_matrix_list):
+            if power_matrix.shape[1] == 0:
+                continue
+            power_matrix, time_shifts = self._fix_time_shifts(power_matrix,
+                time_shift_mode)
+            write_power_matrix(directory, measurement_columns.site,
+                power_matrix,
+                first_date=get_first_date(measurement_columns,
+                self._get_time_axis_interval()),
+                time_shifts=time_shifts,
+                sampling_interval_minutes=self._get_time_axis_interval(),
+                file_format=file_format)
+            exported_sites.append(measurement_columns.site)
+        return exported_sites
 
-    def _construct_cql_query(self, selected_sites):
-        cql_first_part = ("select site, meas_name, ts, sensor, meas_val_f " +
-            "from measurement_raw ")
-        cql_last_part = "and meas_name = 'ac_power';"
+    def _select_sites(self, number_of_sites = 4, quality_thresholds=None,
+        sites=None, random_generator=None):
+        """
+        Arguments
+        -----------------
+        sites : list
+            Name of sites which sites are selected from. All sites if None.
+        random_generator : numpy.random.Generator
+            Generator of the choice. The random generator of this object if
+            None.
+        """
+        if sites is None:
+            sites = self.get_sites(quality_thresholds=quality_thresholds)
+        else:
+            sites = np.asarray(sites)
+            if quality_thresholds is not None:
+                sites = sites[np.isin(sites, self.get_sites(
+                    quality_thresholds=quality_thresholds))]
+        if random_generator is None:
+            random_generator = self._random_generator
+        return random_generator.choice(sites, number_of_sites)
 
-        cql_sites_string = functools.reduce(lambda result_string, site:
-                   result_string + ", '" + site + "'" ,
-                   selected_sites, "")[2:]
-        cql_where_clause = "where site in (" + cql_sites_string + ")"
+    def _retrieve_selected_days(self, selected_sites,
+        number_of_days_per_site, quality_thresholds=None,
+        random_generators=None):
+        """
+        Arguments
+        -----------------
+        random_generators : list
+            Generator of the choice of days of each site. The random generator
+            of this object for all sites if None.
+        """
+        self._set_up_connection()
+        paged_scanner = self._get_paged_scanner()
+        instrumentation = self._get_instrumentation()
+        sites = list(selected_sites)
+        if random_generators is None:
+            random_generators = [self._random_generator] * len(sites)
 
-        return cql_first_part + cql_where_clause + cql_last_part
+        localize_milliseconds = LOCALIZE_HOURS * 60 * 60 * 1000
+        sites_with_days = []
+        selected_days_list = []
+        for site, (first_timestamp, last_timestamp), random_generator in zip(
+            sites, self._get_time_bounds(sites), random_generators):
+            if first_timestamp is None:
+                continue
+            # Same days as the columns of the whole power matrix, of which the
+            # first and last days are dropped as partial days:
+            first_day = (first_timestamp + localize_milliseconds
+                ) // MILLISECONDS_PER_DAY + 1
+            last_day = (last_timestamp + localize_milliseconds
+                ) // MILLISECONDS_PER_DAY - 1
+            if quality_thresholds is None:
+                candidate_days = np.arange(first_day, last_day + 1)
+            else:
+                candidate_days = self._get_refreshed_site_catalog().get_days(
+                    site, quality_thresholds=quality_thresholds)
+                candidate_days = candidate_days[(candidate_days >= first_day) &
+                    (candidate_days <= last_day)]
+            if len(candidate_days) == 0:
+                continue
+            sites_with_days.append(site)
+            selected_days_list.append(random_generator.choice(
+                candidate_days, number_of_days_per_site))
 
-    def _list_grouped_by_sites(self, data_frame, selected_sites):
-        return [data_frame.loc[data_frame['site'] == site]
-            for site in selected_sites]
+        # Time buckets of a sampling interval do not span local midnight, thus
+        # the ranges of days hold whole buckets:
+        ranges_list = [_make_day_ranges(np.unique(selected_days),
+            localize_milliseconds) for selected_days in selected_days_list]
+        with instrumentation.span('cassandra.fetch',
+            number_of_sites=len(sites_with_days)) as span:
+            measurement_columns_list = paged_scanner.scan_ranges(
+                sites_with_days, ranges_list, meas_name='ac_power')
+            span.add_data(measurement_columns_list)
 
-    def _make_time_series_list(self, data_frame_list):
-        return [make_time_series(data_frame, return_keys=False) for data_frame
-            in data_frame_list if data_frame.shape[0] > 0]
+        dtype_policy = self._get_dtype_policy()
+        sampling_interval_minutes = self._get_time_axis_interval()
+        selected_power_matrices = [dtype_policy.empty(
+            24 * 60 // sampling_interval_minutes)]
+        for measurement_columns, selected_days in zip(
+            measurement_columns_list, selected_days_list):
+            first_selected_day = int(selected_days.min())
+            with instrumentation.span('cassandra.transform',
+                site=measurement_columns.site) as span:
+                span.add_data(measurement_columns)
+                power_matrix = make_power_matrix(measurement_columns.ts,
+                    measurement_columns.meas_val_f,
+                    sensors=measurement_columns.sensor,
+                    sampling_interval_minutes=sampling_interval_minutes,
+                    localize_hours=LOCALIZE_HOURS,
+                    first_day=first_selected_day, trim_start=False,
+                    trim_end=False, dtype=dtype_policy.value_dtype)
+            columns = selected_days - first_selected_day
+            # Days without values are zero, as in the whole power matrix:
+            selected_power_matrix = np.zeros((power_matrix.shape[0],
+                len(columns)), dtype=dtype_policy.dtype)
+            is_available = columns < power_matrix.shape[1]
+            selected_power_matrix[:, is_available] = dtype_policy.encode(
+                power_matrix[:, columns[is_available]])
+            selected_power_matrices.append(selected_power_matrix)
+        return np.hstack(selected_power_matrices)
 
-    def _standardize_data_frame(self, time_series_data_frame_list):
-        return [standardize_time_axis(time_series_data_frame) for
-            time_series_data_frame in time_series_data_frame_list]
+    def _get_time_bounds(self, sites):
+        with self._get_instrumentation().span('cassandra.time_bounds',
+            number_of_sites=len(sites)):
+            # Days after the refresh of the catalog are not sampled until the
+            # next refresh:
+            if self._get_site_catalog() is not None:
+                return self._get_refreshed_site_catalog().get_time_bounds(
+                    sites)
+            return self._get_paged_scanner().query_time_bounds(sites,
+                meas_name='ac_power')
 
-    def _make_2d_list(self, standardized_data_frame_list):
-        return [make_2d(standardized_data_frame, key='ac_power_01',
-            zero_nighttime=True, interp_missing=True) for
-            standardized_data_frame in standardized_data_frame_list]
+    def _get_measurement_columns_list(self, selected_sites):
+        self._set_up_connection()
+
+        with self._get_instrumentation().span('cassandra.fetch',
+            number_of_sites=len(selected_sites)) as span:
+            # One prepared, bound query per partition instead of
+            # "site in (...)", which makes the coordinator fan out to the
+            # replicas of every site:
+            measurement_columns_list = self._get_paged_scanner(
+                ).scan_partitions(list(selected_sites), meas_name='ac_power')
+            span.add_data(measurement_columns_list)
+            return measurement_columns_list
+
+    def _make_power_matrix_list(self, measurement_columns_list):
+        with self._get_instrumentation().span('cassandra.transform',
+            number_of_sites=len(measurement_columns_list)) as span:
+            span.add_data(measurement_columns_list)
+            # Same matrices as make_time_series, standardize_time_axis and
+            # make_2d with key ac_power_01, built directly from the columns:
+            dtype_policy = self._get_dtype_policy()
+            power_matrix_list = self._get_parallel_transformation(
+                ).make_power_matrices(measurement_columns_list,
+                sampling_interval_minutes=self._get_time_axis_interval(),
+                localize_hours=LOCALIZE_HOURS,
+                dtype=dtype_policy.value_dtype)
+            return [dtype_policy.encode(power_matrix)
+                for power_matrix in power_matrix_list]
 
     def _make_selected_power_matrix(self, power_matrix_list,
-        number_of_days_per_site):
-        selected_power_list = []
+        number_of_days_per_site, candidate_columns_list=None,
+        random_generators=None):
+        """
+        Arguments
+        -----------------
+        candidate_columns_list : list
+            For each power matrix, columns days are chosen from. All columns
+            if None.
+        random_generators : list
+            Generator of the choice of days of each power matrix. The random
+            generator of this object for all matrices if None.
+        """
+        if random_generators is None:
+            random_generators = [self._random_generator] * len(
+                power_matrix_list)
+        with self._get_instrumentation().span('cassandra.sample') as span:
+            selected_power_matrix = self._select_power_matrix_days(
+                power_matrix_list, number_of_days_per_site,
+                candidate_columns_list, random_generators)
+            span.add_data(selected_power_matrix)
+            return selected_power_matrix
+
+    def _select_power_matrix_days(self, power_matrix_list,
+        number_of_days_per_site, candidate_columns_list, random_generators):
+        selected_power_list = [self._get_dtype_policy().empty(
+            24 * 60 // self._get_time_axis_interval())]
 
-        for power_matrix in power_matrix_list:
+        for i, power_matrix in enumerate(power_matrix_list):
             day_candidates = power_matrix.shape[1]
-            selected_days = np.random.choice(day_candidates,
+            # Sites without days are left out:
+            if day_candidates == 0:
+                continue
+            if candidate_columns_list is not None:
+                candidate_columns = candidate_columns_list[i]
+                day_candidates = candidate_columns[(candidate_columns >= 0) &
+                    (candidate_columns < power_matrix.shape[1])]
+                if len(day_candidates) == 0:
+                    continue
+            selected_days = random_generators[i].choice(day_candidates,
                 number_of_days_per_site)
+            selected_power_list.append(power_matrix[:, selected_days])
+
+        return np.hstack(selected_power_list)
+
+    def _get_parallel_transformation(self):
+        if ((not hasattr(self, '_parallel_transformation')) or
+           (self._parallel_transformation is None)):
+           from solar_data_pipeline.utilities.parallel_transformation import\
+               ParallelTransformation
+           self._parallel_transformation = ParallelTransformation(
+               number_of_workers=self._number_of_transformation_workers)
+        return self._parallel_transformation
 
-            for selected_day in selected_days:
-                selected_power_list.append(power_matrix[:,selected_day])
+    def _set_parallel_transformation(self, parallel_transformation):
+        """
+        For dependency injection for testing, i.e. for injecting mock.
+        This method is set to be private, in order to indicate that it is
+        not accessed from the client code.
+        """
+        self._parallel_transformation = parallel_transformation
 
-        selected_power_array = np.array(selected_power_list)
+def _make_day_ranges(days, localize_milliseconds):
+    """
+    Arguments
+    -----------------
+    days : numpy array
+        Sorted unique days since epoch in local time.
+    localize_milliseconds : integer
+        Milliseconds added to UTC to make local time.
 
-        return selected_power_array.T
+    Returns
+    -------
+    list
+        Tuples of inclusive lower bound and exclusive upper bound in UTC
+        milliseconds, one per run of consecutive days.
+    """
+    breaks = np.flatnonzero(np.diff(days) > 1) + 1
+    first_days = days[np.concatenate([[0], breaks])]
+    last_days = days[np.concatenate([breaks - 1, [len(days) - 1]])]
+    return [(int(first_day * MILLISECONDS_PER_DAY - localize_milliseconds),
+        int((last_day + 1) * MILLISECONDS_PER_DAY - localize_milliseconds))
+        for first_day, last_day in zip(first_days, last_days)]
@@ -0,0 +1,200 @@
+"""
+This module contains the process-wide manager of Cassandra cluster and session.
+Both CassandraDataAccess and RawCassandraDataAccess get their session from
+here, so that one process connects to a cluster only once, and cqlengine
+models use the same session as the raw queries.
+
+Scans decode pages into NumPy arrays with the columnar execution profile. When
+the NumPy protocol handler of the driver is available, they use a second
+session of the same cluster, since the protocol handler is set per session
+and cqlengine needs rows as dictionaries.
+"""
+import os
+import threading
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import TokenAwarePolicy, DCAwareRoundRobinPolicy
+from cassandra.policies import HostDistance
+from cassandra.query import dict_factory, tuple_factory
+from cassandra.cqlengine import connection, CQLEngineException
+from solar_data_pipeline.database.utilities.columnar import\
+    COLUMNAR_PROFILE, columnar_factory, get_numpy_protocol_handler
+
+class SessionManager:
+    """
+    Creates the cluster and session lazily on first use and keeps them until
+    closed. After a fork, the child process discards the inherited cluster
+    without shutting it down, since its sockets and threads belong to the
+    parent, and connects again on next use.
+
+    Arguments
+    -----------------
+    contact_points : list
+        IP addresses of Cassandra nodes.
+    keyspace : string
+        Keyspace the session is connected to.
+    local_dc : string
+        Name of local data center. The data center of the first contact point
+        is used if None.
+    protocol_version : integer
+        Version of native protocol. Negotiated with the cluster if None.
+    core_connections_per_host : integer
+        Number of connections kept open to each local host. Only applied with
+        protocol version 1 or 2, since later versions multiplex requests on one
+        connection per host.
+    max_connections_per_host : integer
+        Maximum number of connections to each local host. Only applied with
+        protocol version 1 or 2.
+    executor_threads : integer
+        Number of threads running the callbacks of the driver.
+    """
+
+    def __init__(self, contact_points, keyspace='measurements', local_dc=None,
+        protocol_version=None, core_connections_per_host=None,
+        max_connections_per_host=None, executor_threads=2):
+        self._contact_points = contact_points
+        self._keyspace = keyspace
+        self._local_dc = local_dc
+        self._protocol_version = protocol_version
+        self._core_connections_per_host = core_connections_per_host
+        self._max_connections_per_host = max_connections_per_host
+        self._executor_threads = executor_threads
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._cluster = None
+        self._session = None
+        self._columnar_session = None
+
+    def get_session(self, columnar=False):
+        """
+        Arguments
+        -----------------
+        columnar : boolean
+            If True, returns the session for queries executed with the
+            columnar execution profile.
+
+        Returns
+        -------
+        cassandra.cluster.Session
+            Session of this process, created on first call.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._discard_after_fork()
+            if self._session is None:
+                self._connect()
+            if columnar:
+                if self._columnar_session is None:
+                    self._connect_columnar()
+                return self._columnar_session
+            return self._session
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._discard_after_fork()
+                return
+            if self._cluster is not None:
+                if _is_cqlengine_session(self._session):
+                    connection.unregister_connection('default')
+                self._cluster.shutdown()
+            self._cluster = None
+            self._session = None
+            self._columnar_session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def _connect(self):
+        # cqlengine models require dictionaries as rows:
+        profile = ExecutionProfile(
+            load_balancing_policy=self._make_load_balancing_policy(),
+            row_factory=dict_factory)
+        # The NumPy protocol handler returns pages as dictionaries of arrays,
+        # which tuple_factory passes through:
+        if get_numpy_protocol_handler() is not None:
+            columnar_row_factory = tuple_factory
+        else:
+            columnar_row_factory = columnar_factory
+        columnar_profile = ExecutionProfile(
+            load_balancing_policy=self._make_load_balancing_policy(),
+            row_factory=columnar_row_factory)
+        cluster_options = {}
+        if self._protocol_version is not None:
+            cluster_options['protocol_version'] = self._protocol_version
+        cluster = Cluster(self._contact_points,
+            execution_profiles={EXEC_PROFILE_DEFAULT: profile,
+                                COLUMNAR_PROFILE: columnar_profile},
+            executor_threads=self._executor_threads, **cluster_options)
+        if (self._protocol_version is not None and
+            self._protocol_version < 3):
+            if self._max_connections_per_host is not None:
+                cluster.set_max_connections_per_host(HostDistance.LOCAL,
+                    self._max_connections_per_host)
+            if self._core_connections_per_host is not None:
+                cluster.set_core_connections_per_host(HostDistance.LOCAL,
+                    self._core_connections_per_host)
+        session = cluster.connect(self._keyspace)
+        connection.set_session(session)
+        self._cluster = cluster
+        self._session = session
+
+    def _connect_columnar(self):
+        numpy_protocol_handler = get_numpy_protocol_handler()
+        if numpy_protocol_handler is None:
+            self._columnar_session = self._session
+        else:
+            session = self._cluster.connect(self._keyspace)
+            session.client_protocol_handler = numpy_protocol_handler
+            self._columnar_session = session
+
+    def _make_load_balancing_policy(self):
+        return TokenAwarePolicy(
+            DCAwareRoundRobinPolicy(local_dc=self._local_dc))
+
+    def _discard_after_fork(self):
+        # cqlengine keeps the inherited session until _connect replaces it.
+        self._pid = os.getpid()
+        self._cluster = None
+        self._session = None
+        self._columnar_session = None
+
+def _is_cqlengine_session(session):
+    try:
+        return connection.get_session() is session
+    except CQLEngineException:
+        return False
+
+_session_managers = {}
+_session_manager_options = {}
+_session_managers_lock = threading.Lock()
+
+def get_session_manager(ip_address, **kwargs):
+    """
+    Returns the session manager of this process for the given address, creating
+    it on first call. Keyword arguments are passed to SessionManager, e.g. as
+    session_options of CassandraDataAccess. Since the session manager is
+    shared, later calls must give either no keyword arguments or the same
+    ones.
+    """
+    with _session_managers_lock:
+        if ip_address not in _session_managers:
+            _session_managers[ip_address] = SessionManager([ip_address],
+                **kwargs)
+            _session_manager_options[ip_address] = kwargs
+        elif kwargs and kwargs != _session_manager_options[ip_address]:
+            raise ValueError("Session manager of " + ip_address +
+                " was created with other options: " +
+                repr(_session_manager_options[ip_address]))
+        return _session_managers[ip_address]
+
+def close_all():
+    """
+    Closes the sessions of all session managers of this process.
+    """
+    with _session_managers_lock:
+        session_managers = list(_session_managers.values())
+    for session_manager in session_managers:
+        session_manager.close()
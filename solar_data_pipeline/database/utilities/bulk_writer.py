@@ -0,0 +1,212 @@
+"""
+This module contains the bulk writer of raw measurements. Rows are bound to
+one prepared insert, grouped into unlogged batches of one partition each, and
+the batches are executed concurrently by ConcurrentFetchEngine, which limits
+the number of batches in flight and retries failed batches, instead of one
+synchronous round trip per row.
+"""
+from datetime import date, datetime
+import numpy as np
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+from cassandra.query import BatchStatement, BatchType
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine, FetchRequest
+from solar_data_pipeline.database.utilities.statements import\
+    get_prepared_statement
+from solar_data_pipeline.utilities.power_matrix import MILLISECONDS_PER_DAY,\
+    MILLISECONDS_PER_MINUTE, to_milliseconds
+
+INSERT_CQL = ("insert into measurement_raw " +
+    "(site, meas_name, ts, sensor, station, company, meas_val_f) " +
+    "values (?, ?, ?, ?, ?, ?, ?)")
+
+class BulkWriter:
+    """
+    Arguments
+    -----------------
+    session : cassandra.cluster.Session
+        Session connected to measurements keyspace.
+    rows_per_batch : integer
+        Number of rows of one batch. Batches above 5 kB, about 80 rows, are
+        logged as warnings by Cassandra with default settings.
+    batches_per_window : integer
+        Number of batches made and executed at a time, so that memory does
+        not grow with the number of rows.
+    fetch_engine : ConcurrentFetchEngine
+        Engine executing the batches of a window concurrently. An engine with
+        default settings is used if None.
+    """
+
+    def __init__(self, session, rows_per_batch=50, batches_per_window=1000,
+        fetch_engine=None):
+        self._session = session
+        self._rows_per_batch = rows_per_batch
+        self._batches_per_window = batches_per_window
+        if fetch_engine is None:
+            fetch_engine = ConcurrentFetchEngine(session)
+        self._fetch_engine = fetch_engine
+
+    def write_columns(self, site, meas_name, timestamps, values, sensors='',
+        station='', company=''):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        meas_name : string
+            Name of measurement.
+        timestamps : numpy array
+            Timestamp of each sample in UTC, as int64 milliseconds since
+            epoch or as datetime64.
+        values : numpy array
+            Value of each sample. NaN is written as null.
+        sensors : string or numpy array
+            Name of sensor of all samples, or of each sample.
+        station : string
+            Name of station.
+        company : string
+            Name of company.
+
+        Returns
+        -------
+        integer
+            Number of written rows.
+        """
+        timestamps = to_milliseconds(timestamps).tolist()
+        values = np.asarray(values, dtype=np.float64)
+        # NaN is not null in Cassandra:
+        values = np.where(np.isnan(values), None, values).tolist()
+        if np.ndim(sensors) == 0:
+            sensors = [sensors] * len(timestamps)
+        else:
+            sensors = np.asarray(sensors).tolist()
+
+        prepared_statement = get_prepared_statement(self._session,
+            INSERT_CQL)
+        number_of_rows = len(timestamps)
+        rows_per_window = self._rows_per_batch * self._batches_per_window
+        for window_start in range(0, number_of_rows, rows_per_window):
+            window_end = min(window_start + rows_per_window, number_of_rows)
+            requests = []
+            for batch_start in range(window_start, window_end,
+                self._rows_per_batch):
+                batch_end = min(batch_start + self._rows_per_batch,
+                    window_end)
+                # All rows of a batch are in one partition, thus the batch
+                # is applied by the replicas of that partition only:
+                batch = self._get_batch_factory()()
+                for i in range(batch_start, batch_end):
+                    batch.add(prepared_statement.bind((site, meas_name,
+                        timestamps[i], sensors[i], station, company,
+                        values[i])))
+                requests.append(FetchRequest(batch, _NULL_BUFFER,
+                    execution_profile=EXEC_PROFILE_DEFAULT))
+            self._fetch_engine.fetch(requests)
+        return number_of_rows
+
+    def write_power_matrix(self, site, power_matrix, first_date,
+        meas_name='ac_power', sensor='', station='', company='',
+        localize_hours=-8, sampling_interval_minutes=5):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        power_matrix : numpy array
+            Matrix with row for time of day and column for dates. NaN values
+            are not written.
+        first_date : date
+            Date of first column, in local time.
+        localize_hours : integer
+            Hours added to UTC to make local time. Timestamps of Cassandra
+            database are in UTC and localized to PST by data transformations.
+        sampling_interval_minutes : integer
+            Interval of rows in minutes.
+
+        Other arguments are as in write_columns.
+
+        Returns
+        -------
+        integer
+            Number of written rows.
+        """
+        power_matrix = np.asarray(power_matrix, dtype=np.float64)
+        if isinstance(first_date, datetime):
+            first_date = first_date.date()
+        first_day = (first_date - date(1970, 1, 1)).days
+        number_of_steps, number_of_days = power_matrix.shape
+        local_timestamps = (
+            (first_day + np.arange(number_of_days, dtype=np.int64))
+            [np.newaxis, :] * MILLISECONDS_PER_DAY +
+            np.arange(number_of_steps, dtype=np.int64)[:, np.newaxis] *
+            sampling_interval_minutes * MILLISECONDS_PER_MINUTE)
+        timestamps = local_timestamps - (
+            localize_hours * 60 * MILLISECONDS_PER_MINUTE)
+        # Columns one after another are in order of time:
+        timestamps = timestamps.ravel(order='F')
+        values = power_matrix.ravel(order='F')
+        is_valid = ~np.isnan(values)
+        return self.write_columns(site, meas_name, timestamps[is_valid],
+            values[is_valid], sensors=sensor, station=station,
+            company=company)
+
+    def write_data_frame(self, site, data_frame, datetimekey='ts',
+        value_key='meas_val_f', sensor_key=None, meas_name='ac_power',
+        station='', company=''):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        data_frame : pandas DataFrame
+            Samples of the site, with timestamps in UTC.
+        datetimekey : string
+            Name of column of timestamps, as datetime64 or as milliseconds
+            since epoch.
+        value_key : string
+            Name of column of values.
+        sensor_key : string
+            Name of column of names of sensors. Sensor is empty if None.
+
+        Other arguments are as in write_columns.
+
+        Returns
+        -------
+        integer
+            Number of written rows.
+        """
+        sensors = '' if sensor_key is None else\
+            data_frame[sensor_key].astype(str).values
+        return self.write_columns(site, meas_name,
+            data_frame[datetimekey].values, data_frame[value_key].values,
+            sensors=sensors, station=station, company=company)
+
+    def _get_batch_factory(self):
+        if ((not hasattr(self, '_batch_factory')) or
+           (self._batch_factory is None)):
+           self._batch_factory = _make_unlogged_batch
+        return self._batch_factory
+
+    def _set_batch_factory(self, batch_factory):
+        """
+        For dependency injection for testing, i.e. for injecting mock.
+        This method is set to be private, in order to indicate that it is
+        not accessed from the client code.
+        """
+        self._batch_factory = batch_factory
+
+def _make_unlogged_batch():
+    return BatchStatement(batch_type=BatchType.UNLOGGED)
+
+class _NullBuffer:
+    """
+    Buffer of FetchRequest of writes, which have no rows.
+    """
+
+    def append_page(self, rows):
+        pass
+
+    def clear(self):
+        pass
+
+_NULL_BUFFER = _NullBuffer()
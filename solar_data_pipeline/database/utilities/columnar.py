@@ -0,0 +1,257 @@
+"""
+This module contains the columnar decoding of query results. Each page of a
+result is decoded into a dictionary of NumPy arrays, either by the NumPy
+protocol handler of Cassandra driver or by columnar_factory, and copied into
+typed column buffers, so that samples never travel as Python row objects.
+Pages may also be downsampled into time buckets as they are decoded, so that
+coarse retrievals keep one row per bucket instead of every sample.
+"""
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.utilities.power_matrix import\
+    MILLISECONDS_PER_MINUTE, MILLISECONDS_PER_DAY, SENTINEL_VALUE
+
+COLUMNAR_PROFILE = 'columnar'
+
+def get_numpy_protocol_handler():
+    """
+    Returns
+    -------
+    class
+        NumPy protocol handler of Cassandra driver, or None if the driver is
+        built without Cython and NumPy support or the handler is not
+        compatible with the installed NumPy.
+    """
+    try:
+        from cassandra.protocol import NumpyProtocolHandler
+    except ImportError:
+        return None
+    # The handler swaps byte order with ndarray.newbyteorder:
+    if not hasattr(np.ndarray, 'newbyteorder'):
+        return None
+    return NumpyProtocolHandler
+
+def columnar_factory(colnames, rows):
+    """
+    Row factory returning one page as a dictionary of column name to NumPy
+    array, in the same format as the NumPy protocol handler.
+    """
+    return {name: np.array([row[i] for row in rows])
+        for i, name in enumerate(colnames)}
+
+class ColumnBuffer:
+    """
+    Growable typed column buffers, which pages are appended to. Capacity is
+    doubled when a page does not fit, so that appending pages is amortized
+    constant time per row.
+
+    Arguments
+    -----------------
+    dtypes : dictionary
+        Key: Name of column.
+        Value: NumPy dtype of column.
+    capacity : integer
+        Initial number of rows.
+    """
+
+    def __init__(self, dtypes, capacity=5000):
+        self._dtypes = dtypes
+        self._columns = {name: np.empty(max(capacity, 1), dtype=dtype)
+            for name, dtype in dtypes.items()}
+        self._size = 0
+
+    def append_page(self, page):
+        """
+        Arguments
+        -----------------
+        page : dictionary
+            Key: Name of column.
+            Value: NumPy array, masked where values are null.
+        """
+        number_of_rows = len(next(iter(page.values()))) if page else 0
+        if number_of_rows == 0:
+            return
+        self._reserve(self._size + number_of_rows)
+        for name, dtype in self._dtypes.items():
+            self._columns[name][self._size:self._size + number_of_rows] =\
+                _to_dtype(page[name], dtype)
+        self._size += number_of_rows
+
+    def clear(self):
+        self._size = 0
+
+    def columns(self):
+        return {name: column[:self._size]
+            for name, column in self._columns.items()}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, required_capacity):
+        capacity = len(next(iter(self._columns.values())))
+        if required_capacity <= capacity:
+            return
+        while capacity < required_capacity:
+            capacity *= 2
+        for name, column in self._columns.items():
+            new_column = np.empty(capacity, dtype=column.dtype)
+            new_column[:self._size] = column[:self._size]
+            self._columns[name] = new_column
+
+class DownsamplingBuffer:
+    """
+    Column buffer which pages are downsampled into as they are appended.
+    Values are averaged in time buckets starting at multiples of the interval
+    since epoch, for each sensor and measurement, so that one row is kept per
+    bucket. NaN and SENTINEL_VALUE are left out of averages, and a bucket
+    without other values is NaN. Buckets spanning several pages, or the
+    buffers of several windows, are merged by columns.
+
+    Arguments
+    -----------------
+    dtypes : dictionary
+        Key: Name of column, which must include ts_ms and meas_val_f.
+        Value: NumPy dtype of column.
+    sampling_interval_minutes : integer
+        Length of time bucket in minutes, which a day must be a multiple of.
+    capacity : integer
+        Initial number of buckets.
+    """
+
+    def __init__(self, dtypes, sampling_interval_minutes, capacity=5000):
+        if MILLISECONDS_PER_DAY % (sampling_interval_minutes *
+            MILLISECONDS_PER_MINUTE) != 0:
+            raise ValueError("A day must be a multiple of the interval.")
+        self._dtypes = dtypes
+        self._interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+        self._key_names = [name for name in dtypes
+            if name not in ('ts_ms', 'meas_val_f')]
+        # Sums and counts of values are kept, so that partial buckets are
+        # merged exactly:
+        self._partial_buffer = ColumnBuffer(dict(dtypes,
+            meas_val_f=np.float64, count=np.int64), capacity=capacity)
+
+    def append_page(self, page):
+        """
+        Arguments
+        -----------------
+        page : dictionary
+            Key: Name of column.
+            Value: NumPy array, masked where values are null.
+        """
+        number_of_rows = len(next(iter(page.values()))) if page else 0
+        if number_of_rows == 0:
+            return
+        columns = {name: _to_dtype(page[name], self._dtypes[name])
+            for name in self._key_names}
+        columns['ts_ms'] = (_to_dtype(page['ts_ms'], np.int64) //
+            self._interval * self._interval)
+        values = _to_dtype(page['meas_val_f'], np.float64)
+        is_valid = ~np.isnan(values) & (values != SENTINEL_VALUE)
+        self._partial_buffer.append_page(self._aggregate(columns,
+            np.where(is_valid, values, 0.0), is_valid.astype(np.int64)))
+
+    def extend(self, other):
+        """
+        Appends the buckets of another buffer with the same columns, e.g. of
+        the next window of a scan.
+        """
+        self._partial_buffer.append_page(other._partial_buffer.columns())
+
+    def clear(self):
+        self._partial_buffer.clear()
+
+    def columns(self):
+        """
+        Returns
+        -------
+        dictionary
+            Key: Name of column.
+            Value: NumPy array with one row per bucket, sorted by measurement,
+            time and sensor, where ts_ms is the start of the bucket and
+            meas_val_f the average of its values.
+        """
+        partial_columns = self._partial_buffer.columns()
+        columns = self._aggregate(partial_columns,
+            partial_columns['meas_val_f'], partial_columns['count'])
+        counts = columns.pop('count')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns['meas_val_f'] = (columns['meas_val_f'] /
+                counts).astype(self._dtypes['meas_val_f'])
+        return columns
+
+    def __len__(self):
+        return len(self._partial_buffer)
+
+    def _aggregate(self, columns, sums, counts):
+        """
+        Sums values and counts of rows with the same bucket, sensor and
+        measurement.
+        """
+        key_names = [name for name in self._key_names if name != 'sensor']
+        key_names += ['ts_ms'] + [name for name in self._key_names
+            if name == 'sensor']
+        number_of_rows = len(columns['ts_ms'])
+        keys = np.empty((number_of_rows, len(key_names)), dtype=np.int64)
+        for i, name in enumerate(key_names):
+            keys[:, i] = columns[name] if name == 'ts_ms' else\
+                pd.factorize(columns[name], sort=True)[0]
+        # Rows are sorted by their keys, in the clustering order of the table:
+        _, first_indices, inverse = np.unique(keys, axis=0,
+            return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        aggregated_columns = {name: columns[name][first_indices]
+            for name in key_names}
+        aggregated_columns['meas_val_f'] = np.bincount(inverse, weights=sums,
+            minlength=len(first_indices))
+        aggregated_columns['count'] = np.bincount(inverse, weights=counts,
+            minlength=len(first_indices)).astype(np.int64)
+        return aggregated_columns
+
+class MeasurementColumns:
+    """
+    Measurements of one site and one measurement name, as columns.
+
+    Arguments
+    -----------------
+    site : string
+        Name of site.
+    meas_name : string or numpy array
+        Name of measurement, or of measurement of each sample.
+    sensor : numpy array
+        Name of sensor of each sample.
+    ts : numpy array
+        Timestamp of each sample as int64 milliseconds since epoch.
+    meas_val_f : numpy array
+        Value of each sample as float64, or as the value type of the scanner,
+        NaN where null.
+    """
+
+    def __init__(self, site, meas_name, sensor, ts, meas_val_f):
+        self.site = site
+        self.meas_name = meas_name
+        self.sensor = sensor
+        self.ts = ts
+        self.meas_val_f = meas_val_f
+
+    def __len__(self):
+        return len(self.ts)
+
+    def to_data_frame(self):
+        """
+        Returns
+        -------
+        pandas DataFrame
+            With the columns of a measurement_raw query result, as used by
+            make_time_series.
+        """
+        return pd.DataFrame({'site': self.site, 'meas_name': self.meas_name,
+            'sensor': self.sensor, 'ts': pd.to_datetime(self.ts, unit='ms'),
+            'meas_val_f': self.meas_val_f})
+
+def _to_dtype(values, dtype):
+    if isinstance(values, np.ma.MaskedArray):
+        if np.dtype(dtype).kind == 'f':
+            return values.astype(dtype).filled(np.nan)
+        return values.astype(dtype).filled()
+    return np.asarray(values).astype(dtype, copy=False)
@@ -10,15 +10,32 @@ from solardatatools.data_transforms\
  import standardize_time_axis, make_2d, fix_time_shifts
 from solar_data_pipeline.utilities.data_trainsformation\
  import AbstractDataTransformation
+from solar_data_pipeline.database.utilities.columnar\
+ import MeasurementColumns
+from solar_data_pipeline.utilities.power_matrix\
+ import make_power_matrix, measurement_arrays
 
 class AllDataTransformation(AbstractDataTransformation):
+    """
+    Arguments
+    -----------------
+    fast_path : boolean
+        If True, the power matrix is built by make_power_matrix with NumPy.
+        If False, by make_time_series, standardize_time_axis and make_2d with
+        pandas, which is kept as the reference.
+    """
+
+    version = 1
+
+    def __init__(self, fast_path=True):
+        self._fast_path = fast_path
 
     def transform(self, data_array, datetimekey='Date-Time',
         ac_power_key='ac_power'):
         """
         Arguments
         -----------------
-        data_array : numpy array
+        data_array : numpy array or MeasurementColumns
             Data from the data source
 
         Returns
@@ -27,17 +44,41 @@ class AllDataTransformation(AbstractDataTransformation):
             Representing a matrix with row for dates and colum for time of day,
             containing power signals.
         """
-        data_frame = pd.DataFrame(data_array.tolist())
-        data_frame.replace(-999999.0, np.NaN, inplace=True)
+        instrumentation = self._get_instrumentation()
+        dtype_policy = self._get_dtype_policy()
+        if self._fast_path:
+            with instrumentation.span('transform.make_power_matrix') as span:
+                span.add_data(data_array)
+                timestamps, values, sensors = measurement_arrays(data_array)
+                # make_time_series localizes timestamps to PST:
+                return dtype_policy.encode(make_power_matrix(timestamps,
+                    values, sensors=sensors, sampling_interval_minutes=
+                    self._get_sampling_interval_minutes(), localize_hours=-8,
+                    dtype=dtype_policy.value_dtype))
+        with instrumentation.span('transform.to_data_frame') as span:
+            span.add_data(data_array)
+            if isinstance(data_array, MeasurementColumns):
+                # Columns decoded from pages are used without row objects:
+                data_frame = data_array.to_data_frame()
+            else:
+                data_frame = pd.DataFrame(data_array.tolist())
+            data_frame.replace(-999999.0, np.NaN, inplace=True)
         # data_frame.set_index(datetimekey)
         # standardize_time_axis function from solar-data-tools fails:
-        time_series_data_frame = make_time_series(data_frame,
-            return_keys=False)
-        standardized_data_frame = standardize_time_axis(time_series_data_frame)
-        power_matrix = make_2d(standardized_data_frame, key=ac_power_key,
-            zero_nighttime=True, interp_missing=True)
+        with instrumentation.span('transform.make_time_series') as span:
+            span.add_data(data_frame)
+            time_series_data_frame = make_time_series(data_frame,
+                return_keys=False)
+        with instrumentation.span('transform.standardize_time_axis') as span:
+            span.add_data(time_series_data_frame)
+            standardized_data_frame = standardize_time_axis(
+                time_series_data_frame)
+        with instrumentation.span('transform.make_2d') as span:
+            power_matrix = make_2d(standardized_data_frame,
+                key=ac_power_key, zero_nighttime=True, interp_missing=True)
+            span.add_data(power_matrix)
         # There seems to be a problem in make_time_series function:
         # time_series_size = (len(time_series_data_frame.index) // 288) * 288
         # power_matrix = time_series_data_frame.iloc[
         #     :time_series_size].values.reshape(288, -1, order='F')
-        return power_matrix
+        return dtype_policy.encode(power_matrix)
@@ -0,0 +1,161 @@
+"""
+This module contains the engine to run many paged queries concurrently through
+the asynchronous API of Cassandra driver.
+"""
+import threading
+from collections import deque
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+
+class FetchRequest:
+    """
+    Paged query and the buffer its pages are appended to.
+
+    Arguments
+    -----------------
+    statement : cassandra.query.Statement
+        Statement to execute. Its fetch_size determines the page size.
+    buffer : object
+        Object with append_page(rows) and clear() methods.
+    execution_profile : string
+        Name of execution profile the statement is executed with.
+    """
+
+    def __init__(self, statement, buffer,
+        execution_profile=EXEC_PROFILE_DEFAULT):
+        self.statement = statement
+        self.buffer = buffer
+        self.execution_profile = execution_profile
+
+class ConcurrentFetchEngine:
+    """
+    Executes paged queries with execute_async, keeping at most a given number
+    of queries in flight.
+
+    Arguments
+    -----------------
+    session : cassandra.cluster.Session
+        Session connected to measurements keyspace.
+    max_in_flight : integer
+        Maximum number of queries executed at the same time.
+    timeout : float
+        Timeout in seconds of each page request.
+    retries : integer
+        Number of times a failed query is restarted from its first page.
+    """
+
+    def __init__(self, session, max_in_flight=32, timeout=30.0, retries=2):
+        self._session = session
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._retries = retries
+
+    def fetch(self, requests):
+        """
+        Arguments
+        -----------------
+        requests : list
+            FetchRequest objects.
+
+        Returns
+        -------
+        list
+            Buffers of the requests, in the order of the requests.
+        """
+        _FetchRun(self._session, requests, self._max_in_flight,
+            self._timeout, self._retries).wait()
+        return [request.buffer for request in requests]
+
+class _FetchRun:
+    """
+    State of one call to ConcurrentFetchEngine.fetch. Driver callbacks run on
+    the event loop thread of the driver, while the caller waits on the
+    condition.
+    """
+
+    def __init__(self, session, requests, max_in_flight, timeout, retries):
+        self._session = session
+        self._requests = requests
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._retries = retries
+        self._condition = threading.Condition()
+        self._pending = deque(range(len(requests)))
+        self._attempts = [0] * len(requests)
+        self._in_flight = 0
+        self._remaining = len(requests)
+        self._error = None
+        self._is_starting = False
+
+    def wait(self):
+        self._start_pending()
+        with self._condition:
+            while self._remaining > 0 and self._error is None:
+                self._condition.wait()
+            # Let the queries in flight finish, so that no callback writes to
+            # a buffer after the caller has taken it:
+            while self._in_flight > 0:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+
+    def _start_pending(self):
+        with self._condition:
+            # Only one thread starts queries at a time. Otherwise a response
+            # arriving immediately would start the next query recursively:
+            if self._is_starting:
+                return
+            self._is_starting = True
+        while True:
+            with self._condition:
+                if (self._error is not None or len(self._pending) == 0 or
+                    self._in_flight >= self._max_in_flight):
+                    self._is_starting = False
+                    return
+                index = self._pending.popleft()
+                self._in_flight += 1
+            # A callback may run in this thread if the response has already
+            # arrived, so the lock is not held here:
+            self._execute(index)
+
+    def _execute(self, index):
+        request = self._requests[index]
+        request.buffer.clear()
+        self._attempts[index] += 1
+        try:
+            future = self._session.execute_async(request.statement,
+                timeout=self._timeout,
+                execution_profile=request.execution_profile)
+        except Exception as exception:
+            self._on_error(exception, index)
+            return
+        future.add_callbacks(callback=self._on_page,
+            callback_args=(index, future), errback=self._on_error,
+            errback_args=(index,))
+
+    def _on_page(self, rows, index, future):
+        try:
+            self._requests[index].buffer.append_page(rows)
+        except Exception as exception:
+            self._fail(exception)
+            return
+        if future.has_more_pages:
+            future.start_fetching_next_page()
+        else:
+            with self._condition:
+                self._in_flight -= 1
+                self._remaining -= 1
+                self._condition.notify_all()
+            self._start_pending()
+
+    def _on_error(self, exception, index):
+        if self._attempts[index] <= self._retries and self._error is None:
+            self._execute(index)
+        else:
+            self._fail(exception)
+
+    def _fail(self, exception):
+        with self._condition:
+            if self._error is None:
+                self._error = exception
+            self._in_flight -= 1
+            self._condition.notify_all()
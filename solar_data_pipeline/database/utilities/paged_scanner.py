@@ -0,0 +1,386 @@
+"""
+This module contains the code to scan the measurements of a site page by page.
+The time range of a site is split into windows that are scanned concurrently,
+and each page is decoded into typed column buffers as soon as it arrives,
+so that there is neither a row limit nor a list of all row objects in memory.
+With a sampling interval, pages are downsampled into time buckets as they are
+decoded, so that only one row per bucket is kept for transformations.
+"""
+import calendar
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine, FetchRequest
+from solar_data_pipeline.database.utilities.statements import\
+    get_prepared_statement
+from solar_data_pipeline.database.utilities.columnar import\
+    ColumnBuffer, DownsamplingBuffer, MeasurementColumns, COLUMNAR_PROFILE
+
+# Timestamps are selected as bigint milliseconds, which are decoded into
+# int64 arrays without creating datetime objects:
+MEASUREMENT_DTYPES = {'sensor': object, 'ts_ms': np.int64,
+    'meas_val_f': np.float64}
+TIMESTAMP_DTYPES = {'ts_ms': np.int64}
+CHANNEL_DTYPES = {'meas_name': object, 'sensor': object, 'ts_ms': np.int64,
+    'meas_val_f': np.float64}
+
+FIRST_TS_CQL = ("select toUnixTimestamp(ts) as ts_ms from measurement_raw " +
+    "where site = ? and meas_name = ? limit 1")
+LAST_TS_CQL = ("select toUnixTimestamp(ts) as ts_ms from measurement_raw " +
+    "where site = ? and meas_name = ? " +
+    "order by meas_name desc, ts desc limit 1")
+WINDOW_CQL = ("select sensor, toUnixTimestamp(ts) as ts_ms, meas_val_f " +
+    "from measurement_raw " +
+    "where site = ? and meas_name = ? and ts >= ? and ts < ?")
+LAST_WINDOW_CQL = ("select sensor, toUnixTimestamp(ts) as ts_ms, meas_val_f " +
+    "from measurement_raw " +
+    "where site = ? and meas_name = ? and ts >= ? and ts <= ?")
+# Measurements are clustering columns of the partition of a site, thus the
+# windows of several measurements are read in one slice:
+CHANNEL_WINDOW_CQL = ("select meas_name, sensor, " +
+    "toUnixTimestamp(ts) as ts_ms, meas_val_f from measurement_raw " +
+    "where site = ? and meas_name in ? and ts >= ? and ts < ?")
+CHANNEL_LAST_WINDOW_CQL = ("select meas_name, sensor, " +
+    "toUnixTimestamp(ts) as ts_ms, meas_val_f from measurement_raw " +
+    "where site = ? and meas_name in ? and ts >= ? and ts <= ?")
+PARTITION_CQL = ("select sensor, toUnixTimestamp(ts) as ts_ms, meas_val_f " +
+    "from measurement_raw " +
+    "where site = ? and meas_name = ?")
+
+class PagedScanner:
+    """
+    Scans the raw measurements of sites in time windows.
+
+    Arguments
+    -----------------
+    session : cassandra.cluster.Session
+        Session connected to measurements keyspace, with an execution profile
+        decoding pages into columns.
+    fetch_size : integer
+        Number of rows per page.
+    window : timedelta
+        Length of time window scanned by one query.
+    fetch_engine : ConcurrentFetchEngine
+        Engine executing the queries of the windows concurrently. An engine
+        with default settings is used if None.
+    execution_profile : string
+        Name of execution profile decoding pages into columns.
+    value_dtype : numpy dtype
+        Floating point type values are decoded into, e.g. float32 to halve
+        the memory of measurements.
+    sampling_interval_minutes : integer
+        Length of time buckets measurements are averaged in while pages are
+        decoded, e.g. 60 for hourly values. Raw measurements if None.
+    """
+
+    def __init__(self, session, fetch_size=5000, window=timedelta(days=30),
+        fetch_engine=None, execution_profile=COLUMNAR_PROFILE,
+        value_dtype=np.float64, sampling_interval_minutes=None):
+        self._session = session
+        self._fetch_size = fetch_size
+        self._window_milliseconds = int(window.total_seconds() * 1000)
+        if fetch_engine is None:
+            fetch_engine = ConcurrentFetchEngine(session)
+        self._fetch_engine = fetch_engine
+        self._execution_profile = execution_profile
+        self._value_dtype = value_dtype
+        self._sampling_interval_minutes = sampling_interval_minutes
+
+    def scan(self, site, meas_name='ac_power', start_time=None,
+        end_time=None):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        meas_name : string
+            Name of measurement.
+        start_time : datetime
+            Inclusive lower bound of time range. First timestamp of the site if
+            None.
+        end_time : datetime
+            Inclusive upper bound of time range. Last timestamp of the site if
+            None.
+
+        Returns
+        -------
+        MeasurementColumns
+            Measurements sorted by time.
+        """
+        return self.scan_sites([site], meas_name=meas_name,
+            start_time=start_time, end_time=end_time)[0]
+
+    def scan_sites(self, sites, meas_name='ac_power', start_time=None,
+        end_time=None):
+        """
+        Scans all windows of all sites concurrently.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        start_time : datetime or list
+            Inclusive lower bound of time range, for all sites or as a list
+            with one lower bound per site. First timestamp of a site if None.
+
+        Other arguments are the same as scan.
+
+        Returns
+        -------
+        list
+            MeasurementColumns as returned by scan, in the order of sites.
+        """
+        window_lists = self._make_window_lists(sites, meas_name,
+            start_time=start_time, end_time=end_time)
+        return self._scan_windows(sites, meas_name, window_lists)
+
+    def scan_ranges(self, sites, ranges_list, meas_name='ac_power'):
+        """
+        Scans given time ranges of sites concurrently, e.g. only the days of a
+        sample, instead of their whole time range.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        ranges_list : list
+            For each site, list of tuples of inclusive lower bound and
+            exclusive upper bound in milliseconds, in time order.
+        meas_name : string
+            Name of measurement.
+
+        Returns
+        -------
+        list
+            MeasurementColumns as returned by scan, in the order of sites.
+        """
+        window_lists = [[(lower_bound, upper_bound, False)
+            for lower_bound, upper_bound in ranges] for ranges in ranges_list]
+        return self._scan_windows(sites, meas_name, window_lists)
+
+    def scan_measurements(self, sites, meas_names, start_time=None,
+        end_time=None):
+        """
+        Scans several measurements of sites in one pass, with one query per
+        window of a site for all measurements, instead of one scan per
+        measurement.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        meas_names : list
+            Name of measurements.
+        start_time : datetime
+            Inclusive lower bound of time range. First timestamp of any of
+            the measurements of a site if None.
+        end_time : datetime
+            Inclusive upper bound of time range. Last timestamp of any of the
+            measurements of a site if None.
+
+        Returns
+        -------
+        list
+            MeasurementColumns with the name of measurement of each sample,
+            in the order of sites. Samples are sorted by time in each
+            measurement.
+        """
+        meas_names = list(meas_names)
+        start_times_list = [self._query_timestamps(FIRST_TS_CQL, sites,
+            meas_name, start_time) for meas_name in meas_names]
+        end_times_list = [self._query_timestamps(LAST_TS_CQL, sites,
+            meas_name, end_time) for meas_name in meas_names]
+        window_lists = []
+        for i in range(len(sites)):
+            start_times = [start_times[i] for start_times in start_times_list
+                if start_times[i] is not None]
+            end_times = [end_times[i] for end_times in end_times_list
+                if end_times[i] is not None]
+            window_lists.append(self._make_windows(
+                min(start_times, default=None), max(end_times, default=None)))
+
+        requests = []
+        for site, windows in zip(sites, window_lists):
+            requests.extend([self._make_request(CHANNEL_LAST_WINDOW_CQL
+                if is_inclusive else CHANNEL_WINDOW_CQL,
+                (site, meas_names, lower_bound, upper_bound), CHANNEL_DTYPES)
+                for lower_bound, upper_bound, is_inclusive in windows])
+        buffers = self._fetch_engine.fetch(requests)
+
+        measurement_columns_list = []
+        for site, windows in zip(sites, window_lists):
+            columns_list = [buffer.columns() for buffer
+                in _merge_buffers(buffers[:len(windows)])] or [
+                ColumnBuffer(CHANNEL_DTYPES, capacity=1).columns()]
+            buffers = buffers[len(windows):]
+            measurement_columns_list.append(MeasurementColumns(site,
+                *[np.concatenate([columns[name] for columns in columns_list])
+                for name in ('meas_name', 'sensor', 'ts_ms', 'meas_val_f')]))
+        return measurement_columns_list
+
+    def query_time_bounds(self, sites, meas_name='ac_power'):
+        """
+        Looks up the first and last timestamps of sites with one single row
+        query each, all executed concurrently.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        meas_name : string
+            Name of measurement.
+
+        Returns
+        -------
+        list
+            Tuples of first and last timestamps in milliseconds, or of None
+            for sites without measurements, in the order of sites.
+        """
+        first_timestamps = self._query_timestamps(FIRST_TS_CQL, sites,
+            meas_name, None)
+        last_timestamps = self._query_timestamps(LAST_TS_CQL, sites,
+            meas_name, None)
+        return list(zip(first_timestamps, last_timestamps))
+
+    def _scan_windows(self, sites, meas_name, window_lists):
+        requests = []
+        for site, windows in zip(sites, window_lists):
+            requests.extend([self._make_window_request(site, meas_name,
+                *window) for window in windows])
+        buffers = self._fetch_engine.fetch(requests)
+
+        measurement_columns_list = []
+        for site, windows in zip(sites, window_lists):
+            site_buffers = buffers[:len(windows)]
+            buffers = buffers[len(windows):]
+            measurement_columns_list.append(_make_measurement_columns(site,
+                meas_name, site_buffers))
+        return measurement_columns_list
+
+    def scan_partitions(self, sites, meas_name='ac_power'):
+        """
+        Scans whole history of sites with one query per (site, meas_name)
+        partition, all executed concurrently.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        meas_name : string
+            Name of measurement.
+
+        Returns
+        -------
+        list
+            MeasurementColumns as returned by scan, in the order of sites.
+        """
+        requests = [self._make_request(PARTITION_CQL, (site, meas_name),
+            MEASUREMENT_DTYPES) for site in sites]
+        buffers = self._fetch_engine.fetch(requests)
+        return [_make_measurement_columns(site, meas_name, [buffer])
+            for site, buffer in zip(sites, buffers)]
+
+    def _make_window_lists(self, sites, meas_name, start_time=None,
+        end_time=None):
+        """
+        Returns
+        -------
+        list
+            For each site, list of tuples of (lower bound, upper bound, whether
+            upper bound is inclusive) in milliseconds, in time order.
+        """
+        start_times = self._query_timestamps(FIRST_TS_CQL, sites, meas_name,
+            start_time)
+        end_times = self._query_timestamps(LAST_TS_CQL, sites, meas_name,
+            end_time)
+        return [self._make_windows(site_start_time, site_end_time)
+            for site_start_time, site_end_time in zip(start_times, end_times)]
+
+    def _make_windows(self, start_time, end_time):
+        if start_time is None or end_time is None or start_time > end_time:
+            return []
+
+        windows = []
+        lower_bound = start_time
+        while lower_bound + self._window_milliseconds <= end_time:
+            windows.append((lower_bound,
+                lower_bound + self._window_milliseconds, False))
+            lower_bound += self._window_milliseconds
+        windows.append((lower_bound, end_time, True))
+        return windows
+
+    def _query_timestamps(self, cql, sites, meas_name, given_time):
+        """
+        Returns the given time in milliseconds for every site if it is not
+        None. Otherwise, looks up the first or last timestamp of every site
+        concurrently. The given time is either one time for all sites or a
+        list with one time per site.
+        """
+        if isinstance(given_time, list):
+            given_times = given_time
+        else:
+            given_times = [given_time] * len(sites)
+        timestamps = [None if time is None else to_epoch_milliseconds(time)
+            for time in given_times]
+
+        missing_indices = [i for i, time in enumerate(given_times)
+            if time is None]
+        requests = [self._make_request(cql, (sites[i], meas_name),
+            TIMESTAMP_DTYPES) for i in missing_indices]
+        buffers = self._fetch_engine.fetch(requests)
+        for i, buffer in zip(missing_indices, buffers):
+            if len(buffer) > 0:
+                timestamps[i] = int(buffer.columns()['ts_ms'][0])
+        return timestamps
+
+    def _make_window_request(self, site, meas_name, lower_bound, upper_bound,
+        is_inclusive):
+        cql = LAST_WINDOW_CQL if is_inclusive else WINDOW_CQL
+        return self._make_request(cql,
+            (site, meas_name, lower_bound, upper_bound), MEASUREMENT_DTYPES)
+
+    def _make_request(self, cql, values, dtypes):
+        if 'meas_val_f' in dtypes:
+            dtypes = dict(dtypes, meas_val_f=self._value_dtype)
+        statement = get_prepared_statement(self._session, cql).bind(values)
+        statement.fetch_size = self._fetch_size
+        if self._sampling_interval_minutes is not None and\
+            'meas_val_f' in dtypes:
+            buffer = DownsamplingBuffer(dtypes,
+                self._sampling_interval_minutes, capacity=self._fetch_size)
+        else:
+            buffer = ColumnBuffer(dtypes, capacity=self._fetch_size)
+        return FetchRequest(statement, buffer,
+            execution_profile=self._execution_profile)
+
+def to_epoch_milliseconds(time):
+    """
+    Arguments
+    -----------------
+    time : datetime
+        Time in UTC if naive, as Cassandra driver assumes.
+
+    Returns
+    -------
+    integer
+        Milliseconds since epoch.
+    """
+    return (calendar.timegm(time.utctimetuple()) * 1000 +
+        time.microsecond // 1000)
+
+def _merge_buffers(buffers):
+    # Buckets spanning two windows are merged into one row:
+    if len(buffers) > 1 and isinstance(buffers[0], DownsamplingBuffer):
+        for buffer in buffers[1:]:
+            buffers[0].extend(buffer)
+        return buffers[:1]
+    return buffers
+
+def _make_measurement_columns(site, meas_name, buffers):
+    columns_list = [buffer.columns() for buffer in _merge_buffers(buffers)]
+    if len(columns_list) == 0:
+        columns_list = [ColumnBuffer(MEASUREMENT_DTYPES, capacity=1).columns()]
+    return MeasurementColumns(site, meas_name,
+        np.concatenate([columns['sensor'] for columns in columns_list]),
+        np.concatenate([columns['ts_ms'] for columns in columns_list]),
+        np.concatenate([columns['meas_val_f'] for columns in columns_list]))
@@ -0,0 +1,453 @@
+"""
+This module contains the catalog of sites, which replaces the scans of all
+partitions of measurement_raw by which sites used to be listed.
+The catalog keeps the date bounds, number of rows and sampling interval of
+the power of each site, all found with single row or short queries, with its
+names of measurements and location, in a local file which is loaded in
+milliseconds. It is built again from the database when it is older than its
+maximum age.
+Optionally, the catalog also keeps quality scores of every day of every
+site, so that sites and days of low quality are never queried.
+"""
+import os
+import time
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine, FetchRequest
+from solar_data_pipeline.database.utilities.statements import\
+    get_prepared_statement
+from solar_data_pipeline.database.utilities.columnar import\
+    ColumnBuffer, COLUMNAR_PROFILE
+from solar_data_pipeline.database.utilities.paged_scanner import\
+    PagedScanner
+from solar_data_pipeline.database.cassandra import LOCALIZE_HOURS
+from solar_data_pipeline.utilities.power_matrix_cache import\
+    write_atomically
+from solar_data_pipeline.utilities.quality import score_days,\
+    QUALITY_SCORES
+
+SITES_CQL = "select distinct site from measurement_raw"
+# Skips to the next name of measurement, instead of reading the rows of the
+# current one:
+NEXT_MEAS_NAME_CQL = ("select meas_name from measurement_raw " +
+    "where site = ? and meas_name > ? limit 1")
+FIRST_TIMESTAMPS_CQL = ("select toUnixTimestamp(ts) as ts_ms " +
+    "from measurement_raw where site = ? and meas_name = ? limit {}")
+LAT_LON_CQL = ("select lat_lon.latitude as latitude, " +
+    "lat_lon.longitude as longitude from measurement_raw " +
+    "where site = ? limit 1")
+
+MEAS_NAME_SEPARATOR = ','
+NO_TIMESTAMP = -1
+# Prefix of the names of the columns of days in the file:
+DAY_COLUMN_PREFIX = 'days.'
+
+class SiteCatalog:
+    """
+    Catalog of sites, persisted in a local file.
+
+    Arguments
+    -----------------
+    file_path : string
+        Path of the file of the catalog, in NumPy npz format.
+    max_age : timedelta
+        Age after which the catalog is built again.
+    meas_name : string
+        Name of measurement, of which date bounds, number of rows and
+        sampling interval are recorded.
+    number_of_cadence_samples : integer
+        Number of first timestamps of each site the sampling interval is
+        estimated from.
+    score_quality : boolean
+        Whether to score the quality of every day of every site when the
+        catalog is built, which scans all measurements of meas_name once.
+    """
+
+    def __init__(self, file_path, max_age=timedelta(days=1),
+        meas_name='ac_power', number_of_cadence_samples=100,
+        score_quality=False):
+        self._file_path = file_path
+        self._max_age = max_age
+        self._meas_name = meas_name
+        self._number_of_cadence_samples = number_of_cadence_samples
+        self._score_quality = score_quality
+        self._columns = None
+        self._day_columns = None
+        self._refreshed_at = None
+
+    def is_stale(self):
+        """
+        Returns
+        -------
+        boolean
+            Whether the catalog is neither in memory nor in its file within
+            its maximum age.
+        """
+        if self._columns is None:
+            self.load()
+        return (self._columns is None or
+            time.time() - self._refreshed_at >
+            self._max_age.total_seconds())
+
+    def load(self):
+        """
+        Loads the catalog from its file, if the file exists.
+
+        Returns
+        -------
+        boolean
+            Whether the file exists.
+        """
+        try:
+            with np.load(self._file_path, allow_pickle=False) as data:
+                columns = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return False
+        self._refreshed_at = float(columns.pop('refreshed_at'))
+        self._day_columns = {name[len(DAY_COLUMN_PREFIX):]:
+            columns.pop(name) for name in list(columns)
+            if name.startswith(DAY_COLUMN_PREFIX)} or None
+        self._columns = columns
+        return True
+
+    def refresh(self, session, fetch_engine=None, fetch_size=5000):
+        """
+        Builds the catalog from the database and saves it to its file.
+
+        Arguments
+        -----------------
+        session : cassandra.cluster.Session
+            Session connected to measurements keyspace, with an execution
+            profile decoding pages into columns.
+        fetch_engine : ConcurrentFetchEngine
+            Engine executing the queries of the sites concurrently. An engine
+            with default settings is used if None.
+        fetch_size : integer
+            Number of rows per page.
+        """
+        if fetch_engine is None:
+            fetch_engine = ConcurrentFetchEngine(session)
+        catalog_scan = _SiteCatalogScan(session, fetch_engine, fetch_size)
+        self._columns = catalog_scan.scan(self._meas_name,
+            self._number_of_cadence_samples)
+        self._day_columns = None
+        if self._score_quality:
+            self._day_columns = catalog_scan.score(self._columns['site'],
+                self._meas_name)
+            self._columns.update(_summarize_scores(self._day_columns,
+                len(self._columns['site'])))
+        self._refreshed_at = time.time()
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self._file_path))
+        os.makedirs(directory, exist_ok=True)
+        columns = dict(self._columns)
+        if self._day_columns is not None:
+            columns.update({DAY_COLUMN_PREFIX + name: values
+                for name, values in self._day_columns.items()})
+        write_atomically(self._file_path, lambda file: np.savez(file,
+            refreshed_at=np.float64(self._refreshed_at), **columns))
+
+    def get_sites(self, meas_name=None, quality_thresholds=None):
+        """
+        Arguments
+        -----------------
+        meas_name : string
+            If given, only sites with measurements of this name are returned.
+        quality_thresholds : QualityThresholds
+            If given, only sites with enough qualifying days are returned.
+            Requires the catalog to be built with score_quality.
+
+        Returns
+        -------
+        numpy array
+            Name of sites, sorted.
+        """
+        sites = self._get_columns()['site']
+        is_selected = np.ones(len(sites), dtype=bool)
+        if meas_name is not None:
+            is_selected &= [meas_name in meas_names.split(MEAS_NAME_SEPARATOR)
+                for meas_names in self._get_columns()['meas_names']]
+        if quality_thresholds is not None:
+            day_columns = self._get_day_columns()
+            number_of_days = np.bincount(day_columns['site_index'][
+                quality_thresholds.select_days(day_columns)],
+                minlength=len(sites))
+            is_selected &= (number_of_days >=
+                quality_thresholds.min_number_of_days)
+        return sites[is_selected]
+
+    def get_days(self, site, quality_thresholds=None):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        quality_thresholds : QualityThresholds
+            If given, only qualifying days are returned.
+
+        Returns
+        -------
+        numpy array
+            Days with measurements as days since epoch in local time, sorted.
+            Requires the catalog to be built with score_quality.
+        """
+        scores = self.get_day_scores(site)
+        if quality_thresholds is None:
+            return scores['day']
+        return scores['day'][quality_thresholds.select_days(scores)]
+
+    def get_day_scores(self, site):
+        """
+        Returns
+        -------
+        dictionary
+            Quality scores of the days of the site, as returned by score_days
+            of solar_data_pipeline.utilities.quality.
+        """
+        day_columns = self._get_day_columns()
+        index = self._get_indices([site])[0]
+        start, end = np.searchsorted(day_columns['site_index'],
+            [index, index + 1]) if index >= 0 else (0, 0)
+        return {name: day_columns[name][start:end]
+            for name in ('day',) + QUALITY_SCORES}
+
+    def find_sites(self, site):
+        """
+        Returns
+        -------
+        numpy array
+            Name of site if it is in the catalog, otherwise empty.
+        """
+        sites = self._get_columns()['site']
+        return sites[sites == site]
+
+    def get_time_bounds(self, sites):
+        """
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+
+        Returns
+        -------
+        list
+            Tuples of first and last timestamps in milliseconds, or of None
+            for sites without measurements or not in the catalog, in the
+            order of sites.
+        """
+        columns = self._get_columns()
+        indices = self._get_indices(sites)
+        return [(None, None) if index < 0 or
+            columns['first_timestamp'][index] == NO_TIMESTAMP else
+            (int(columns['first_timestamp'][index]),
+             int(columns['last_timestamp'][index]))
+            for index in indices]
+
+    def get_entry(self, site):
+        """
+        Returns
+        -------
+        dictionary
+            Name of site, first and last timestamps in milliseconds, number
+            of rows, sampling interval in minutes, names of measurements,
+            latitude and longitude. None if the site is not in the catalog.
+        """
+        index = self._get_indices([site])[0]
+        if index < 0:
+            return None
+        columns = self._get_columns()
+        entry = {name: values[index].item()
+            for name, values in columns.items()}
+        entry['meas_names'] = entry['meas_names'].split(MEAS_NAME_SEPARATOR)
+        for name in ('first_timestamp', 'last_timestamp'):
+            if entry[name] == NO_TIMESTAMP:
+                entry[name] = None
+        return entry
+
+    def _get_indices(self, sites):
+        site_column = self._get_columns()['site']
+        indices = np.searchsorted(site_column, sites)
+        indices = np.minimum(indices, max(len(site_column) - 1, 0))
+        is_found = (len(site_column) > 0) & (
+            site_column[indices] == np.asarray(sites))
+        return np.where(is_found, indices, -1)
+
+    def _get_columns(self):
+        if self._columns is None and not self.load():
+            raise ValueError("Site catalog is not built: " + self._file_path)
+        return self._columns
+
+    def _get_day_columns(self):
+        self._get_columns()
+        if self._day_columns is None:
+            raise ValueError("Quality of sites is not scored in site " +
+                "catalog: " + self._file_path)
+        return self._day_columns
+
+class _SiteCatalogScan:
+    """
+    Queries of the catalog. Queries of different sites are executed
+    concurrently.
+    """
+
+    def __init__(self, session, fetch_engine, fetch_size):
+        self._session = session
+        self._fetch_engine = fetch_engine
+        self._fetch_size = fetch_size
+
+    def scan(self, meas_name, number_of_cadence_samples):
+        """
+        Returns
+        -------
+        dictionary
+            Key: Name of column.
+            Value: NumPy array with one value per site, sorted by site.
+        """
+        # The only scan of all partitions, done once per refresh:
+        buffer = self._fetch_engine.fetch([self._make_request(SITES_CQL, (),
+            {'site': object})])[0]
+        sites = sorted(set(buffer.columns()['site'].tolist()))
+
+        paged_scanner = PagedScanner(self._session,
+            fetch_size=self._fetch_size, fetch_engine=self._fetch_engine)
+        time_bounds = paged_scanner.query_time_bounds(sites,
+            meas_name=meas_name)
+        timestamp_buffers = self._fetch_engine.fetch([self._make_request(
+            FIRST_TIMESTAMPS_CQL.format(number_of_cadence_samples),
+            (site, meas_name), {'ts_ms': np.int64}) for site in sites])
+        location_buffers = self._fetch_engine.fetch([self._make_request(
+            LAT_LON_CQL, (site,),
+            {'latitude': np.float64, 'longitude': np.float64})
+            for site in sites])
+
+        sampling_intervals = np.array([_estimate_cadence(
+            buffer.columns()['ts_ms']) for buffer in timestamp_buffers],
+            dtype=np.float64)
+        return {
+            'site': np.array(sites, dtype=str),
+            'first_timestamp': np.array([NO_TIMESTAMP if first is None
+                else first for first, _ in time_bounds], dtype=np.int64),
+            'last_timestamp': np.array([NO_TIMESTAMP if last is None
+                else last for _, last in time_bounds], dtype=np.int64),
+            'number_of_rows': np.array([_estimate_number_of_rows(bounds,
+                sampling_interval) for bounds, sampling_interval
+                in zip(time_bounds, sampling_intervals)], dtype=np.int64),
+            'sampling_interval_minutes': sampling_intervals,
+            'meas_names': np.array([MEAS_NAME_SEPARATOR.join(meas_names)
+                for meas_names in self._scan_meas_names(sites)], dtype=str),
+            'latitude': np.array([_first_value(buffer, 'latitude', np.nan)
+                for buffer in location_buffers], dtype=np.float64),
+            'longitude': np.array([_first_value(buffer, 'longitude', np.nan)
+                for buffer in location_buffers], dtype=np.float64)}
+
+    def score(self, sites, meas_name):
+        """
+        Scores the quality of the days of sites, scanning the measurements
+        of one site at a time.
+
+        Returns
+        -------
+        dictionary
+            Key: 'site_index', 'day', and names of QUALITY_SCORES.
+            Value: NumPy array with one value per day, sorted by index of site
+            and day.
+        """
+        paged_scanner = PagedScanner(self._session,
+            fetch_size=self._fetch_size, fetch_engine=self._fetch_engine)
+        scores_list = []
+        for site_index, site in enumerate(sites):
+            measurement_columns = paged_scanner.scan(site,
+                meas_name=meas_name)
+            scores = score_days(measurement_columns.ts,
+                measurement_columns.meas_val_f,
+                localize_hours=LOCALIZE_HOURS)
+            scores['site_index'] = np.full(len(scores['day']), site_index,
+                dtype=np.int64)
+            scores_list.append(scores)
+        return {name: np.concatenate([np.empty(0, dtype=dtype)] +
+            [scores[name] for scores in scores_list]) for name, dtype in
+            [('site_index', np.int64), ('day', np.int64)] +
+            [(score, np.float64) for score in QUALITY_SCORES]}
+
+    def _scan_meas_names(self, sites):
+        """
+        Finds the names of measurements of all sites with one query per name,
+        in rounds executing one query for each site not finished yet.
+        """
+        meas_names_list = [[] for _ in sites]
+        active_indices = list(range(len(sites)))
+        while len(active_indices) > 0:
+            buffers = self._fetch_engine.fetch([self._make_request(
+                NEXT_MEAS_NAME_CQL, (sites[i],
+                meas_names_list[i][-1] if meas_names_list[i] else ''),
+                {'meas_name': object}) for i in active_indices])
+            next_active_indices = []
+            for i, buffer in zip(active_indices, buffers):
+                if len(buffer) > 0:
+                    meas_names_list[i].append(buffer.columns()['meas_name'][0])
+                    next_active_indices.append(i)
+            active_indices = next_active_indices
+        return meas_names_list
+
+    def _make_request(self, cql, values, dtypes):
+        statement = get_prepared_statement(self._session, cql).bind(values)
+        statement.fetch_size = self._fetch_size
+        return FetchRequest(statement, ColumnBuffer(dtypes, capacity=1),
+            execution_profile=COLUMNAR_PROFILE)
+
+def _summarize_scores(day_columns, number_of_sites):
+    """
+    Returns
+    -------
+    dictionary
+        Mean of each quality score over the days of each site, NaN for sites
+        without days, and number of days of each site.
+    """
+    number_of_days = np.bincount(day_columns['site_index'],
+        minlength=number_of_sites)
+    summary = {'number_of_days': number_of_days.astype(np.int64)}
+    with np.errstate(invalid='ignore'):
+        for name in QUALITY_SCORES:
+            summary[name] = np.bincount(day_columns['site_index'],
+                weights=day_columns[name], minlength=number_of_sites
+                ) / np.where(number_of_days > 0, number_of_days, np.nan)
+    return summary
+
+def _first_value(buffer, name, default):
+    if len(buffer) == 0:
+        return default
+    value = buffer.columns()[name][0]
+    return default if value is None else value
+
+def _estimate_number_of_rows(time_bounds, sampling_interval_minutes):
+    """
+    Returns
+    -------
+    integer
+        Number of rows between the first and last timestamps at the sampling
+        interval, instead of counting the rows of the whole partition.
+        Missing samples are counted, and duplicate ones are not.
+    """
+    first_timestamp, last_timestamp = time_bounds
+    if first_timestamp is None:
+        return 0
+    if np.isnan(sampling_interval_minutes) or sampling_interval_minutes <= 0:
+        return 1
+    return int(round((last_timestamp - first_timestamp) /
+        (sampling_interval_minutes * 60 * 1000))) + 1
+
+def _estimate_cadence(timestamps):
+    """
+    Returns
+    -------
+    float
+        Median interval between distinct timestamps in minutes, NaN if there
+        are less than two.
+    """
+    intervals = np.diff(np.unique(timestamps))
+    if len(intervals) == 0:
+        return np.nan
+    return float(np.median(intervals)) / (60 * 1000)
@@ -0,0 +1,34 @@
+"""
+This module contains the cache of prepared statements. A statement is prepared
+once per session and the prepared statement is reused by every query on that
+session, so that the server parses it only once and values are always sent as
+bind parameters.
+"""
+import threading
+import weakref
+
+_prepared_statements = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def get_prepared_statement(session, cql):
+    """
+    Arguments
+    -----------------
+    session : cassandra.cluster.Session
+        Session the statement is prepared on.
+    cql : string
+        CQL with ? markers for bind parameters.
+
+    Returns
+    -------
+    cassandra.query.PreparedStatement
+        Prepared statement, shared by all callers using the same session.
+    """
+    with _lock:
+        statements = _prepared_statements.setdefault(session, {})
+        if cql in statements:
+            return statements[cql]
+    # Preparing is a round trip to the cluster, so the lock is not held:
+    prepared_statement = session.prepare(cql)
+    with _lock:
+        return statements.setdefault(cql, prepared_statement)
@@ -1,9 +1,205 @@
-from solardatatools.dataio import get_pvdaq_data
+"""
+This module contains the code to retrieve data from CSV files, such as
+PVOutput data. Files are read in chunks, and each chunk is parsed into typed
+columns and fed to the data transformation as it is read, so that files
+larger than memory are never loaded whole.
+Files of a directory or a glob pattern are read and transformed in parallel.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.database.utilities.columnar import\
+    ColumnBuffer, MeasurementColumns
+from solar_data_pipeline.file.utilities.url_resolver import UrlResolver
+from solar_data_pipeline.utilities.dtype_policy import get_dtype_policy
+from solar_data_pipeline.utilities.instrumentation import Instrumentation
+
+COLUMN_DTYPES = {'ts': np.int64, 'meas_val_f': np.float64}
 
 class CsvAccess:
 
-    def __init__(self, file_url):
-       self._file_url = file_url
+    def __init__(self, file_url, datetimekey='Date-Time',
+        ac_power_key='ac_power', chunk_size=1000000, number_of_workers=4):
+        """
+        Arguments
+        -----------------
+        file_url : string
+            URL of a CSV file, of a directory of CSV files, or a glob pattern
+            of CSV files. Each file contains the signal of one system.
+        datetimekey : string
+            Name of column of timestamps.
+        ac_power_key : string
+            Name of column of AC power.
+        chunk_size : integer
+            Number of rows parsed at a time.
+        number_of_workers : integer
+            Number of files read and transformed at the same time.
+        """
+        self._file_url = file_url
+        self._datetimekey = datetimekey
+        self._ac_power_key = ac_power_key
+        self._chunk_size = chunk_size
+        self._number_of_workers = number_of_workers
 
     def retrieve(self):
-        pass
+        """
+        Returns
+        -------
+        numpy array
+            Representing a matrix with row for time of day and column for
+            dates, containing power signals of all files one after another.
+        """
+        file_paths = self._get_url_resolver().resolve(self._file_url)
+        with ThreadPoolExecutor(
+            max_workers=max(min(self._number_of_workers, len(file_paths)), 1)
+            ) as executor:
+            # The C parser of pandas and the NumPy transformation release the
+            # GIL for most of their work:
+            power_matrices = list(executor.map(self._retrieve_file,
+                file_paths))
+        power_matrices = [power_matrix for power_matrix in power_matrices
+            if power_matrix.shape[1] > 0]
+        if len(power_matrices) == 0:
+            return self._get_dtype_policy().empty()
+        return np.hstack(power_matrices)
+
+    def _retrieve_file(self, file_path):
+        data_transformation = self._get_data_transformation()
+        instrumentation = self._get_instrumentation()
+        # Files are read in threads, thus their spans have no parent:
+        if hasattr(data_transformation, 'transform_pages'):
+            # Chunks are transformed as they are read, thus reading is
+            # recorded in the span of the transformation:
+            with instrumentation.span('file.read_and_transform',
+                path=file_path) as span:
+                power_matrix = data_transformation.transform_pages(
+                    self._read_pages(file_path),
+                    datetimekey=self._datetimekey,
+                    ac_power_key=self._ac_power_key)
+                span.add_data(power_matrix)
+                return power_matrix
+        with instrumentation.span('file.read', path=file_path) as span:
+            measurement_columns = self._read_columns(file_path)
+            span.add_data(measurement_columns)
+        with instrumentation.span('file.transform', path=file_path) as span:
+            span.add_data(measurement_columns)
+            return data_transformation.transform(measurement_columns,
+                datetimekey=self._datetimekey,
+                ac_power_key=self._ac_power_key)
+
+    def _read_pages(self, file_path):
+        """
+        Returns
+        -------
+        generator
+            MeasurementColumns of each chunk of the file, with timestamps as
+            milliseconds and with the name of the file as site.
+        """
+        site = os.path.splitext(os.path.basename(file_path))[0]
+        value_dtype = self._get_dtype_policy().value_dtype
+        # Values are parsed to the nearest float, as np.loadtxt does:
+        chunks = pd.read_csv(file_path,
+            usecols=[self._datetimekey, self._ac_power_key],
+            dtype={self._datetimekey: str, self._ac_power_key: np.float64},
+            chunksize=self._chunk_size, engine='c',
+            float_precision='round_trip')
+        for chunk in chunks:
+            timestamps = pd.to_datetime(chunk[self._datetimekey]).values
+            # Files have one sensor:
+            yield MeasurementColumns(site, self._ac_power_key,
+                np.zeros(len(chunk), dtype=np.int64),
+                timestamps.astype('datetime64[ms]').astype(np.int64),
+                chunk[self._ac_power_key].values.astype(value_dtype))
+
+    def _read_columns(self, file_path):
+        """
+        Returns
+        -------
+        MeasurementColumns
+            Timestamps as milliseconds and values of the whole file, for data
+            transformations without transform_pages.
+        """
+        column_buffer = ColumnBuffer(dict(COLUMN_DTYPES,
+            meas_val_f=self._get_dtype_policy().value_dtype),
+            capacity=self._chunk_size)
+        site = os.path.splitext(os.path.basename(file_path))[0]
+        for page in self._read_pages(file_path):
+            column_buffer.append_page({'ts': page.ts,
+                'meas_val_f': page.meas_val_f})
+        columns = column_buffer.columns()
+        return MeasurementColumns(site, self._ac_power_key,
+            np.zeros(len(column_buffer), dtype=np.int64), columns['ts'],
+            columns['meas_val_f'])
+
+    def _get_url_resolver(self):
+        if ((not hasattr(self, '_url_resolver')) or
+           (self._url_resolver is None)):
+           self._url_resolver = UrlResolver()
+        return self._url_resolver
+
+    def set_url_resolver(self, url_resolver):
+        """
+        Arguments
+        -----------------
+        url_resolver : UrlResolver
+            Resolver of URLs, e.g. with a handler serving s3 URLs from a local
+            directory.
+        """
+        self._url_resolver = url_resolver
+
+    def _get_data_transformation(self):
+        if ((not hasattr(self, '_data_transformation')) or
+           (self._data_transformation is None)):
+           from solar_data_pipeline.file.utilities.data_transformation\
+               import AllDataTransformation
+           # Timestamps in files are local:
+           self._data_transformation = AllDataTransformation(
+               localize_hours=0)
+           self._data_transformation.set_instrumentation(
+               self._get_instrumentation())
+           self._data_transformation.set_dtype_policy(
+               self._get_dtype_policy())
+        return self._data_transformation
+
+    def set_data_transformation(self, data_transformation):
+       self._data_transformation = data_transformation
+
+    def _get_instrumentation(self):
+        if ((not hasattr(self, '_instrumentation')) or
+           (self._instrumentation is None)):
+           self._instrumentation = Instrumentation()
+        return self._instrumentation
+
+    def set_instrumentation(self, instrumentation):
+        """
+        Arguments
+        -----------------
+        instrumentation : Instrumentation
+            Instrumentation reading and transformation of files are recorded
+            with. Also set to the data transformation made by default.
+        """
+        self._instrumentation = instrumentation
+        data_transformation = getattr(self, '_data_transformation', None)
+        if hasattr(data_transformation, 'set_instrumentation'):
+            data_transformation.set_instrumentation(instrumentation)
+
+    def _get_dtype_policy(self):
+        if ((not hasattr(self, '_dtype_policy')) or
+           (self._dtype_policy is None)):
+           self._dtype_policy = get_dtype_policy()
+        return self._dtype_policy
+
+    def set_dtype_policy(self, dtype_policy):
+        """
+        Arguments
+        -----------------
+        dtype_policy : DtypePolicy or numpy dtype
+            Policy of types, e.g. DtypePolicy(np.float32), which values are
+            parsed in and power matrices are made and returned in. Also set
+            to the data transformation made by default.
+        """
+        self._dtype_policy = get_dtype_policy(dtype_policy)
+        data_transformation = getattr(self, '_data_transformation', None)
+        if hasattr(data_transformation, 'set_dtype_policy'):
+            data_transformation.set_dtype_policy(self._dtype_policy)
@@ -5,20 +5,52 @@ from abc import ABCMeta, abstractmethod
 import numpy as np
 import pandas as pd
 from solardatatools.data_transforms\
- import standardize_time_axis, make_2d, fix_time_shifts
+ import standardize_time_axis, make_2d
 from statistical_clear_sky.utilities.data_conversion\
  import make_time_series
 from solar_data_pipeline.utilities.data_trainsformation\
  import AbstractDataTransformation
+from solar_data_pipeline.database.utilities.columnar\
+ import ColumnBuffer, MeasurementColumns
+from solar_data_pipeline.utilities.power_matrix\
+ import make_power_matrix, measurement_arrays, PowerMatrixBuilder
+from solar_data_pipeline.utilities.time_shifts import fix_time_shifts
 
 class AllDataTransformation(AbstractDataTransformation):
+    """
+    Arguments
+    -----------------
+    fast_path : boolean
+        If True, the power matrix is built by make_power_matrix with NumPy.
+        If False, by make_time_series, standardize_time_axis and make_2d with
+        pandas, which is kept as the reference.
+    localize_hours : integer
+        Hours added to timestamps. Timestamps from Cassandra database are in
+        UTC and localized to PST, while files usually have local timestamps.
+    time_shift_mode : string
+        'accurate' for fix_time_shifts of solar-data-tools, which is kept as
+        the reference, or 'fast' for the vectorized correction of time
+        shifts, whose matrices may differ around shifts.
+    """
+
+    version = 1
+
+    def __init__(self, fast_path=True, localize_hours=-8,
+        time_shift_mode='accurate'):
+        self._fast_path = fast_path
+        self._localize_hours = localize_hours
+        self._time_shift_mode = time_shift_mode
+        if time_shift_mode == 'fast':
+            # Time shifts are corrected by the vectorized correction in
+            # version 2:
+            self.version = 2
 
     def transform(self, data_array, datetimekey='Date-Time',
         ac_power_key='ac_power'):
         """
         Arguments
         -----------------
-        data_array : numpy array
+        data_array : numpy array or MeasurementColumns
             Data from the data source
 
         Returns
@@ -27,12 +59,88 @@ class AllDataTransformation(AbstractDataTransformation):
             Representing a matrix with row for dates and colum for time of day,
             containing power signals.
         """
-        data_frame = pd.DataFrame(data_array.tolist())
-        data_frame.replace(-999999.0, np.NaN, inplace=True)
+        instrumentation = self._get_instrumentation()
+        if self._fast_path:
+            with instrumentation.span('transform.make_power_matrix') as span:
+                span.add_data(data_array)
+                timestamps, values, sensors = measurement_arrays(data_array)
+                power_matrix = make_power_matrix(timestamps, values,
+                    sensors=sensors, localize_hours=self._localize_hours,
+                    dtype=self._get_dtype_policy().value_dtype)
+            return self._fix_time_shifts(power_matrix)
+        with instrumentation.span('transform.to_data_frame') as span:
+            span.add_data(data_array)
+            if hasattr(data_array, 'to_data_frame'):
+                data_frame = data_array.to_data_frame()
+            else:
+                data_frame = pd.DataFrame(data_array.tolist())
+            data_frame.replace(-999999.0, np.NaN, inplace=True)
         # data_frame.set_index(datetimekey)
-        time_series_data_frame = make_time_series(data_frame,
-            return_keys=False)
-        standardized_data_frame = standardize_time_axis(time_series_data_frame)
-        power_matrix = make_2d(standardized_data_frame, key=ac_power_key,
-            zero_nighttime=True, interp_missing=True)
-        return fix_time_shifts(power_matrix)
+        with instrumentation.span('transform.make_time_series') as span:
+            span.add_data(data_frame)
+            time_series_data_frame = make_time_series(data_frame,
+                return_keys=False, localize_time=self._localize_hours)
+        with instrumentation.span('transform.standardize_time_axis') as span:
+            span.add_data(time_series_data_frame)
+            standardized_data_frame = standardize_time_axis(
+                time_series_data_frame)
+        with instrumentation.span('transform.make_2d') as span:
+            power_matrix = make_2d(standardized_data_frame,
+                key=ac_power_key, zero_nighttime=True, interp_missing=True)
+            span.add_data(power_matrix)
+        return self._fix_time_shifts(power_matrix)
+
+    def transform_pages(self, pages, datetimekey='Date-Time',
+        ac_power_key='ac_power'):
+        """
+        Transforms pages of measurements one after another, e.g. chunks of a
+        file, so that the samples of all pages are never held at once. Time
+        shifts are fixed once, on the whole matrix.
+
+        Arguments
+        -----------------
+        pages : iterable
+            MeasurementColumns of one sensor, in order of time.
+
+        Returns
+        -------
+        numpy array
+            The same matrix as transform of the pages joined.
+        """
+        if not self._fast_path:
+            return self.transform(_join_pages(pages),
+                datetimekey=datetimekey, ac_power_key=ac_power_key)
+        builder = PowerMatrixBuilder(localize_hours=self._localize_hours,
+            dtype=self._get_dtype_policy().value_dtype)
+        with self._get_instrumentation().span('transform.make_power_matrix'
+            ) as span:
+            for page in pages:
+                builder.append(page.ts, page.meas_val_f)
+            power_matrix = builder.power_matrix()
+            span.add_data(power_matrix)
+        return self._fix_time_shifts(power_matrix)
+
+    def _fix_time_shifts(self, power_matrix):
+        with self._get_instrumentation().span('transform.fix_time_shifts'
+            ) as span:
+            span.add_data(power_matrix)
+            dtype_policy = self._get_dtype_policy()
+            # Time shifts are found in the value type, before encoding:
+            return dtype_policy.encode(fix_time_shifts(
+                dtype_policy.decode(power_matrix), mode=self._time_shift_mode))
+
+def _join_pages(pages):
+    column_buffer = None
+    for page in pages:
+        if column_buffer is None:
+            site, meas_name = page.site, page.meas_name
+            column_buffer = ColumnBuffer({'sensor': page.sensor.dtype,
+                'ts': np.int64, 'meas_val_f': page.meas_val_f.dtype})
+        column_buffer.append_page({'sensor': page.sensor, 'ts': page.ts,
+            'meas_val_f': page.meas_val_f})
+    if column_buffer is None:
+        return MeasurementColumns(None, None, np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64), np.empty(0))
+    columns = column_buffer.columns()
+    return MeasurementColumns(site, meas_name, columns['sensor'],
+        columns['ts'], columns['meas_val_f'])
@@ -0,0 +1,97 @@
+"""
+This module contains the resolution of file URLs into local file paths.
+Handlers are registered per URL scheme, so that e.g. s3 URLs can be served by
+a local directory standing in for the bucket in tests and offline work.
+"""
+import glob
+import os
+from urllib.parse import urlparse, unquote
+
+class UrlResolver:
+    """
+    Resolves URLs with the handler registered for their scheme. file URLs and
+    plain paths are resolved as local paths by default.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self.register('file', LocalFileHandler())
+        self.register('', LocalFileHandler())
+
+    def register(self, scheme, handler):
+        """
+        Arguments
+        -----------------
+        scheme : string
+            Scheme of URL, e.g. 's3'.
+        handler : object
+            Object with resolve(parsed_url) method returning a local path,
+            which may be a directory or contain wildcards.
+        """
+        self._handlers[scheme] = handler
+
+    def resolve(self, url):
+        """
+        Arguments
+        -----------------
+        url : string
+            URL of a file, a directory or a glob pattern of files.
+
+        Returns
+        -------
+        list
+            Local paths of files, sorted.
+        """
+        parsed_url = urlparse(url)
+        if parsed_url.scheme not in self._handlers:
+            raise ValueError("No handler is registered for URL scheme: " +
+                parsed_url.scheme)
+        local_path = self._handlers[parsed_url.scheme].resolve(parsed_url)
+        return expand_local_path(local_path)
+
+class LocalFileHandler:
+    """
+    Resolves file URLs and plain paths.
+    """
+
+    def resolve(self, parsed_url):
+        if parsed_url.scheme == '':
+            return parsed_url.path
+        return unquote(parsed_url.netloc + parsed_url.path)
+
+class LocalDirectoryHandler:
+    """
+    Serves URLs such as s3://bucket/key from a local directory, in which the
+    bucket is a subdirectory.
+
+    Arguments
+    -----------------
+    root_directory : string
+        Local directory standing in for the storage service.
+    """
+
+    def __init__(self, root_directory):
+        self._root_directory = root_directory
+
+    def resolve(self, parsed_url):
+        return os.path.join(self._root_directory, parsed_url.netloc,
+            unquote(parsed_url.path).lstrip('/'))
+
+def expand_local_path(local_path):
+    """
+    Returns
+    -------
+    list
+        Files in the directory if the path is a directory, files matching the
+        path if it contains wildcards, or the path itself, sorted.
+    """
+    if os.path.isdir(local_path):
+        return sorted(os.path.join(local_path, file_name)
+            for file_name in os.listdir(local_path)
+            if os.path.isfile(os.path.join(local_path, file_name)))
+    if any(character in local_path for character in '*?['):
+        return sorted(file_path for file_path in glob.glob(local_path)
+            if os.path.isfile(file_path))
+    if not os.path.isfile(local_path):
+        raise FileNotFoundError(local_path)
+    return [local_path]
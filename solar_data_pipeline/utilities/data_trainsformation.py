@@ -2,12 +2,19 @@
 This module defines options for data transformations.
 """
 from abc import ABCMeta, abstractmethod
+from solar_data_pipeline.utilities.dtype_policy import get_dtype_policy
+from solar_data_pipeline.utilities.instrumentation import Instrumentation
 
 NOT_IMPLEMENTED = "You should implement this."
+DEFAULT_SAMPLING_INTERVAL_MINUTES = 5
 
 class AbstractDataTransformation():
     __metaclass__ = ABCMeta
 
+    # Incremented when the output of transform changes, so that power matrices
+    # cached with the previous version are not used:
+    version = 0
+
     @abstractmethod
     def transform(self, data_array, datetimekey='Date-Time',
         ac_power_key='ac_power'):
@@ -25,6 +32,52 @@ class AbstractDataTransformation():
         """
         raise NotImplementedError(NOT_IMPLEMENTED)
 
+    def _get_instrumentation(self):
+        if ((not hasattr(self, '_instrumentation')) or
+           (self._instrumentation is None)):
+           self._instrumentation = Instrumentation()
+        return self._instrumentation
+
+    def set_instrumentation(self, instrumentation):
+        """
+        Arguments
+        -----------------
+        instrumentation : Instrumentation
+            Instrumentation the steps of transform are recorded with.
+        """
+        self._instrumentation = instrumentation
+
+    def _get_dtype_policy(self):
+        if ((not hasattr(self, '_dtype_policy')) or
+           (self._dtype_policy is None)):
+           self._dtype_policy = get_dtype_policy()
+        return self._dtype_policy
+
+    def set_dtype_policy(self, dtype_policy):
+        """
+        Arguments
+        -----------------
+        dtype_policy : DtypePolicy or numpy dtype
+            Policy of the types power matrices are made and returned in.
+        """
+        self._dtype_policy = get_dtype_policy(dtype_policy)
+
+    def _get_sampling_interval_minutes(self):
+        if ((not hasattr(self, '_sampling_interval_minutes')) or
+           (self._sampling_interval_minutes is None)):
+           self._sampling_interval_minutes = DEFAULT_SAMPLING_INTERVAL_MINUTES
+        return self._sampling_interval_minutes
+
+    def set_sampling_interval_minutes(self, sampling_interval_minutes):
+        """
+        Arguments
+        -----------------
+        sampling_interval_minutes : integer
+            Interval of the time axis of power matrices, which have
+            24 * 60 / sampling_interval_minutes rows. 5 if None.
+        """
+        self._sampling_interval_minutes = sampling_interval_minutes
+
 class SimpleDataTransformation(AbstractDataTransformation):
     def transform(self, data_array, datetimekey='Date-Time',
         ac_power_key='ac_power'):
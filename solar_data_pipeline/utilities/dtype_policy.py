@@ -0,0 +1,101 @@
+"""
+This module contains the policy of types of power matrices, so that fleet
+scale retrievals hold, cache and return compact matrices.
+Values are decoded from the database and transformed in the value type of
+the policy, float32 unless float64 is asked for, and power matrices are
+encoded in the stored type at the end of transformations. Scaled int16 keeps
+missing values as a sentinel, since integers have no NaN.
+"""
+import numpy as np
+
+INT16_NAN_SENTINEL = np.iinfo(np.int16).min
+
+class DtypePolicy:
+    """
+    Arguments
+    -----------------
+    dtype : numpy dtype or string
+        Stored type of power matrices: float64, float32 or int16.
+    scale : float
+        For int16, value of one count, e.g. 0.1 for a resolution of 0.1 W.
+        Values beyond 32767 counts are clipped.
+    """
+
+    def __init__(self, dtype=np.float64, scale=1.0):
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32, np.int16):
+            raise ValueError("Dtype must be one of: float64, float32, int16")
+        self.scale = float(scale)
+        # Transformations need NaN, thus int16 is transformed in float32:
+        self.value_dtype = np.dtype(np.float64) if self.dtype == np.float64\
+            else np.dtype(np.float32)
+
+    def encode(self, power_matrix):
+        """
+        Returns
+        -------
+        numpy array
+            Power matrix in the stored type. Not copied if it already is.
+        """
+        if self.dtype != np.int16:
+            return np.asarray(power_matrix).astype(self.dtype, copy=False)
+        power_matrix = np.asarray(power_matrix)
+        if power_matrix.dtype == np.int16:
+            return power_matrix
+        is_missing = np.isnan(power_matrix)
+        counts = np.clip(np.rint(np.nan_to_num(power_matrix) / self.scale),
+            INT16_NAN_SENTINEL + 1, np.iinfo(np.int16).max).astype(np.int16)
+        counts[is_missing] = INT16_NAN_SENTINEL
+        return counts
+
+    def decode(self, power_matrix):
+        """
+        Returns
+        -------
+        numpy array
+            Power matrix in the value type, with NaN for missing values.
+        """
+        power_matrix = np.asarray(power_matrix)
+        if power_matrix.dtype != np.int16:
+            return power_matrix.astype(self.value_dtype, copy=False)
+        values = power_matrix.astype(self.value_dtype) * self.value_dtype.type(
+            self.scale)
+        values[power_matrix == INT16_NAN_SENTINEL] = np.nan
+        return values
+
+    def empty(self, number_of_rows=288):
+        """
+        Returns
+        -------
+        numpy array
+            Power matrix without days in the stored type, for concatenation.
+        """
+        return np.empty((number_of_rows, 0), dtype=self.dtype)
+
+    def get_key(self):
+        """
+        Returns
+        -------
+        string
+            Description of the policy, e.g. for keys of cached matrices.
+        """
+        if self.dtype == np.int16:
+            return '{}*{!r}'.format(self.dtype.name, self.scale)
+        return self.dtype.name
+
+def get_dtype_policy(dtype_policy=None):
+    """
+    Arguments
+    -----------------
+    dtype_policy : DtypePolicy or numpy dtype
+        Policy, or stored type of a new policy. float64 if None.
+
+    Returns
+    -------
+    DtypePolicy
+    """
+    if isinstance(dtype_policy, DtypePolicy):
+        return dtype_policy
+    if dtype_policy is None:
+        return DtypePolicy()
+    return DtypePolicy(dtype_policy)
@@ -0,0 +1,282 @@
+"""
+This module contains the fleet store, which keeps the power matrices of many
+sites in one memory-mapped array shaped sites x days x time of day, next to a
+JSON index of its sites and dates.
+A site and a range of dates are a contiguous block of the array, so that a
+slice is a view found in constant time, and only the pages of the slice are
+read. The array is a .npy file opened read-only by each reader, so that
+processes read concurrently without locks. One process writes at a time.
+Values are stored in the type of a dtype policy, whose scale is kept in the
+index, so that int16 stores are decoded with get_dtype_policy.
+"""
+import datetime
+import json
+import os
+import numpy as np
+from solar_data_pipeline.utilities.dtype_policy import DtypePolicy,\
+    get_dtype_policy
+from solar_data_pipeline.utilities.power_matrix_cache import write_atomically
+from solar_data_pipeline.utilities.sampling import get_random_generator
+
+EPOCH = datetime.date(1970, 1, 1)
+ARRAY_FILE_NAME = 'fleet.npy'
+INDEX_FILE_NAME = 'index.json'
+
+class FleetStore:
+    """
+    Arguments
+    -----------------
+    directory : string
+        Directory of store files. Created if it does not exist.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, sites, first_date, number_of_days, number_of_rows=288,
+        dtype=np.float64):
+        """
+        Creates the array of the store, with NaN for all values, replacing a
+        previous one. Readers which opened the previous array keep reading it.
+
+        Arguments
+        -----------------
+        sites : list
+            Name of sites.
+        first_date : date
+            Date of the first day of the array.
+        number_of_days : integer
+            Number of days of the array.
+        number_of_rows : integer
+            Number of rows of power matrices, i.e. time steps per day.
+        dtype : DtypePolicy or numpy dtype
+            Policy of stored values, or their type: float64, float32 or
+            int16. Missing values of int16 are INT16_NAN_SENTINEL.
+        """
+        dtype_policy = get_dtype_policy(dtype)
+        array_path = os.path.join(self._directory, ARRAY_FILE_NAME)
+        temporary_array_path = array_path + '.tmp.npy'
+        array = np.lib.format.open_memmap(temporary_array_path, mode='w+',
+            dtype=dtype_policy.dtype,
+            shape=(len(sites), number_of_days, number_of_rows))
+        array[:] = dtype_policy.encode(np.full(1, np.nan))[0]
+        array.flush()
+        del array
+        index = {'sites': [str(site) for site in sites],
+            'first_day': _to_day(first_date),
+            'number_of_days': int(number_of_days),
+            'dtype': dtype_policy.dtype.name,
+            'scale': dtype_policy.scale,
+            'day_ranges': {}}
+        # The index is replaced last, so that it never describes an array
+        # which is not complete:
+        os.replace(temporary_array_path, array_path)
+        self._write_index(index)
+        self.refresh()
+
+    def write(self, site, power_matrix, first_date):
+        """
+        Writes the power matrix of the site. Days outside of the dates of the
+        store are not written.
+
+        Arguments
+        -----------------
+        site : string
+            Name of site, which must be a site of the store.
+        power_matrix : numpy array
+            Matrix with row for time of day and column for dates, in watts,
+            which is encoded in the type of the store.
+        first_date : date
+            Date of the first column.
+        """
+        index = self._get_index()
+        site_index = self._get_site_index(site)
+        array = np.load(os.path.join(self._directory, ARRAY_FILE_NAME),
+            mmap_mode='r+')
+        if power_matrix.shape[0] != array.shape[2]:
+            raise ValueError("Power matrix must have {} rows.".format(
+                array.shape[2]))
+        start = _to_day(first_date) - index['first_day']
+        end = start + power_matrix.shape[1]
+        store_start = max(start, 0)
+        store_end = min(end, index['number_of_days'])
+        if store_start < store_end:
+            array[site_index, store_start:store_end] = self.get_dtype_policy(
+                ).encode(power_matrix[:, store_start - start:
+                store_end - start]).T
+            array.flush()
+            # Days written before are kept. Days between two writes which
+            # are not adjacent are in the range as missing values:
+            if site in index['day_ranges']:
+                written_start, written_end = index['day_ranges'][site]
+                store_start = min(store_start, written_start)
+                store_end = max(store_end, written_end)
+            index['day_ranges'][site] = [store_start, store_end]
+        del array
+        self._write_index(index)
+
+    def get_array(self):
+        """
+        Returns
+        -------
+        numpy array
+            Read-only memory-mapped array of the store, shaped sites x days x
+            time of day.
+        """
+        if ((not hasattr(self, '_array')) or (self._array is None)):
+            self._array = np.load(os.path.join(self._directory,
+                ARRAY_FILE_NAME), mmap_mode='r')
+        return self._array
+
+    def get_dtype_policy(self):
+        """
+        Returns
+        -------
+        DtypePolicy
+            Policy of stored values, whose decode turns matrices of the store
+            into watts with NaN for missing values.
+        """
+        index = self._get_index()
+        # Stores created without a policy are float:
+        return DtypePolicy(index.get('dtype', self.get_array().dtype),
+            scale=index.get('scale', 1.0))
+
+    def get_sites(self):
+        """
+        Returns
+        -------
+        list
+            Name of sites in the order of the array.
+        """
+        return list(self._get_index()['sites'])
+
+    def get_dates(self):
+        """
+        Returns
+        -------
+        numpy array
+            Date of each day of the array as datetime64[D].
+        """
+        index = self._get_index()
+        return np.arange(index['first_day'], index['first_day'] +
+            index['number_of_days']).astype('datetime64[D]')
+
+    def get_power_matrix(self, site, start_date=None, end_date=None):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        start_date : date
+            Inclusive lower bound of dates. The first written day of the site
+            if None.
+        end_date : date
+            Inclusive upper bound of dates. The last written day of the site
+            if None.
+
+        Returns
+        -------
+        numpy array
+            Read-only view of the power matrix of the site, with row for time
+            of day and column for dates, without copying the array, in the
+            stored type. Missing values for days which are not written.
+        """
+        start, end = self._get_day_slice(site, start_date, end_date)
+        return self.get_array()[self._get_site_index(site), start:end].T
+
+    def sample(self, number_of_days_per_site, sites=None,
+        random_generator=None, out=None):
+        """
+        Chooses days of each site randomly with replacement, among the days
+        from the first to the last written day of the site, as
+        RawCassandraDataAccess.retrieve does.
+        Only the pages of the chosen days are read.
+
+        Arguments
+        -----------------
+        number_of_days_per_site : integer
+            Number of days of each site.
+        sites : list
+            Name of sites. All sites if None. Sites without written days are
+            left out.
+        random_generator : numpy.random.Generator or integer
+            Generator, or seed of a generator, of the choice of days.
+        out : numpy array
+            Preallocated output in the value type of the dtype policy.
+            Allocated if None.
+
+        Returns
+        -------
+        numpy array
+            Matrix with row for time of day and column for dates, containing
+            the chosen days of each site one after another, decoded by the
+            dtype policy of the store into watts with NaN for missing values.
+        """
+        random_generator = get_random_generator(random_generator)
+        day_ranges = self._get_index()['day_ranges']
+        if sites is None:
+            sites = self.get_sites()
+        sites = [site for site in sites if site in day_ranges]
+        array = self.get_array()
+        dtype_policy = self.get_dtype_policy()
+        if out is None:
+            out = np.empty((array.shape[2],
+                len(sites) * number_of_days_per_site),
+                dtype=dtype_policy.value_dtype)
+        for i, site in enumerate(sites):
+            start, end = day_ranges[site]
+            selected_days = random_generator.integers(start, end,
+                number_of_days_per_site)
+            out[:, i * number_of_days_per_site:
+                (i + 1) * number_of_days_per_site] = dtype_policy.decode(
+                array[self._get_site_index(site), selected_days].T)
+        return out
+
+    def _get_day_slice(self, site, start_date, end_date):
+        index = self._get_index()
+        start, end = index['day_ranges'].get(site, [0, 0])
+        if start_date is not None:
+            start = _to_day(start_date) - index['first_day']
+        if end_date is not None:
+            end = _to_day(end_date) - index['first_day'] + 1
+        if start < 0 or end > index['number_of_days']:
+            raise ValueError("Dates must be between {} and {}.".format(
+                *self.get_dates()[[0, -1]]))
+        return start, max(start, end)
+
+    def _get_site_index(self, site):
+        if ((not hasattr(self, '_site_indices')) or
+           (self._site_indices is None)):
+           self._site_indices = {site: i for i, site
+               in enumerate(self._get_index()['sites'])}
+        try:
+            return self._site_indices[site]
+        except KeyError:
+            raise ValueError("Site {} is not in the store.".format(site))
+
+    def _get_index(self):
+        if ((not hasattr(self, '_index')) or (self._index is None)):
+            with open(os.path.join(self._directory, INDEX_FILE_NAME)) as file:
+                self._index = json.load(file)
+        return self._index
+
+    def _write_index(self, index):
+        write_atomically(os.path.join(self._directory, INDEX_FILE_NAME),
+            lambda file: file.write(json.dumps(index).encode('utf-8')))
+        self._index = index
+
+    def refresh(self):
+        """
+        Reopens the index and the array, which are kept open from their first
+        use, so that days written and arrays created by another process since
+        then are read.
+        """
+        self._array = None
+        self._index = None
+        self._site_indices = None
+
+def _to_day(date):
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return (date - EPOCH).days
@@ -0,0 +1,372 @@
+"""
+This module contains the instrumentation of the stages of the pipeline. Each
+stage runs in a span, which records its duration, the number of rows and
+bytes it handled and, while tracemalloc is tracing, its peak allocation.
+Finished spans are passed to exporters, which log them, collect them into a
+JSON report, or write them as OpenTelemetry traces in OTLP JSON format to a
+local file.
+
+Spans cost a few calls of time.perf_counter when exporters are set, and
+nothing otherwise.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+class Instrumentation:
+    """
+    Arguments
+    -----------------
+    exporters : list
+        Functions or callable objects, e.g. LoggingExporter, called with each
+        finished span. Spans are not recorded if empty.
+    trace_memory : boolean
+        Whether to start tracemalloc, so that peak allocation of spans is
+        recorded from Python 3.9. Tracing slows allocation down, and is
+        stopped by close.
+    """
+
+    def __init__(self, exporters=None, trace_memory=False):
+        self._exporters = list(exporters) if exporters is not None else []
+        self._local = threading.local()
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def add_exporter(self, exporter):
+        self._exporters.append(exporter)
+
+    def span(self, name, **attributes):
+        """
+        Arguments
+        -----------------
+        name : string
+            Name of stage, e.g. 'cassandra.fetch'.
+
+        Other keyword arguments are recorded as attributes of the span.
+
+        Returns
+        -------
+        Span
+            Context manager of the stage. The span started last and not yet
+            finished in the same thread is its parent.
+        """
+        if len(self._exporters) == 0:
+            return _NULL_SPAN
+        return Span(self, name, attributes)
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _get_stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _export(self, span):
+        for exporter in self._exporters:
+            exporter(span)
+
+class Span:
+    """
+    Stage of the pipeline, used as a context manager.
+
+    Attributes
+    -----------------
+    name : string
+        Name of stage.
+    attributes : dictionary
+        Attributes given when the span is started, or set by set_attribute.
+    start_time : float
+        Seconds since epoch when the span started.
+    duration : float
+        Seconds from start to end of the span.
+    rows : integer
+        Number of samples of measurements, or of days of power matrices,
+        added by add_data or add_rows.
+    bytes : integer
+        Number of bytes of the data added by add_data or add_bytes.
+    peak_allocated_bytes : integer
+        Peak of memory allocated during the span above the allocation at its
+        start. None if tracemalloc is not tracing, or before Python 3.9,
+        whose tracemalloc cannot reset its peak.
+    error : string
+        Name of type of the exception raised in the span, or None.
+    trace_id, span_id, parent_id : string
+        Identifiers in OpenTelemetry format. parent_id is None for the root
+        span of a trace.
+    """
+
+    def __init__(self, instrumentation, name, attributes):
+        self._instrumentation = instrumentation
+        self.name = name
+        self.attributes = attributes
+        self.start_time = None
+        self.duration = None
+        self.rows = 0
+        self.bytes = 0
+        self.peak_allocated_bytes = None
+        self.error = None
+        self.trace_id = None
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = None
+
+    def __enter__(self):
+        stack = self._instrumentation._get_stack()
+        if len(stack) > 0:
+            parent = stack[-1]
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        else:
+            self.trace_id = os.urandom(16).hex()
+        # tracemalloc.reset_peak is new in Python 3.9:
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this span, thus kept for the parent:
+            if len(stack) > 0:
+                stack[-1]._observe_peak(peak)
+            tracemalloc.reset_peak()
+            self._start_allocated = current
+            self._peak = current
+        stack.append(self)
+        self.start_time = time.time()
+        self._start_counter = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.duration = time.perf_counter() - self._start_counter
+        stack = self._instrumentation._get_stack()
+        stack.remove(self)
+        if exception_type is not None:
+            self.error = exception_type.__name__
+        if tracemalloc.is_tracing() and hasattr(self, '_peak'):
+            self._observe_peak(tracemalloc.get_traced_memory()[1])
+            self.peak_allocated_bytes = self._peak - self._start_allocated
+            if len(stack) > 0:
+                stack[-1]._observe_peak(self._peak)
+        self._instrumentation._export(self)
+        return False
+
+    @property
+    def end_time(self):
+        return self.start_time + self.duration
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_rows(self, number_of_rows):
+        self.rows += int(number_of_rows)
+
+    def add_bytes(self, number_of_bytes):
+        self.bytes += int(number_of_bytes)
+
+    def add_data(self, data):
+        """
+        Adds the rows and bytes of data to the span.
+
+        Arguments
+        -----------------
+        data : object
+            MeasurementColumns, whose rows are samples, power matrix as
+            2-dimensional NumPy array, whose rows are days, other NumPy array,
+            pandas DataFrame, or list of these.
+        """
+        number_of_rows, number_of_bytes = get_size(data)
+        self.rows += number_of_rows
+        self.bytes += number_of_bytes
+
+    def _observe_peak(self, peak):
+        if hasattr(self, '_peak'):
+            self._peak = max(self._peak, peak)
+
+    def to_dictionary(self):
+        return {'name': self.name, 'trace_id': self.trace_id,
+            'span_id': self.span_id, 'parent_id': self.parent_id,
+            'start_time': self.start_time, 'duration': self.duration,
+            'rows': self.rows, 'bytes': self.bytes,
+            'peak_allocated_bytes': self.peak_allocated_bytes,
+            'error': self.error, 'attributes': dict(self.attributes)}
+
+class _NullSpan:
+    """
+    Span of instrumentation without exporters, which records nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_rows(self, number_of_rows):
+        pass
+
+    def add_bytes(self, number_of_bytes):
+        pass
+
+    def add_data(self, data):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def get_size(data):
+    """
+    Returns
+    -------
+    tuple
+        Number of rows and number of bytes of data, as described in
+        Span.add_data. Object arrays count the size of their references only.
+    """
+    if data is None:
+        return 0, 0
+    if isinstance(data, (list, tuple)):
+        sizes = [get_size(element) for element in data]
+        return (sum(size[0] for size in sizes),
+            sum(size[1] for size in sizes))
+    if hasattr(data, 'meas_val_f') and hasattr(data, 'ts'):
+        return len(data.ts), sum(np.asarray(column).nbytes
+            for column in (data.sensor, data.ts, data.meas_val_f))
+    if hasattr(data, 'memory_usage'):
+        return len(data), int(data.memory_usage(index=True).sum())
+    if isinstance(data, np.ndarray):
+        if data.ndim == 2:
+            # Power matrices have row for time of day and column for dates:
+            return data.shape[1], data.nbytes
+        return len(data) if data.ndim > 0 else 1, data.nbytes
+    return 0, 0
+
+class LoggingExporter:
+    """
+    Logs each span in one line.
+
+    Arguments
+    -----------------
+    logger : logging.Logger
+        Logger of spans. Logger named after this module if None.
+    level : integer
+        Level of log records.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self._logger = logger if logger is not None else\
+            logging.getLogger(__name__)
+        self._level = level
+
+    def __call__(self, span):
+        message = "%s: %.6f s, %d rows, %d bytes"
+        arguments = [span.name, span.duration, span.rows, span.bytes]
+        if span.peak_allocated_bytes is not None:
+            message += ", %d bytes peak allocation"
+            arguments.append(span.peak_allocated_bytes)
+        if span.error is not None:
+            message += ", failed with %s"
+            arguments.append(span.error)
+        self._logger.log(self._level, message, *arguments)
+
+class JsonReportExporter:
+    """
+    Collects spans into a report, with totals per stage.
+    """
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            self._spans.append(span.to_dictionary())
+
+    def get_report(self):
+        """
+        Returns
+        -------
+        dictionary
+            'spans': Dictionaries of the spans, in the order they finished.
+            'stages': For each name of stage, number of spans, total seconds,
+            rows and bytes, and largest peak allocation.
+        """
+        with self._lock:
+            spans = list(self._spans)
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span['name'], {'count': 0,
+                'seconds': 0.0, 'rows': 0, 'bytes': 0,
+                'peak_allocated_bytes': None})
+            stage['count'] += 1
+            stage['seconds'] += span['duration']
+            stage['rows'] += span['rows']
+            stage['bytes'] += span['bytes']
+            if span['peak_allocated_bytes'] is not None:
+                stage['peak_allocated_bytes'] = max(
+                    stage['peak_allocated_bytes'] or 0,
+                    span['peak_allocated_bytes'])
+        return {'spans': spans, 'stages': stages}
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.get_report(), file, indent=2)
+
+class OtlpJsonExporter:
+    """
+    Appends each span to a local file as one line of OTLP JSON, the format
+    of ExportTraceServiceRequest of OpenTelemetry, which the OTLP JSON file
+    receiver of OpenTelemetry Collector reads.
+
+    Arguments
+    -----------------
+    path : string
+        Path of file.
+    service_name : string
+        Value of service.name attribute of the resource.
+    """
+
+    def __init__(self, path, service_name='solar_data_pipeline'):
+        self._path = path
+        self._service_name = service_name
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        attributes = dict(span.attributes)
+        attributes['rows'] = span.rows
+        attributes['bytes'] = span.bytes
+        if span.peak_allocated_bytes is not None:
+            attributes['peak_allocated_bytes'] = span.peak_allocated_bytes
+        otlp_span = {'traceId': span.trace_id, 'spanId': span.span_id,
+            'name': span.name, 'kind': 1,
+            'startTimeUnixNano': str(int(span.start_time * 1e9)),
+            'endTimeUnixNano': str(int(span.end_time * 1e9)),
+            'attributes': [_to_otlp_attribute(key, value)
+                for key, value in attributes.items()],
+            'status': {'code': 1} if span.error is None else
+                {'code': 2, 'message': span.error}}
+        if span.parent_id is not None:
+            otlp_span['parentSpanId'] = span.parent_id
+        request = {'resourceSpans': [{
+            'resource': {'attributes': [_to_otlp_attribute('service.name',
+                self._service_name)]},
+            'scopeSpans': [{'scope': {'name': __name__},
+                'spans': [otlp_span]}]}]}
+        line = json.dumps(request, separators=(',', ':'))
+        with self._lock:
+            with open(self._path, 'a') as file:
+                file.write(line + '\n')
+
+def _to_otlp_attribute(key, value):
+    if isinstance(value, (bool, np.bool_)):
+        return {'key': key, 'value': {'boolValue': bool(value)}}
+    if isinstance(value, (int, np.integer)):
+        # 64 bit integers are strings in OTLP JSON:
+        return {'key': key, 'value': {'intValue': str(int(value))}}
+    if isinstance(value, (float, np.floating)):
+        return {'key': key, 'value': {'doubleValue': float(value)}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
@@ -0,0 +1,142 @@
+"""
+This module contains the parallel transformation of measurements into power
+matrices with a pool of processes, for multi-site retrieval.
+Measurements of all sites are copied once into a shared memory block, which
+workers map without pickling, and each worker returns its power matrix in a
+shared memory block of its own. Only names, offsets and shapes are pickled.
+multiprocessing.shared_memory is new in Python 3.8, thus it is imported only
+when there are several workers, so that one worker needs no newer Python.
+"""
+import multiprocessing
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+
+class ParallelTransformation:
+    """
+    Arguments
+    -----------------
+    number_of_workers : integer
+        Number of worker processes. Transformations run in the calling
+        process if 1. Several workers require Python 3.8 or later.
+    start_method : string
+        Start method of worker processes. Spawned processes are used by
+        default, since forking copies the threads of Cassandra driver in an
+        unusable state.
+    """
+
+    def __init__(self, number_of_workers=None, start_method='spawn'):
+        if number_of_workers is None:
+            number_of_workers = multiprocessing.cpu_count()
+        self._number_of_workers = number_of_workers
+        self._start_method = start_method
+        self._executor = None
+
+    def make_power_matrices(self, measurements_list, **kwargs):
+        """
+        Arguments
+        -----------------
+        measurements_list : list
+            Objects with ts, meas_val_f and sensor arrays, such as
+            MeasurementColumns, one per site.
+
+        Keyword arguments are passed to make_power_matrix.
+
+        Returns
+        -------
+        list
+            Power matrices, in the order of measurements_list.
+        """
+        if self._number_of_workers <= 1 or len(measurements_list) <= 1:
+            return [make_power_matrix(measurements.ts,
+                measurements.meas_val_f, sensors=measurements.sensor,
+                **kwargs) for measurements in measurements_list]
+
+        from multiprocessing import shared_memory
+        sizes = [len(measurements.ts) for measurements in measurements_list]
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(int)
+        number_of_samples = max(int(offsets[-1]), 1)
+        input_memory = shared_memory.SharedMemory(create=True,
+            size=number_of_samples * 8 * 3)
+        try:
+            timestamps, values, sensor_codes = _get_input_arrays(
+                input_memory.buf, number_of_samples)
+            for measurements, start, end in zip(measurements_list,
+                offsets[:-1], offsets[1:]):
+                timestamps[start:end] = measurements.ts
+                values[start:end] = measurements.meas_val_f
+                # Codes of sorted names select the same sensor as the names:
+                sensor_codes[start:end] = pd.factorize(measurements.sensor,
+                    sort=True)[0]
+
+            executor = self._get_executor()
+            futures = [executor.submit(_make_power_matrix_in_worker,
+                input_memory.name, number_of_samples, int(start), int(end),
+                kwargs) for start, end in zip(offsets[:-1], offsets[1:])]
+            return [_take_output(future.result()) for future in futures]
+        finally:
+            input_memory.close()
+            input_memory.unlink()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def _get_executor(self):
+        # Workers are kept between calls, since spawning them costs more than
+        # transforming a site:
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._number_of_workers,
+                mp_context=multiprocessing.get_context(self._start_method))
+        return self._executor
+
+def _get_input_arrays(buffer, number_of_samples):
+    timestamps = np.ndarray(number_of_samples, dtype=np.int64, buffer=buffer)
+    values = np.ndarray(number_of_samples, dtype=np.float64, buffer=buffer,
+        offset=number_of_samples * 8)
+    sensor_codes = np.ndarray(number_of_samples, dtype=np.int64,
+        buffer=buffer, offset=number_of_samples * 16)
+    return timestamps, values, sensor_codes
+
+def _make_power_matrix_in_worker(input_name, number_of_samples, start, end,
+    kwargs):
+    from multiprocessing import shared_memory
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    try:
+        timestamps, values, sensor_codes = _get_input_arrays(
+            input_memory.buf, number_of_samples)
+        power_matrix = make_power_matrix(timestamps[start:end],
+            values[start:end], sensors=sensor_codes[start:end], **kwargs)
+        del timestamps, values, sensor_codes
+    finally:
+        input_memory.close()
+
+    output_memory = shared_memory.SharedMemory(create=True,
+        size=max(power_matrix.nbytes, 1))
+    output = np.ndarray(power_matrix.shape, dtype=power_matrix.dtype,
+        buffer=output_memory.buf)
+    output[:] = power_matrix
+    del output
+    # Worker processes share the resource tracker of the parent process,
+    # which unlinks the block after copying it:
+    output_memory.close()
+    return output_memory.name, power_matrix.shape, power_matrix.dtype.str
+
+def _take_output(output):
+    from multiprocessing import shared_memory
+    name, shape, dtype = output
+    output_memory = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=output_memory.buf).copy()
+    finally:
+        output_memory.close()
+        output_memory.unlink()
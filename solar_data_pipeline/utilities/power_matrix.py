@@ -0,0 +1,500 @@
+"""
+This module contains the NumPy-native construction of power matrices.
+It produces the same matrix as make_time_series, standardize_time_axis and
+make_2d chained through pandas, by binning timestamps onto a fixed grid with
+integer arithmetic and filling the matrix with vectorized operations.
+"""
+import numpy as np
+import pandas as pd
+
+MILLISECONDS_PER_MINUTE = 60 * 1000
+MILLISECONDS_PER_DAY = 24 * 60 * MILLISECONDS_PER_MINUTE
+SENTINEL_VALUE = -999999.0
+# Minimum number of 5-minute values of a sensor, as in make_time_series:
+DEFAULT_FILTER_LENGTH = 200
+
+def make_power_matrix(timestamps, values, sensors=None,
+    sampling_interval_minutes=5, localize_hours=0, filter_length=None,
+    zero_nighttime=True, interp_missing=True, trim_start=True, trim_end=True,
+    first_day=None, dtype=np.float64):
+    """
+    Arguments
+    -----------------
+    timestamps : numpy array
+        Timestamp of each sample, as int64 milliseconds since epoch or as
+        datetime64.
+    values : numpy array
+        Value of each sample. SENTINEL_VALUE and NaN mark missing values.
+    sensors : numpy array
+        Name of sensor of each sample. If given, only the samples of the first
+        sensor, in sorted order, with more than filter_length values are used,
+        as the column ac_power_01 of make_time_series.
+    sampling_interval_minutes : integer
+        Interval of time axis in minutes.
+    localize_hours : integer
+        Hours added to timestamps, e.g. -8 for PST.
+    filter_length : integer
+        Minimum number of values of a sensor, if sensors are given. If None,
+        200 values at 5 minutes, i.e. the same length of time at other
+        sampling intervals.
+    zero_nighttime : boolean
+        Whether to set values before sunrise and after sunset to zero.
+    interp_missing : boolean
+        Whether to fill missing values by linear interpolation in each day.
+    trim_start : boolean
+        Whether to drop the first day, which is usually partial.
+    trim_end : boolean
+        Whether to drop the last day, which is usually partial.
+    first_day : integer
+        Day of the first column before trimming, as days since epoch in local
+        time. Samples before it are dropped. Day of the first sample if None.
+    dtype : numpy dtype
+        Floating point type of the matrix, e.g. float32 to halve its memory.
+
+    Returns
+    -------
+    numpy array
+        Representing a matrix with row for time of day and column for dates,
+        containing power signals.
+    """
+    interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+    number_of_steps = MILLISECONDS_PER_DAY // interval
+    if filter_length is None:
+        filter_length = DEFAULT_FILTER_LENGTH * 5 // sampling_interval_minutes
+    timestamps, values = _select_samples(timestamps,
+        np.asarray(values, dtype=dtype), sensors, interval, filter_length)
+    if len(timestamps) == 0:
+        return np.empty((number_of_steps, 0), dtype=dtype)
+
+    # Keep the first of duplicate timestamps:
+    timestamps, first_indices = np.unique(timestamps, return_index=True)
+    values = values[first_indices]
+
+    timestamps = timestamps + localize_hours * 60 * MILLISECONDS_PER_MINUTE
+    if first_day is None:
+        first_day = timestamps[0] // MILLISECONDS_PER_DAY
+    # Nearest grid point from midnight of the first day:
+    slots = ((timestamps - first_day * MILLISECONDS_PER_DAY + interval // 2) //
+        interval)
+    is_in_range = slots >= 0
+    slots = slots[is_in_range]
+    values = values[is_in_range]
+    if len(slots) == 0:
+        return np.empty((number_of_steps, 0), dtype=dtype)
+    number_of_days = int(slots[-1] // number_of_steps) + 1
+
+    flat_matrix = np.full(number_of_days * number_of_steps, np.nan,
+        dtype=dtype)
+    flat_matrix[slots] = values
+    power_matrix = flat_matrix.reshape(number_of_steps, number_of_days,
+        order='F')
+
+    first_column = 1 if trim_start else 0
+    last_column = number_of_days - 1 if trim_end else number_of_days
+    power_matrix = power_matrix[:, first_column:max(first_column,
+        last_column)]
+
+    if zero_nighttime:
+        zero_nighttime_values(power_matrix)
+    if interp_missing:
+        interpolate_missing_values(power_matrix)
+    return power_matrix
+
+def get_first_day(timestamps, values, sensors=None,
+    sampling_interval_minutes=5, localize_hours=0, filter_length=None):
+    """
+    Arguments
+    -----------------
+    Same as make_power_matrix.
+
+    Returns
+    -------
+    integer
+        Day of the first column of make_power_matrix with the same arguments
+        and first_day of None, before the first day is trimmed, as days since
+        epoch in local time. It is the day of the first sample left after
+        missing values, samples off the time axis and other sensors are
+        dropped. None if no sample is left.
+    """
+    interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+    if filter_length is None:
+        filter_length = DEFAULT_FILTER_LENGTH * 5 // sampling_interval_minutes
+    timestamps, _ = _select_samples(timestamps,
+        np.asarray(values, dtype=np.float64), sensors, interval,
+        filter_length)
+    if len(timestamps) == 0:
+        return None
+    return int((timestamps[0] + localize_hours * 60 *
+        MILLISECONDS_PER_MINUTE) // MILLISECONDS_PER_DAY)
+
+def make_channel_matrices(timestamps, values, meas_names, sensors, channels,
+    sampling_interval_minutes=5, localize_hours=0, filter_length=None,
+    zero_nighttime=True, interp_missing=True, trim_start=True, trim_end=True,
+    first_day=None):
+    """
+    Makes the power matrices of several channels on one time axis. Samples
+    are sorted and binned onto the grid once for all channels, so that the
+    matrices are aligned day by day.
+
+    Arguments
+    -----------------
+    timestamps : numpy array
+        Timestamp of each sample, as int64 milliseconds since epoch or as
+        datetime64.
+    values : numpy array
+        Value of each sample. SENTINEL_VALUE and NaN mark missing values.
+    meas_names : numpy array or string
+        Name of measurement of each sample, or of all samples.
+    sensors : numpy array
+        Name of sensor of each sample.
+    channels : list
+        Tuples of name of measurement and name of sensor. If the name of
+        sensor is None, the samples of the first sensor of the measurement
+        with more than filter_length values are used, as in
+        make_power_matrix.
+    zero_nighttime : boolean or list
+        Whether to set values before sunrise and after sunset to zero, for
+        all channels or for each channel. Should be False for channels such
+        as temperature, which are not zero at night.
+    first_day : integer
+        Day of the first column before trimming, as days since epoch in local
+        time. Day of the first sample of any channel if None.
+
+    Other arguments are the same as make_power_matrix.
+
+    Returns
+    -------
+    numpy array
+        Array with axis for time of day, for dates and for channels, in the
+        order of channels. Each channel is the same as make_power_matrix
+        with the samples of the channel, except that the first day is the
+        day of the first sample of any channel.
+    """
+    interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+    number_of_steps = MILLISECONDS_PER_DAY // interval
+    if filter_length is None:
+        filter_length = DEFAULT_FILTER_LENGTH * 5 // sampling_interval_minutes
+    number_of_channels = len(channels)
+    timestamps = to_milliseconds(timestamps)
+    values = np.asarray(values, dtype=np.float64)
+    if np.ndim(zero_nighttime) == 0:
+        zero_nighttime = [zero_nighttime] * number_of_channels
+    if len(timestamps) == 0:
+        return np.empty((number_of_steps, 0, number_of_channels))
+
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    values = values[order]
+    sensors = np.asarray(sensors)[order]
+    if np.ndim(meas_names) == 0:
+        meas_names = np.full(len(timestamps), meas_names, dtype=object)
+    else:
+        meas_names = np.asarray(meas_names)[order]
+    is_valid = ~np.isnan(values) & (values != SENTINEL_VALUE)
+
+    # Indices of the samples of each channel, in order of time:
+    indices_list = []
+    for meas_name, sensor in channels:
+        indices = np.flatnonzero(meas_names == meas_name)
+        if sensor is not None:
+            indices = indices[sensors[indices] == sensor]
+        if len(indices) == 0:
+            indices_list.append(indices)
+            continue
+        # Time axis of each channel starts at its own first sample, as in
+        # make_power_matrix, so that channels of other cadences or phases
+        # do not drop its samples:
+        mask = is_valid[indices] & ((timestamps[indices] -
+            timestamps[indices[0]]) % interval == 0)
+        if sensor is None:
+            mask &= _select_sensor_mask(sensors[indices], mask,
+                filter_length)
+        indices_list.append(indices[mask])
+    channel_codes = np.repeat(np.arange(number_of_channels),
+        [len(indices) for indices in indices_list])
+    indices = np.concatenate(indices_list).astype(np.int64)
+    if len(indices) == 0:
+        return np.empty((number_of_steps, 0, number_of_channels))
+
+    localized_timestamps = timestamps + (
+        localize_hours * 60 * MILLISECONDS_PER_MINUTE)
+    if first_day is None:
+        first_day = localized_timestamps[indices].min() // MILLISECONDS_PER_DAY
+    # Nearest grid point from midnight of the first day, once for all
+    # channels:
+    slots = ((localized_timestamps - first_day * MILLISECONDS_PER_DAY +
+        interval // 2) // interval)[indices]
+    is_in_range = slots >= 0
+    slots = slots[is_in_range]
+    indices = indices[is_in_range]
+    channel_codes = channel_codes[is_in_range]
+    if len(slots) == 0:
+        return np.empty((number_of_steps, 0, number_of_channels))
+    number_of_days = int(slots.max() // number_of_steps) + 1
+
+    # Keep the first of duplicate timestamps of each channel:
+    _, first_indices = np.unique(channel_codes * (number_of_days *
+        number_of_steps) + slots, return_index=True)
+    flat_matrices = np.full((number_of_days * number_of_steps,
+        number_of_channels), np.nan)
+    flat_matrices[slots[first_indices], channel_codes[first_indices]] =\
+        values[indices[first_indices]]
+    power_matrices = flat_matrices.reshape(number_of_days, number_of_steps,
+        number_of_channels).transpose(1, 0, 2)
+
+    first_column = 1 if trim_start else 0
+    last_column = number_of_days - 1 if trim_end else number_of_days
+    power_matrices = np.ascontiguousarray(power_matrices[:,
+        first_column:max(first_column, last_column)])
+
+    for channel in range(number_of_channels):
+        power_matrix = power_matrices[:, :, channel]
+        if zero_nighttime[channel]:
+            zero_nighttime_values(power_matrix)
+        if interp_missing:
+            interpolate_missing_values(power_matrix)
+    return power_matrices
+
+class PowerMatrixBuilder:
+    """
+    Builds the power matrix of one sensor from pages of samples appended one
+    after another, e.g. chunks of a file, so that only the matrix is kept and
+    the samples of all pages are never held at once. The matrix is the same
+    as make_power_matrix of all samples with the sensors of the samples given,
+    for samples appended in order of time.
+
+    Arguments
+    -----------------
+    Same as make_power_matrix. first_day is the day of the first value
+    appended if None. Samples before first_day are dropped.
+    """
+
+    def __init__(self, sampling_interval_minutes=5, localize_hours=0,
+        filter_length=None, zero_nighttime=True, interp_missing=True,
+        trim_start=True, trim_end=True, first_day=None, dtype=np.float64):
+        self._interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+        self._number_of_steps = MILLISECONDS_PER_DAY // self._interval
+        if filter_length is None:
+            filter_length = (DEFAULT_FILTER_LENGTH * 5 //
+                sampling_interval_minutes)
+        self._localize_milliseconds = (localize_hours * 60 *
+            MILLISECONDS_PER_MINUTE)
+        self._filter_length = filter_length
+        self._zero_nighttime = zero_nighttime
+        self._interp_missing = interp_missing
+        self._trim_start = trim_start
+        self._trim_end = trim_end
+        self._first_day = first_day
+        self._dtype = dtype
+        # Time axis of make_time_series starts at the first sample:
+        self._first_timestamp = None
+        self._flat_matrix = np.full(0, np.nan, dtype=dtype)
+        self._number_of_days = 0
+        self._number_of_values = 0
+
+    def append(self, timestamps, values):
+        """
+        Arguments
+        -----------------
+        timestamps : numpy array
+            Timestamp of each sample, as int64 milliseconds since epoch or as
+            datetime64.
+        values : numpy array
+            Value of each sample. SENTINEL_VALUE and NaN mark missing values.
+        """
+        timestamps = to_milliseconds(timestamps)
+        values = np.asarray(values, dtype=self._dtype)
+        if len(timestamps) == 0:
+            return
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamps[0]
+        mask = (timestamps - self._first_timestamp) % self._interval == 0
+        mask &= ~np.isnan(values) & (values != SENTINEL_VALUE)
+        timestamps = timestamps[mask] + self._localize_milliseconds
+        values = values[mask]
+        if len(timestamps) == 0:
+            return
+        if self._first_day is None:
+            self._first_day = timestamps[0] // MILLISECONDS_PER_DAY
+        # Nearest grid point from midnight of the first day:
+        slots = ((timestamps - self._first_day * MILLISECONDS_PER_DAY +
+            self._interval // 2) // self._interval)
+        is_in_range = slots >= 0
+        slots = slots[is_in_range]
+        values = values[is_in_range]
+        if len(slots) == 0:
+            return
+        # Keep the first of duplicate timestamps, in this page and in earlier
+        # pages:
+        slots, first_indices = np.unique(slots, return_index=True)
+        values = values[first_indices]
+        self._reserve(int(slots[-1] // self._number_of_steps) + 1)
+        is_new = np.isnan(self._flat_matrix[slots])
+        self._flat_matrix[slots[is_new]] = values[is_new]
+        self._number_of_values += int(np.count_nonzero(is_new))
+
+    def power_matrix(self):
+        """
+        Returns
+        -------
+        numpy array
+            Representing a matrix with row for time of day and column for
+            dates, containing power signals of the samples appended so far.
+        """
+        if self._number_of_values <= self._filter_length:
+            return np.empty((self._number_of_steps, 0), dtype=self._dtype)
+        power_matrix = self._flat_matrix[:self._number_of_days *
+            self._number_of_steps].reshape(self._number_of_steps,
+            self._number_of_days, order='F')
+        first_column = 1 if self._trim_start else 0
+        last_column = (self._number_of_days - 1 if self._trim_end
+            else self._number_of_days)
+        power_matrix = power_matrix[:, first_column:max(first_column,
+            last_column)].copy()
+
+        if self._zero_nighttime:
+            zero_nighttime_values(power_matrix)
+        if self._interp_missing:
+            interpolate_missing_values(power_matrix)
+        return power_matrix
+
+    def _reserve(self, number_of_days):
+        if number_of_days <= self._number_of_days:
+            return
+        required_size = number_of_days * self._number_of_steps
+        if required_size > len(self._flat_matrix):
+            # Capacity is doubled, so that appending days is amortized
+            # constant time per day:
+            flat_matrix = np.full(max(required_size,
+                2 * len(self._flat_matrix)), np.nan, dtype=self._dtype)
+            flat_matrix[:len(self._flat_matrix)] = self._flat_matrix
+            self._flat_matrix = flat_matrix
+        self._number_of_days = number_of_days
+
+def zero_nighttime_values(power_matrix):
+    """
+    Sets values below 0.5% of the maximum to NaN, and then sets values more
+    than one step before the first value or after the last value of each day
+    to zero, as make_2d does. Days without any value are set to zero.
+    Modifies the matrix in place.
+    """
+    if power_matrix.size == 0:
+        return
+    with np.errstate(invalid='ignore'):
+        if np.all(np.isnan(power_matrix)):
+            threshold = np.nan
+        else:
+            threshold = 0.005 * np.nanmax(power_matrix)
+        power_matrix[power_matrix < threshold] = np.nan
+    good_values = ~np.isnan(power_matrix)
+    sunrise_indices = np.argmax(good_values, axis=0)
+    sunset_indices = (power_matrix.shape[0] -
+        np.argmax(good_values[::-1], axis=0))
+    rows = np.arange(power_matrix.shape[0])[:, np.newaxis]
+    night_mask = np.where(sunrise_indices > 0,
+        (rows < sunrise_indices - 1) | (rows > sunset_indices), True)
+    power_matrix[night_mask] = 0
+
+def interpolate_missing_values(power_matrix):
+    """
+    Fills NaN in each column by linear interpolation between the neighboring
+    values, and trailing NaN with the last value, as
+    pandas.DataFrame.interpolate does. Leading NaN are kept.
+    Modifies the matrix in place.
+    """
+    number_of_rows = power_matrix.shape[0]
+    flat_matrix = power_matrix.reshape(-1, order='F')
+    missing = np.isnan(flat_matrix)
+    if not np.any(missing) or np.all(missing):
+        return
+    indices = np.arange(len(flat_matrix))
+    columns = indices // number_of_rows
+    previous_indices = np.maximum.accumulate(np.where(~missing, indices, -1))
+    next_indices = np.minimum.accumulate(np.where(~missing, indices,
+        len(flat_matrix))[::-1])[::-1]
+    has_previous = (previous_indices >= 0) & (
+        previous_indices // number_of_rows == columns)
+    has_next = (next_indices < len(flat_matrix)) & (
+        next_indices // number_of_rows == columns)
+
+    previous_values = flat_matrix[np.clip(previous_indices, 0, None)]
+    next_values = flat_matrix[np.clip(next_indices, None,
+        len(flat_matrix) - 1)]
+    between = missing & has_previous & has_next
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = ((indices - previous_indices) /
+            (next_indices - previous_indices))
+    filled = np.where(between,
+        previous_values + (next_values - previous_values) * weights,
+        previous_values)
+    fill_mask = missing & has_previous
+    flat_matrix[fill_mask] = filled[fill_mask]
+    power_matrix[:] = flat_matrix.reshape(power_matrix.shape, order='F')
+
+def measurement_arrays(data_array):
+    """
+    Arguments
+    -----------------
+    data_array : numpy array or MeasurementColumns
+        Rows of measurement_raw as dictionaries, or measurements as columns.
+
+    Returns
+    -------
+    tuple
+        Arrays of timestamps, values and sensors.
+    """
+    if hasattr(data_array, 'meas_val_f'):
+        return data_array.ts, data_array.meas_val_f, data_array.sensor
+    number_of_rows = len(data_array)
+    timestamps = pd.to_datetime([row['ts'] for row in data_array]).values
+    values = np.fromiter((np.nan if row['meas_val_f'] is None
+        else row['meas_val_f'] for row in data_array), dtype=np.float64,
+        count=number_of_rows)
+    sensors = np.array([row['sensor'] for row in data_array], dtype=object)
+    return timestamps, values, sensors
+
+def to_milliseconds(timestamps):
+    """
+    Returns
+    -------
+    numpy array
+        Timestamps given as datetime64 or as milliseconds, as int64
+        milliseconds since epoch.
+    """
+    timestamps = np.asarray(timestamps)
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        return timestamps.astype('datetime64[ms]').astype(np.int64)
+    return timestamps.astype(np.int64)
+
+def _select_samples(timestamps, values, sensors, interval, filter_length):
+    """
+    Returns
+    -------
+    tuple
+        Timestamps as milliseconds and values of the samples used by
+        make_power_matrix, in order of time.
+    """
+    timestamps = to_milliseconds(timestamps)
+    if len(timestamps) == 0:
+        return timestamps, values
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    values = values[order]
+    # Time axis of make_time_series starts at the first sample of any sensor:
+    mask = ((timestamps - timestamps[0]) % interval == 0)
+    mask &= ~np.isnan(values) & (values != SENTINEL_VALUE)
+    if sensors is not None:
+        sensors = np.asarray(sensors)[order]
+        mask &= _select_sensor_mask(sensors, mask, filter_length)
+    return timestamps[mask], values[mask]
+
+def _select_sensor_mask(sensors, mask, filter_length):
+    # Hashing sensor names is much faster than sorting an object array:
+    codes, unique_sensors = pd.factorize(sensors)
+    counts = np.bincount(codes[mask & (codes >= 0)],
+        minlength=len(unique_sensors))
+    for code in sorted(range(len(unique_sensors)),
+        key=lambda code: unique_sensors[code]):
+        if counts[code] > filter_length:
+            return codes == code
+    return np.zeros(len(sensors), dtype=bool)
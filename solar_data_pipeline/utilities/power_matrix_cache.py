@@ -0,0 +1,239 @@
+"""
+This module contains the on-disk cache of power matrices.
+Each power matrix is stored as a .npy file, which is memory-mapped when read,
+next to a small JSON file describing its key. The modification time of the
+.npy file is the time of last use, so that least recently used matrices are
+evicted first when the cache exceeds its size, without a shared index file
+that concurrent processes would have to lock.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.utilities.data_trainsformation import\
+    DEFAULT_SAMPLING_INTERVAL_MINUTES
+
+class PowerMatrixCache:
+    """
+    Arguments
+    -----------------
+    directory : string
+        Directory of cache files. Created if it does not exist.
+    max_bytes : integer
+        Maximum total size of cached matrices. Not bounded if None.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, site, start_time, end_time, data_transformation):
+        """
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        start_time : datetime
+            Start of time range, or None for the first timestamp of the site.
+        end_time : datetime
+            End of time range, or None for the last timestamp of the site.
+        data_transformation : object
+            Data transformation the power matrix was made with.
+
+        Returns
+        -------
+        numpy array
+            Read-only memory-mapped power matrix, or None if not cached.
+        """
+        file_path = self._get_file_path(site, start_time, end_time,
+            data_transformation)
+        try:
+            power_matrix = np.load(file_path + '.npy', mmap_mode='r')
+            # Marks the entry as recently used:
+            os.utime(file_path + '.npy')
+        except (FileNotFoundError, ValueError):
+            return None
+        return power_matrix
+
+    def put(self, site, start_time, end_time, data_transformation,
+        power_matrix):
+        """
+        Stores the power matrix, and evicts least recently used matrices if
+        the cache exceeds its size. Arguments are the same as get.
+        """
+        file_path = self._get_file_path(site, start_time, end_time,
+            data_transformation)
+        metadata = {'site': site,
+            'start_time': _to_milliseconds(start_time),
+            'end_time': _to_milliseconds(end_time),
+            'data_transformation': get_transformation_key(data_transformation)}
+        write_atomically(file_path + '.npy',
+            lambda file: np.save(file, np.asarray(power_matrix)))
+        write_atomically(file_path + '.json',
+            lambda file: file.write(json.dumps(metadata).encode('utf-8')))
+        if self._max_bytes is not None:
+            self._evict(self._max_bytes)
+
+    def invalidate(self, site=None, start_time=None, end_time=None):
+        """
+        Removes the matrices of the site whose time range overlaps the given
+        time range. Open ended time ranges overlap any time range.
+
+        Arguments
+        -----------------
+        site : string
+            Name of site. All sites if None.
+        start_time : datetime
+            Start of time range. Unbounded if None.
+        end_time : datetime
+            End of time range. Unbounded if None.
+
+        Returns
+        -------
+        integer
+            Number of removed matrices.
+        """
+        start = _to_milliseconds(start_time)
+        end = _to_milliseconds(end_time)
+        number_of_removed_entries = 0
+        with self._lock:
+            for file_path, metadata in self._list_entries():
+                if site is not None and metadata['site'] != site:
+                    continue
+                if _overlaps(metadata['start_time'], metadata['end_time'],
+                    start, end):
+                    _remove_entry(file_path)
+                    number_of_removed_entries += 1
+        return number_of_removed_entries
+
+    def clear(self):
+        self.invalidate()
+
+    def size(self):
+        """
+        Returns
+        -------
+        integer
+            Total size in bytes of cached matrices.
+        """
+        return sum(_get_file_size(file_path + '.npy')
+            for file_path, _ in self._list_entries())
+
+    def _evict(self, max_bytes):
+        with self._lock:
+            entries = []
+            for file_path, _ in self._list_entries():
+                try:
+                    status = os.stat(file_path + '.npy')
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, file_path))
+            entries.sort()
+            total_size = sum(entry[1] for entry in entries)
+            for _, file_size, file_path in entries:
+                if total_size <= max_bytes:
+                    break
+                _remove_entry(file_path)
+                total_size -= file_size
+
+    def _list_entries(self):
+        """
+        Returns
+        -------
+        list
+            Tuples of file path without extension and metadata.
+        """
+        entries = []
+        for metadata_file_path in glob.glob(os.path.join(self._directory,
+            '*.json')):
+            try:
+                with open(metadata_file_path) as file:
+                    metadata = json.load(file)
+            except (FileNotFoundError, ValueError):
+                continue
+            entries.append((metadata_file_path[:-len('.json')], metadata))
+        return entries
+
+    def _get_file_path(self, site, start_time, end_time, data_transformation):
+        key = json.dumps([site, _to_milliseconds(start_time),
+            _to_milliseconds(end_time),
+            get_transformation_key(data_transformation)])
+        file_name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, file_name)
+
+def get_transformation_key(data_transformation):
+    """
+    Returns
+    -------
+    string
+        Full class name and version of the data transformation, so that
+        matrices made by a changed transformation are not used, its type of
+        matrices unless it is float64, and its sampling interval unless it is
+        5 minutes.
+    """
+    transformation_class = type(data_transformation)
+    key = '{}.{}:{}'.format(transformation_class.__module__,
+        transformation_class.__qualname__,
+        getattr(data_transformation, 'version', 0))
+    if hasattr(data_transformation, '_get_dtype_policy'):
+        dtype_key = data_transformation._get_dtype_policy().get_key()
+        if dtype_key != 'float64':
+            key += ':' + dtype_key
+    if hasattr(data_transformation, '_get_sampling_interval_minutes'):
+        sampling_interval_minutes =\
+            data_transformation._get_sampling_interval_minutes()
+        if sampling_interval_minutes != DEFAULT_SAMPLING_INTERVAL_MINUTES:
+            key += ':{}min'.format(sampling_interval_minutes)
+    return key
+
+def _to_milliseconds(time):
+    if time is None:
+        return None
+    return int(pd.Timestamp(time).value // 1000000)
+
+def _overlaps(start, end, other_start, other_end):
+    return ((end is None or other_start is None or other_start <= end) and
+        (start is None or other_end is None or start <= other_end))
+
+def write_atomically(file_path, write):
+    """
+    Writes a file through a temporary file in the same directory, which is
+    renamed when complete, so that readers never see a partial file.
+
+    Arguments
+    -----------------
+    file_path : string
+        Path of file.
+    write : function
+        Function writing the content to the given binary file object.
+    """
+    directory = os.path.dirname(file_path)
+    file_descriptor, temporary_file_path = tempfile.mkstemp(dir=directory,
+        suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            write(file)
+        os.replace(temporary_file_path, file_path)
+    except BaseException:
+        os.remove(temporary_file_path)
+        raise
+
+def _remove_entry(file_path):
+    # Metadata is removed first, so that the entry is not listed any more:
+    for extension in ('.json', '.npy'):
+        try:
+            os.remove(file_path + extension)
+        except FileNotFoundError:
+            pass
+
+def _get_file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,206 @@
+"""
+This module contains the export and import of power matrices as Parquet or
+Arrow datasets partitioned by site, so that offline analysis does not need
+the database.
+Each row of a dataset is one day of one site, with the power signal of the
+day as a fixed size list and the metadata of the day as columns. Arrow files
+are memory-mapped when read, so that power matrices are views of the mapped
+files, and Parquet files are filtered by date with the statistics of their
+row groups.
+
+pyarrow is an optional dependency, installed with the parquet extra.
+"""
+import datetime
+import os
+from urllib.parse import quote
+import numpy as np
+
+FILE_FORMATS = {'parquet': 'data.parquet', 'arrow': 'data.arrow'}
+EPOCH = datetime.date(1970, 1, 1)
+
+class PowerMatrixData:
+    """
+    Power matrix of one site with the metadata of its days.
+
+    Arguments
+    -----------------
+    site : string
+        Name of site.
+    power_matrix : numpy array
+        Matrix with row for time of day and column for dates.
+    day_indices : numpy array
+        Index of each day in the power matrix it was exported from.
+    dates : numpy array
+        Date of each day as datetime64[D], NaT where unknown.
+    time_shifts : numpy array
+        Time shift in minutes corrected on each day, positive toward later
+        times of day, -1 where unknown.
+    sampling_interval_minutes : integer
+        Interval of time axis in minutes.
+    """
+
+    def __init__(self, site, power_matrix, day_indices, dates, time_shifts,
+        sampling_interval_minutes):
+        self.site = site
+        self.power_matrix = power_matrix
+        self.day_indices = day_indices
+        self.dates = dates
+        self.time_shifts = time_shifts
+        self.sampling_interval_minutes = sampling_interval_minutes
+
+def write_power_matrix(directory, site, power_matrix, first_date=None,
+    time_shifts=None, sampling_interval_minutes=5, file_format='parquet'):
+    """
+    Writes the partition of the site, replacing a previous one.
+
+    Arguments
+    -----------------
+    directory : string
+        Root directory of dataset.
+    site : string
+        Name of site.
+    power_matrix : numpy array
+        Matrix with row for time of day and column for dates.
+    first_date : date
+        Date of first column. Dates are not recorded if None.
+    time_shifts : numpy array
+        Time shift in minutes corrected on each day, positive toward later
+        times of day, e.g. from find_rolls of the time_shifts module. Not
+        recorded if None.
+    sampling_interval_minutes : integer
+        Interval of time axis in minutes.
+    file_format : string
+        'parquet' or 'arrow'.
+    """
+    pa = _import_pyarrow()
+    number_of_rows, number_of_days = power_matrix.shape
+    # Columns of the matrix are contiguous in column-major order:
+    values = pa.array(np.asfortranarray(power_matrix, dtype=np.float64
+        ).ravel(order='F'))
+    if first_date is None:
+        dates = pa.nulls(number_of_days, type=pa.date32())
+    else:
+        first_day = (first_date - EPOCH).days
+        dates = pa.array(np.arange(first_day, first_day + number_of_days,
+            dtype=np.int32), type=pa.int32()).cast(pa.date32())
+    if time_shifts is None:
+        time_shifts = pa.nulls(number_of_days, type=pa.int32())
+    else:
+        time_shifts = pa.array(np.asarray(time_shifts, dtype=np.int32))
+    table = pa.table({
+        'day_index': pa.array(np.arange(number_of_days, dtype=np.int32)),
+        'date': dates,
+        'time_shift_minutes': time_shifts,
+        'sampling_interval_minutes': pa.array(
+            np.full(number_of_days, sampling_interval_minutes,
+                dtype=np.int16)),
+        'power': pa.FixedSizeListArray.from_arrays(values, number_of_rows)})
+
+    partition_directory = os.path.join(directory,
+        'site=' + quote(site, safe=''))
+    os.makedirs(partition_directory, exist_ok=True)
+    file_name = _get_file_name(file_format)
+    file_path = os.path.join(partition_directory, file_name)
+    # Datasets ignore files starting with a dot while they are written:
+    temporary_file_path = os.path.join(partition_directory,
+        '.' + file_name + '.tmp')
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        # Row groups of about a month let readers skip months by date:
+        pq.write_table(table, temporary_file_path, row_group_size=32)
+    else:
+        with pa.OSFile(temporary_file_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    os.replace(temporary_file_path, file_path)
+
+def read_power_matrices(directory, sites=None, start_date=None,
+    end_date=None, file_format='parquet'):
+    """
+    Arguments
+    -----------------
+    directory : string
+        Root directory of dataset.
+    sites : list
+        Name of sites to read. All sites if None. Partitions of other sites
+        are not opened.
+    start_date : date
+        Inclusive lower bound of dates. Days without date are excluded if a
+        bound is given.
+    end_date : date
+        Inclusive upper bound of dates.
+    file_format : string
+        'parquet' or 'arrow'.
+
+    Returns
+    -------
+    dictionary
+        Key: Name of site.
+        Value: PowerMatrixData.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.dataset as ds
+
+    # Names of sites are strings even if they look like numbers:
+    partitioning = ds.partitioning(pa.schema([('site', pa.string())]),
+        flavor='hive')
+    dataset = ds.dataset(directory, format=_get_dataset_format(file_format),
+        partitioning=partitioning)
+    site_filter = None
+    if sites is not None:
+        site_filter = ds.field('site').isin(list(sites))
+    date_filter = None
+    if start_date is not None:
+        date_filter = ds.field('date') >= pa.scalar(start_date, pa.date32())
+    if end_date is not None:
+        end_filter = ds.field('date') <= pa.scalar(end_date, pa.date32())
+        date_filter = end_filter if date_filter is None else (
+            date_filter & end_filter)
+
+    power_matrix_data = {}
+    for fragment in dataset.get_fragments(filter=site_filter):
+        site = ds.get_partition_keys(fragment.partition_expression)['site']
+        if file_format == 'parquet':
+            table = fragment.to_table(filter=date_filter)
+        else:
+            # Memory-mapped, so that the power matrix is a view of the file:
+            table = pa.ipc.open_file(pa.memory_map(fragment.path)).read_all()
+            if date_filter is not None:
+                table = ds.dataset(table).to_table(filter=date_filter)
+        power_matrix_data[site] = _make_power_matrix_data(site, table)
+    return power_matrix_data
+
+def _make_power_matrix_data(site, table):
+    power = table.column('power').combine_chunks()
+    number_of_rows = power.type.list_size
+    # Values of a sliced list array start at its offset:
+    values = power.values.slice(power.offset * number_of_rows,
+        len(power) * number_of_rows)
+    power_matrix = values.to_numpy(zero_copy_only=False).reshape(
+        len(power), number_of_rows).T
+    sampling_intervals = table.column('sampling_interval_minutes').to_numpy()
+    return PowerMatrixData(site, power_matrix,
+        table.column('day_index').to_numpy(),
+        table.column('date').to_numpy(zero_copy_only=False).astype(
+            'datetime64[D]'),
+        table.column('time_shift_minutes').fill_null(-1).to_numpy(),
+        int(sampling_intervals[0]) if len(sampling_intervals) > 0 else None)
+
+def _get_file_name(file_format):
+    if file_format not in FILE_FORMATS:
+        raise ValueError("File format must be one of: " +
+            ", ".join(FILE_FORMATS))
+    return FILE_FORMATS[file_format]
+
+def _get_dataset_format(file_format):
+    _get_file_name(file_format)
+    return 'ipc' if file_format == 'arrow' else file_format
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("pyarrow is required to export power matrices. " +
+            "Install it with: pip install solar-data-pipeline[parquet]")
+    return pyarrow
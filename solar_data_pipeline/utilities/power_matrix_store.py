@@ -0,0 +1,118 @@
+"""
+This module contains the append-only store of power matrices, which keeps one
+growing matrix per site for incremental synchronization.
+Each matrix is stored as raw values in column-major order, so that appending
+days appends bytes to the end of the file, and a JSON file records its shape,
+its first day and the high-water mark of the measurements it covers.
+"""
+import json
+import os
+from urllib.parse import quote
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix_cache import write_atomically
+
+class PowerMatrixStore:
+    """
+    Arguments
+    -----------------
+    directory : string
+        Directory of store files. Created if it does not exist.
+    number_of_rows : integer
+        Number of rows of power matrices, i.e. time steps per day.
+    dtype : numpy dtype
+        Type of stored values.
+    """
+
+    def __init__(self, directory, number_of_rows=288, dtype=np.float64):
+        self._directory = directory
+        self._number_of_rows = number_of_rows
+        self._dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, site):
+        """
+        Returns
+        -------
+        numpy array
+            Read-only memory-mapped power matrix of the site, or None if the
+            site is not stored.
+        """
+        metadata = self.get_metadata(site)
+        if metadata is None:
+            return None
+        if metadata['number_of_days'] == 0:
+            return np.empty((self._number_of_rows, 0), dtype=self._dtype)
+        return np.memmap(self._get_file_path(site) + '.bin',
+            dtype=self._dtype, mode='r',
+            shape=(self._number_of_rows, metadata['number_of_days']),
+            order='F')
+
+    def get_metadata(self, site):
+        """
+        Returns
+        -------
+        dictionary
+            With number_of_days, first_day as days since epoch in local time
+            and high_water_mark as milliseconds since epoch, or None if the
+            site is not stored.
+        """
+        try:
+            with open(self._get_file_path(site) + '.json') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def append(self, site, power_matrix, first_day, high_water_mark):
+        """
+        Appends columns to the power matrix of the site.
+
+        Arguments
+        -----------------
+        site : string
+            Name of site.
+        power_matrix : numpy array
+            Columns to append.
+        first_day : integer
+            Day of the first appended column, as days since epoch in local
+            time. Must follow the last stored day.
+        high_water_mark : integer
+            Milliseconds since epoch up to which measurements are covered by
+            the stored matrix after appending.
+        """
+        if power_matrix.shape[0] != self._number_of_rows:
+            raise ValueError("Power matrix must have {} rows.".format(
+                self._number_of_rows))
+        metadata = self.get_metadata(site)
+        if metadata is None:
+            metadata = {'number_of_days': 0, 'first_day': first_day}
+        elif first_day != metadata['first_day'] + metadata['number_of_days']:
+            raise ValueError("Day {} does not follow the last stored day of "
+                "site {}.".format(first_day, site))
+
+        file_path = self._get_file_path(site)
+        committed_size = (metadata['number_of_days'] * self._number_of_rows *
+            self._dtype.itemsize)
+        with open(file_path + '.bin', 'ab') as file:
+            # Drops values of an append that failed before its metadata was
+            # written:
+            file.truncate(committed_size)
+            file.write(np.asarray(power_matrix, dtype=self._dtype).tobytes(
+                order='F'))
+            file.flush()
+            os.fsync(file.fileno())
+
+        metadata['number_of_days'] += power_matrix.shape[1]
+        metadata['high_water_mark'] = int(high_water_mark)
+        write_atomically(file_path + '.json',
+            lambda file: file.write(json.dumps(metadata).encode('utf-8')))
+
+    def remove(self, site):
+        file_path = self._get_file_path(site)
+        for extension in ('.json', '.bin'):
+            try:
+                os.remove(file_path + extension)
+            except FileNotFoundError:
+                pass
+
+    def _get_file_path(self, site):
+        return os.path.join(self._directory, quote(site, safe=''))
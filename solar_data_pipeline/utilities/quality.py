@@ -0,0 +1,120 @@
+"""
+This module contains the quality scores of the days of a site, computed from
+raw measurements, so that days and sites of low quality can be left out
+before they are queried and transformed.
+"""
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix import SENTINEL_VALUE,\
+    MILLISECONDS_PER_MINUTE, MILLISECONDS_PER_DAY, to_milliseconds
+
+QUALITY_SCORES = ('completeness', 'sentinel_fraction', 'clipping_fraction')
+
+def score_days(timestamps, values, localize_hours=0,
+    sampling_interval_minutes=5, clipping_tolerance=0.005):
+    """
+    Arguments
+    -----------------
+    timestamps : numpy array
+        Timestamp of each sample, as int64 milliseconds since epoch or as
+        datetime64.
+    values : numpy array
+        Value of each sample. SENTINEL_VALUE and NaN mark missing values.
+    localize_hours : integer
+        Hours added to timestamps, e.g. -8 for PST.
+    sampling_interval_minutes : integer
+        Interval of time axis in minutes.
+    clipping_tolerance : float
+        Values within this fraction of the maximum of their day are clipped.
+
+    Returns
+    -------
+    dictionary
+        Key: 'day', and names of QUALITY_SCORES.
+        Value: NumPy array with one value per day with samples, sorted by
+        day. Days are days since epoch in local time. completeness is the
+        fraction of time steps of the day with a value, sentinel_fraction the
+        fraction of samples which are missing, and clipping_fraction the
+        fraction of daytime values at the maximum of the day, which is large
+        where an inverter limits the power.
+    """
+    interval = sampling_interval_minutes * MILLISECONDS_PER_MINUTE
+    number_of_steps = MILLISECONDS_PER_DAY // interval
+    timestamps = to_milliseconds(timestamps) + (
+        localize_hours * 60 * MILLISECONDS_PER_MINUTE)
+    values = np.asarray(values, dtype=np.float64)
+
+    days, day_indices = np.unique(timestamps // MILLISECONDS_PER_DAY,
+        return_inverse=True)
+    number_of_days = len(days)
+    number_of_samples = np.bincount(day_indices, minlength=number_of_days)
+    is_missing = np.isnan(values) | (values == SENTINEL_VALUE)
+    is_valid = ~is_missing
+
+    # Samples of several sensors at the same step count once:
+    steps = np.minimum((timestamps % MILLISECONDS_PER_DAY + interval // 2) //
+        interval, number_of_steps - 1)
+    valid_steps = np.unique(day_indices[is_valid] * number_of_steps +
+        steps[is_valid])
+    completeness = np.bincount(valid_steps // number_of_steps,
+        minlength=number_of_days) / number_of_steps
+
+    sentinel_fraction = np.bincount(day_indices, weights=is_missing,
+        minlength=number_of_days) / np.maximum(number_of_samples, 1)
+
+    clipping_fraction = np.zeros(number_of_days)
+    if np.any(is_valid):
+        day_maximums = np.full(number_of_days, -np.inf)
+        np.maximum.at(day_maximums, day_indices[is_valid], values[is_valid])
+        with np.errstate(invalid='ignore'):
+            # Same threshold of daytime as make_2d:
+            is_daytime = is_valid & (values > 0.005 * np.max(day_maximums))
+            is_clipped = is_daytime & (values >=
+                (1 - clipping_tolerance) * day_maximums[day_indices])
+        number_of_daytime_values = np.bincount(day_indices,
+            weights=is_daytime, minlength=number_of_days)
+        clipping_fraction = np.bincount(day_indices, weights=is_clipped,
+            minlength=number_of_days) / np.maximum(number_of_daytime_values, 1)
+
+    return {'day': days.astype(np.int64), 'completeness': completeness,
+        'sentinel_fraction': sentinel_fraction,
+        'clipping_fraction': clipping_fraction}
+
+class QualityThresholds:
+    """
+    Thresholds of the quality scores of days. A site qualifies if it has at
+    least min_number_of_days qualifying days.
+
+    Arguments
+    -----------------
+    min_completeness : float
+        Minimum fraction of time steps of a day with a value.
+    max_sentinel_fraction : float
+        Maximum fraction of samples of a day which are missing.
+    max_clipping_fraction : float
+        Maximum fraction of daytime values of a day which are clipped.
+    min_number_of_days : integer
+        Minimum number of qualifying days of a site.
+    """
+
+    def __init__(self, min_completeness=0.0, max_sentinel_fraction=1.0,
+        max_clipping_fraction=1.0, min_number_of_days=1):
+        self.min_completeness = min_completeness
+        self.max_sentinel_fraction = max_sentinel_fraction
+        self.max_clipping_fraction = max_clipping_fraction
+        self.min_number_of_days = min_number_of_days
+
+    def select_days(self, scores):
+        """
+        Arguments
+        -----------------
+        scores : dictionary
+            Quality scores as returned by score_days.
+
+        Returns
+        -------
+        numpy array
+            Boolean mask of qualifying days.
+        """
+        return ((scores['completeness'] >= self.min_completeness) &
+            (scores['sentinel_fraction'] <= self.max_sentinel_fraction) &
+            (scores['clipping_fraction'] <= self.max_clipping_fraction))
@@ -0,0 +1,189 @@
+"""
+This module contains the sampling of daily signals from several sources.
+Sources of days are represented as an integer array, and days are gathered
+with fancy indexing per source into a preallocated matrix, so that the cost
+does not grow with a Python loop over days.
+A sample specification makes a sample reproducible in any process. Each
+random choice draws from its own stream of the seed, e.g. the days of the
+i-th chosen site from stream (DAYS_STREAM, i), so that a sample is the same
+whichever worker or shard draws each part of it.
+"""
+import hashlib
+import json
+import numpy as np
+
+SITES_STREAM = 0
+DAYS_STREAM = 1
+SOURCES_STREAM = 2
+
+class SampleSpecification:
+    """
+    Specification of a random sample of days. Equal specifications draw the
+    same sample, compare equal and have the same hash, so that samples are
+    cached and replayed by their specification.
+
+    Arguments
+    -----------------
+    seed : integer
+        Seed of all random choices of the sample.
+    number_of_sites : integer
+        Number of randomly selected sites.
+    number_of_days_per_site : integer
+        Number of randomly selected days of each site.
+    sites : list
+        Name of sites which sites are selected from. All sites if None.
+    partition_ratio : dictionary
+        Key: Name of data source.
+        Value: Between 0 and 1. Ratio of data from that data source.
+    """
+
+    def __init__(self, seed, number_of_sites=4, number_of_days_per_site=10,
+        sites=None, partition_ratio=None):
+        self.seed = int(seed)
+        self.number_of_sites = int(number_of_sites)
+        self.number_of_days_per_site = int(number_of_days_per_site)
+        self.sites = None if sites is None else tuple(str(site)
+            for site in sites)
+        self.partition_ratio = None if partition_ratio is None else tuple(
+            sorted((str(key), float(value))
+            for key, value in dict(partition_ratio).items()))
+
+    def make_random_generator(self, *stream):
+        """
+        Arguments
+        -----------------
+        stream : integers
+            Index of stream, e.g. DAYS_STREAM and the position of a site.
+
+        Returns
+        -------
+        numpy.random.Generator
+            Generator of the stream, independent of the generators of other
+            streams of the seed, as those spawned by numpy.random.SeedSequence.
+        """
+        return np.random.default_rng(np.random.SeedSequence(self.seed,
+            spawn_key=tuple(int(index) for index in stream)))
+
+    def get_shard(self, shard_index, number_of_shards):
+        """
+        Returns
+        -------
+        numpy array
+            Positions of selected sites drawn by the shard, every
+            number_of_shards-th site from shard_index.
+        """
+        if not 0 <= shard_index < number_of_shards:
+            raise ValueError("Shard index must be between 0 and {}.".format(
+                number_of_shards - 1))
+        return np.arange(self.number_of_sites)[shard_index::number_of_shards]
+
+    def get_key(self):
+        """
+        Returns
+        -------
+        string
+            Hexadecimal digest of the specification, the same in all
+            processes, e.g. for names of files of cached samples.
+        """
+        return hashlib.sha1(json.dumps(self._get_fields()).encode('utf-8')
+            ).hexdigest()
+
+    def _get_fields(self):
+        return [self.seed, self.number_of_sites, self.number_of_days_per_site,
+            self.sites, self.partition_ratio]
+
+    def __eq__(self, other):
+        return (isinstance(other, SampleSpecification) and
+            self._get_fields() == other._get_fields())
+
+    def __hash__(self):
+        return hash(tuple(self._get_fields()))
+
+    def __repr__(self):
+        return ('SampleSpecification(seed={}, number_of_sites={}, ' +
+            'number_of_days_per_site={}, sites={}, partition_ratio={})'
+            ).format(self.seed, self.number_of_sites,
+            self.number_of_days_per_site,
+            None if self.sites is None else list(self.sites),
+            None if self.partition_ratio is None else
+            dict(self.partition_ratio))
+
+def get_random_generator(random_generator=None):
+    """
+    Arguments
+    -----------------
+    random_generator : numpy.random.Generator or integer
+        Generator, or seed of a new generator. A generator seeded from the
+        operating system if None.
+
+    Returns
+    -------
+    numpy.random.Generator
+    """
+    if isinstance(random_generator, np.random.Generator):
+        return random_generator
+    return np.random.default_rng(random_generator)
+
+def repeat_sources(counts):
+    """
+    Arguments
+    -----------------
+    counts : list
+        Number of days of each source.
+
+    Returns
+    -------
+    numpy array
+        Index of source repeated by its number of days, e.g. [0, 0, 1] for
+        counts of [2, 1].
+    """
+    return np.repeat(np.arange(len(counts)), counts)
+
+def choose_sources(source_indices, size, random_generator):
+    """
+    Chooses the source of each of the given number of days, without
+    replacement from source_indices.
+
+    Returns
+    -------
+    numpy array
+        Index of source of each day.
+    """
+    return random_generator.choice(source_indices, size, replace=False)
+
+def gather_columns(sources, source_indices, column_indices=None, out=None):
+    """
+    Gathers column column_indices[i] of source source_indices[i] into column i
+    of the output.
+
+    Arguments
+    -----------------
+    sources : list
+        Matrices with the same number of rows.
+    source_indices : numpy array
+        Index of source of each output column.
+    column_indices : numpy array
+        Index of column in its source of each output column. The index of the
+        output column if None.
+    out : numpy array
+        Preallocated output. Allocated if None.
+
+    Returns
+    -------
+    numpy array
+        Matrix with one column per element of source_indices.
+    """
+    source_indices = np.asarray(source_indices)
+    if column_indices is None:
+        column_indices = np.arange(len(source_indices))
+    if out is None:
+        out = np.empty((np.shape(sources[0])[0], len(source_indices)),
+            dtype=np.result_type(*[np.asarray(source).dtype
+                for source in sources]))
+    # One fancy indexing per source, instead of one copy per column:
+    for source_index, source in enumerate(sources):
+        output_columns = np.flatnonzero(source_indices == source_index)
+        if len(output_columns) > 0:
+            out[:, output_columns] = np.asarray(source)[:,
+                column_indices[output_columns]]
+    return out
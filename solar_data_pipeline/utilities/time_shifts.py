@@ -0,0 +1,263 @@
+"""
+This module contains the correction of time shifts of power matrices, such as
+changes of daylight saving time and resets of clocks of data loggers, as a
+vectorized replacement of fix_time_shifts of solar-data-tools, which solves
+convex optimization problems. Solar noon is estimated for all days at once,
+shifts are found as steps between running medians of the solar noon of clear
+days, and the days between two shifts are rolled as one block.
+"""
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+TIME_SHIFT_MODES = ('fast', 'accurate')
+
+def fix_time_shifts(power_matrix, mode='fast', return_ixs=False, window=15,
+    threshold_hours=0.25):
+    """
+    Arguments
+    -----------------
+    power_matrix : numpy array
+        Matrix with row for time of day and column for dates.
+    mode : string
+        'fast' for the vectorized correction of this module, or 'accurate'
+        for fix_time_shifts of solar-data-tools, which is kept as the
+        reference.
+    return_ixs : boolean
+        Whether to also return the columns where shifts start.
+    window : integer
+        Number of days before and after a day whose solar noon is compared,
+        in fast mode.
+    threshold_hours : float
+        Minimum change of solar noon in hours which is a shift, in fast mode.
+
+    Returns
+    -------
+    numpy array
+        Power matrix with each day rolled in time of day, so that solar noon
+        is at the time of the first days. The given matrix if no shift is
+        found. With return_ixs, also the array of the columns where shifts
+        start.
+    """
+    if mode == 'accurate':
+        from solardatatools.data_transforms import fix_time_shifts as\
+            fix_time_shifts_of_solar_data_tools
+        return fix_time_shifts_of_solar_data_tools(power_matrix,
+            return_ixs=return_ixs)
+    if mode != 'fast':
+        raise ValueError("Mode must be one of: " +
+            ", ".join(TIME_SHIFT_MODES))
+
+    number_of_rows, number_of_days = power_matrix.shape
+    solar_noon = estimate_solar_noon(power_matrix)
+    solar_noon[~find_clear_days(power_matrix)] = np.nan
+
+    changepoints = _find_changepoints(solar_noon, window, threshold_hours)
+    boundaries = np.concatenate([[0], changepoints, [number_of_days]])
+    segment_lengths = np.diff(boundaries)
+    # Solar noon in hours of each segment, the previous one where a segment
+    # has no clear day:
+    segment_noons = np.full(len(segment_lengths), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i, (start, end) in enumerate(zip(boundaries[:-1],
+            boundaries[1:])):
+            segment_noons[i] = np.nanmean(solar_noon[start:end])
+    for i in range(1, len(segment_noons)):
+        if np.isnan(segment_noons[i]):
+            segment_noons[i] = segment_noons[i - 1]
+    rolls = np.round(np.nan_to_num(segment_noons[0] - segment_noons) *
+        number_of_rows / 24).astype(int)
+
+    # Shifts which are undone by rounding are not shifts:
+    is_shift = rolls[1:] != rolls[:-1]
+    index_set = changepoints[is_shift]
+    if len(index_set) == 0:
+        if return_ixs:
+            return power_matrix, index_set
+        return power_matrix
+
+    day_rolls = np.repeat(rolls, segment_lengths)
+    # np.roll of each day by its roll, as one gather:
+    row_indices = (np.arange(number_of_rows)[:, np.newaxis] -
+        day_rolls[np.newaxis, :]) % number_of_rows
+    fixed_power_matrix = np.take_along_axis(power_matrix, row_indices, axis=0)
+    if return_ixs:
+        return fixed_power_matrix, index_set
+    return fixed_power_matrix
+
+def find_rolls(power_matrix, fixed_power_matrix, index_set):
+    """
+    Finds how many rows each day was rolled by, in either mode of
+    fix_time_shifts, from the day with the most energy between two shifts.
+
+    Arguments
+    -----------------
+    power_matrix : numpy array
+        Matrix given to fix_time_shifts.
+    fixed_power_matrix : numpy array
+        Matrix returned by fix_time_shifts.
+    index_set : numpy array
+        Columns where shifts start, returned by fix_time_shifts.
+
+    Returns
+    -------
+    numpy array
+        Rows each day was rolled by as np.roll, positive toward later times
+        of day, between minus and plus half of the number of rows.
+    """
+    number_of_rows, number_of_days = power_matrix.shape
+    boundaries = np.concatenate([[0], np.sort(np.asarray(index_set,
+        dtype=int)), [number_of_days]])
+    # Row of the given day in each row of the day rolled by each roll:
+    rows = np.arange(number_of_rows)
+    rolled_rows = (rows[np.newaxis, :] - rows[:, np.newaxis]) % number_of_rows
+    power_matrix = np.nan_to_num(power_matrix)
+    fixed_power_matrix = np.nan_to_num(fixed_power_matrix)
+    rolls = np.zeros(number_of_days, dtype=int)
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if end <= start:
+            continue
+        day = start + int(np.argmax(np.abs(power_matrix[:, start:end]).sum(
+            axis=0)))
+        errors = np.abs(power_matrix[rolled_rows, day] -
+            fixed_power_matrix[np.newaxis, :, day]).sum(axis=1)
+        # No roll is preferred where several rolls fit, e.g. on empty days:
+        roll = int(np.argmin(errors))
+        rolls[start:end] = (roll if roll <= number_of_rows // 2
+            else roll - number_of_rows)
+    return rolls
+
+def estimate_solar_noon(power_matrix):
+    """
+    Returns
+    -------
+    numpy array
+        Solar noon of each day in hours, as the center of mass in time of the
+        power of the day. NaN for days without power.
+    """
+    power_matrix = np.nan_to_num(power_matrix)
+    hours = np.arange(power_matrix.shape[0]) * 24 / power_matrix.shape[0]
+    energy = power_matrix.sum(axis=0)
+    solar_noon = np.full(power_matrix.shape[1], np.nan)
+    has_energy = energy != 0
+    solar_noon[has_energy] = (hours @ power_matrix[:, has_energy] /
+        energy[has_energy])
+    return solar_noon
+
+def find_clear_days(power_matrix, th=0.1, window=31):
+    """
+    Finds clear days from the smoothness and the energy of each day, as
+    find_clear_days of solar-data-tools, except that the energy of very sunny
+    days is the running 90th percentile of daily energy instead of a
+    quantile regression.
+
+    Arguments
+    -----------------
+    power_matrix : numpy array
+        Matrix with row for time of day and column for dates.
+    th : float
+        Weight of smoothness against energy, between 0 and 1.
+    window : integer
+        Number of days of the running percentile.
+
+    Returns
+    -------
+    numpy array
+        Boolean mask of clear days.
+    """
+    power_matrix = np.nan_to_num(power_matrix)
+    smoothness = np.linalg.norm(power_matrix[:-2] - 2 * power_matrix[1:-1] +
+        power_matrix[2:], ord=1, axis=0)
+    smoothness = np.percentile(smoothness, 50) - smoothness
+    if np.max(smoothness) <= 0:
+        return np.zeros(power_matrix.shape[1], dtype=bool)
+    smoothness = np.clip(smoothness / np.max(smoothness), 0, None)
+
+    energy = power_matrix.sum(axis=0)
+    padding = np.full(window // 2, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        sunny_energy = np.nanpercentile(_sliding_windows(
+            np.concatenate([padding, energy, padding]), window), 90, axis=1)
+        relative_energy = np.clip(np.nan_to_num(energy / sunny_energy), 0, 1)
+
+    weights = np.power(smoothness, th) * np.power(relative_energy, 1 - th)
+    return weights >= 0.6
+
+def _find_changepoints(solar_noon, window, threshold_hours,
+    max_error_fraction=0.1):
+    """
+    Returns
+    -------
+    numpy array
+        Columns where the running median of solar noon of the following days
+        differs from that of the preceding days by at least the threshold,
+        each one at the split which separates the days before and after the
+        step best.
+    """
+    number_of_days = len(solar_noon)
+    padding = np.full(window, np.nan)
+    windows = _sliding_windows(np.concatenate([padding, solar_noon,
+        padding]), window)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medians = np.nanmedian(windows, axis=1)
+    # Medians of the days before and from day i:
+    steps = medians[window:window + number_of_days] - medians[:number_of_days]
+    is_candidate = np.abs(np.nan_to_num(steps)) >= threshold_hours
+    is_candidate[0] = False
+    candidates = np.flatnonzero(is_candidate)
+    if len(candidates) == 0:
+        return np.empty(0, dtype=int)
+
+    # Candidates of one step are within a window of each other:
+    groups = np.split(candidates,
+        np.flatnonzero(np.diff(candidates) > window) + 1)
+    changepoints = []
+    for group in groups:
+        step = steps[group[np.argmax(np.abs(steps[group]))]]
+        start = max(group[0] - window, 1)
+        end = min(group[-1] + window, number_of_days - 1)
+        before = medians[group[0]]
+        after = before + step
+        noon = solar_noon[start - 1:end + 1]
+        is_clear = ~np.isnan(noon)
+        is_after = is_clear & (np.abs(noon - after) < np.abs(noon - before))
+        is_before = is_clear & ~is_after
+        # Days on the wrong side of a split after day start - 1 + i:
+        errors = (np.concatenate([[0], np.cumsum(is_after)])[:-1] +
+            (np.sum(is_before) - np.concatenate([[0],
+            np.cumsum(is_before)])[:-1]))
+        # The middle of the best splits, which are the days between the
+        # clear days on both sides of the step:
+        best_splits = np.flatnonzero(errors[1:] == np.min(errors[1:])) + 1
+        first_run = np.split(best_splits,
+            np.flatnonzero(np.diff(best_splits) > 1) + 1)[0]
+        split = (first_run[0] + first_run[-1] + 1) // 2
+        changepoint = start - 1 + split
+        # Steps of noise are neither sharp nor as large at the split:
+        if errors[split] > max_error_fraction * np.sum(is_clear):
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            step_at_split = (
+                np.nanmedian(solar_noon[changepoint:changepoint + window]) -
+                np.nanmedian(solar_noon[max(changepoint - window, 0):
+                changepoint]))
+        if np.isnan(step_at_split):
+            step_at_split = step
+        if np.abs(step_at_split) >= threshold_hours:
+            changepoints.append(changepoint)
+    return np.unique(np.array(changepoints, dtype=int))
+
+def _sliding_windows(values, window):
+    """
+    Returns
+    -------
+    numpy array
+        Read-only view with one row per window of consecutive values, as
+        sliding_window_view of NumPy 1.20, which is not required.
+    """
+    return as_strided(values, shape=(len(values) - window + 1, window),
+        strides=(values.strides[0], values.strides[0]), writeable=False)
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from benchmarks.fleet import Fleet
+from benchmarks.run import run_benchmarks, compare_with_baseline
+from benchmarks.synthetic_session import SyntheticSession
+from solar_data_pipeline.database.utilities.paged_scanner import PagedScanner
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_synthetic_session_serves_fleet(self):
+
+        fleet = Fleet(2, 1)
+        session = SyntheticSession(fleet.get_partitions(), decode_rows=True)
+        try:
+            measurement_columns_list = PagedScanner(session,
+                fetch_size=1000).scan_sites(fleet.sites)
+        finally:
+            session.shutdown()
+
+        for site, measurement_columns in zip(fleet.sites,
+            measurement_columns_list):
+            np.testing.assert_array_equal(measurement_columns.ts,
+                fleet.timestamps)
+            np.testing.assert_array_equal(measurement_columns.meas_val_f,
+                fleet.values[site])
+
+    def test_run_benchmarks(self):
+
+        report = run_benchmarks(1, 1, stages=['fetch', 'decode'], repeat=1)
+
+        self.assertEqual(set(report['stages']), {'fetch', 'decode'})
+        self.assertEqual(report['stages']['fetch']['rows'], 288 * 365)
+        self.assertGreater(report['stages']['decode']['throughput'], 0)
+
+    def test_compare_with_baseline(self):
+
+        baseline = {'stages': {'fetch': {'throughput': 100.0},
+            'decode': {'throughput': 100.0}}}
+        report = {'stages': {
+            'fetch': {'throughput': 85.0, 'throughput_unit': 'rows/s'},
+            'decode': {'throughput': 50.0, 'throughput_unit': 'rows/s'},
+            'get': {'throughput': 1.0, 'throughput_unit': 'rows/s'}}}
+
+        regressions = compare_with_baseline(report, baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('decode'))
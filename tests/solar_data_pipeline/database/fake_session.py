@@ -0,0 +1,249 @@
+"""
+This module contains a stand-in for Cassandra driver Session, which evaluates
+simple CQL on rows kept in memory. It supports prepared statements, paging,
+toUnixTimestamp, distinct, count(*), fields of user defined types, inserts
+and batches of inserts, the columnar execution profile and execute_async with
+callbacks delivered on a separate thread, as the driver does. The stand-in of
+the benchmarks derives from it.
+"""
+import re
+import threading
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from solar_data_pipeline.database.utilities.columnar import\
+    columnar_factory, COLUMNAR_PROFILE
+
+_OPERATORS = {
+    '=': lambda value, bound: value == bound,
+    '>=': lambda value, bound: value >= bound,
+    '<=': lambda value, bound: value <= bound,
+    '>': lambda value, bound: value > bound,
+    '<': lambda value, bound: value < bound,
+    'in': lambda value, bound: value in bound,
+}
+
+class FakeSession:
+
+    def __init__(self, rows, page_size=None, failures=0):
+        """
+        Arguments
+        -----------------
+        rows : list
+            Dictionaries of column name to value.
+        page_size : integer
+            Page size used when statement doesn't define fetch_size.
+        failures : integer
+            Number of execute_async calls failing before the first success.
+        """
+        self.rows = rows
+        self._page_size = page_size
+        self._failures = failures
+        self._lock = threading.Lock()
+        self._event_loop = ThreadPoolExecutor(max_workers=1)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.number_of_executions = 0
+
+    def prepare(self, cql):
+        return FakePreparedStatement(cql)
+
+    def execute(self, statement, timeout=None, execution_profile=None):
+        pages = self._make_pages(statement, execution_profile)
+        return FakeResultSet(pages)
+
+    def execute_async(self, statement, timeout=None, execution_profile=None):
+        with self._lock:
+            self.number_of_executions += 1
+            if self._failures > 0:
+                self._failures -= 1
+                return FakeResponseFuture(self, None)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return FakeResponseFuture(self,
+            self._make_pages(statement, execution_profile))
+
+    def shutdown(self):
+        self._event_loop.shutdown()
+
+    def _finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _make_pages(self, statement, execution_profile=None):
+        if isinstance(statement, FakeBatchStatement):
+            for bound_statement in statement.statements:
+                self._insert(bound_statement)
+            return [None]
+        if statement.cql.startswith('insert'):
+            self._insert(statement)
+            return [None]
+        columns, conditions, order_desc, limit, distinct = _parse(
+            statement.cql)
+        rows = [row for row in self.rows if all(
+            _OPERATORS[operator](_comparable(row[column], value), value)
+            for (column, operator), value in zip(conditions, statement.values))]
+        # Rows of a partition are in the order of clustering columns:
+        rows = sorted(rows, key=lambda row: (row.get('site', ''),
+            row.get('meas_name', ''), row['ts']), reverse=order_desc)
+        if limit is not None:
+            rows = rows[:limit]
+        Row = namedtuple('Row', [name for name, _, _ in columns])
+        if len(columns) == 1 and columns[0][1] == 'count(*)':
+            rows = [Row(len(rows))]
+        else:
+            rows = [Row(*[function(row.get(column)) for _, column, function
+                in columns]) for row in rows]
+        if distinct:
+            rows = list(dict.fromkeys(rows))
+        page_size = statement.fetch_size or self._page_size or len(rows) or 1
+        pages = [rows[i:i + page_size]
+            for i in range(0, len(rows), page_size)] or [[]]
+        if execution_profile == COLUMNAR_PROFILE:
+            pages = [columnar_factory(Row._fields, page) for page in pages]
+        return pages
+
+    def _insert(self, statement):
+        match = re.match(r'insert into \w+ \((.+?)\) values', statement.cql)
+        row = dict(zip([column.strip() for column in
+            match.group(1).split(',')], statement.values))
+        if isinstance(row['ts'], int):
+            row['ts'] = datetime(1970, 1, 1) + timedelta(
+                milliseconds=row['ts'])
+        keys = ('site', 'meas_name', 'ts', 'sensor', 'station', 'company')
+        with self._lock:
+            # Rows with the same primary key are replaced:
+            self.rows = [existing_row for existing_row in self.rows
+                if any(existing_row.get(key) != row[key] for key in keys)]
+            self.rows.append(row)
+
+class FakeSessionManager:
+
+    def __init__(self, session):
+        self._session = session
+
+    def get_session(self, columnar=False):
+        return self._session
+
+class FakePreparedStatement:
+
+    def __init__(self, cql):
+        self.cql = cql
+        self.fetch_size = None
+
+    def bind(self, values):
+        statement = FakeBoundStatement(self.cql, tuple(values))
+        statement.fetch_size = self.fetch_size
+        return statement
+
+class FakeBoundStatement:
+
+    def __init__(self, cql, values):
+        self.cql = cql
+        self.values = values
+        self.fetch_size = None
+
+class FakeBatchStatement:
+
+    def __init__(self):
+        self.statements = []
+
+    def add(self, statement):
+        self.statements.append(statement)
+
+class FakeResultSet:
+
+    def __init__(self, pages):
+        self._pages = pages
+        self.current_rows = pages[0]
+
+    @property
+    def has_more_pages(self):
+        return len(self._pages) > 1
+
+    def fetch_next_page(self):
+        self._pages = self._pages[1:]
+        self.current_rows = self._pages[0]
+
+class FakeResponseFuture:
+
+    def __init__(self, session, pages):
+        self._session = session
+        self._pages = pages
+
+    @property
+    def has_more_pages(self):
+        return len(self._pages) > 1
+
+    def add_callbacks(self, callback, errback, callback_args=(),
+        errback_args=()):
+        self._callback = callback
+        self._callback_args = callback_args
+        self._errback = errback
+        self._errback_args = errback_args
+        self._session._event_loop.submit(self._deliver)
+
+    def start_fetching_next_page(self):
+        self._pages = self._pages[1:]
+        self._session._event_loop.submit(self._deliver)
+
+    def _deliver(self):
+        if self._pages is None:
+            self._errback(RuntimeError("Operation timed out"),
+                *self._errback_args)
+            return
+        if not self.has_more_pages:
+            self._session._finish()
+        page = self._pages[0]
+        # Pages may be made when they are delivered, as the driver decodes
+        # them on its event loop:
+        if callable(page):
+            page = page()
+        self._callback(page, *self._callback_args)
+
+def to_unix_timestamp(time):
+    return calendar.timegm(time.utctimetuple()) * 1000 + (
+        time.microsecond // 1000)
+
+def _comparable(value, bound):
+    if isinstance(bound, int) and hasattr(value, 'utctimetuple'):
+        return to_unix_timestamp(value)
+    return value
+
+def _parse_column(column):
+    """
+    Returns
+    -------
+    tuple
+        (Name in result, name of column in table, function applied to value)
+    """
+    match = re.match(r'toUnixTimestamp\((\w+)\)(?: as (\w+))?$',
+        column.strip())
+    if match is not None:
+        return (match.group(2) or match.group(1), match.group(1),
+            to_unix_timestamp)
+    match = re.match(r'count\(\*\) as (\w+)$', column.strip())
+    if match is not None:
+        return match.group(1), 'count(*)', None
+    # Field of user defined type:
+    match = re.match(r'(\w+)\.(\w+) as (\w+)$', column.strip())
+    if match is not None:
+        field = match.group(2)
+        return (match.group(3), match.group(1), lambda value: None
+            if value is None else getattr(value, field))
+    return column.strip(), column.strip(), lambda value: value
+
+def _parse(cql):
+    match = re.match(r'select (distinct )?(.+?) from \w+(?: where (.+?))?' +
+        r'(?: order by (.+?))?(?: limit (\d+))?;?$', cql.strip())
+    distinct = match.group(1) is not None
+    columns = [_parse_column(column) for column in match.group(2).split(',')]
+    conditions = []
+    if match.group(3) is not None:
+        for condition in match.group(3).split(' and '):
+            column, operator, _ = condition.split()
+            conditions.append((column, operator))
+    order_desc = match.group(4) is not None and 'desc' in match.group(4)
+    limit = int(match.group(5)) if match.group(5) is not None else None
+    return columns, conditions, order_desc, limit, distinct
@@ -0,0 +1,52 @@
+import unittest
+import os
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager, to_unix_timestamp
+
+class TestCassandraChannels(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        self._values = power_signals[:, :5].ravel(order='F')
+        # Midnight of 2019-01-01 in PST:
+        start_time = datetime(2019, 1, 1, 8, 0, 0)
+        self._rows = []
+        for meas_name, sensor, scale in [('ac_power', 'sensor_1', 1.0),
+            ('ac_power', 'sensor_2', 2.0), ('irradiance', 'sensor_1', 3.0)]:
+            self._rows.extend([{'site': 'SLACA0000001',
+                'meas_name': meas_name, 'sensor': sensor,
+                'ts': start_time + timedelta(minutes=5 * i),
+                'meas_val_f': scale * value}
+                for i, value in enumerate(self._values)])
+
+    def test_retrieve_channels(self):
+
+        session = FakeSession(self._rows)
+        data_access = CassandraDataAccess('127.0.0.1', fetch_size=500)
+        data_access._set_session_manager(FakeSessionManager(session))
+
+        actual_power_matrices = data_access.retrieve_channels('SLACA0000001',
+            ['ac_power', ('ac_power', 'sensor_2'), 'irradiance'],
+            as_dictionary=True)
+
+        rows = [row for row in self._rows if row['meas_name'] == 'ac_power']
+        expected_power_matrix = make_power_matrix(
+            np.array([to_unix_timestamp(row['ts']) for row in rows]),
+            np.array([row['meas_val_f'] for row in rows]),
+            sensors=np.array([row['sensor'] for row in rows]),
+            localize_hours=-8)
+        np.testing.assert_array_equal(actual_power_matrices['ac_power'],
+            expected_power_matrix)
+        np.testing.assert_allclose(
+            actual_power_matrices[('ac_power', 'sensor_2')],
+            2 * expected_power_matrix)
+        np.testing.assert_allclose(actual_power_matrices['irradiance'],
+            3 * expected_power_matrix)
@@ -297,3 +297,19 @@ class TestCassandraDataAccess(unittest.TestCase):
         expected_data_2 = TestCassandraDataAccess._power_signals_site_2[:,:1]
         np.testing.assert_almost_equal(actual_data_2, expected_data_2,
                                        decimal=5)
+
+class TestCassandraDataAccessWithoutDatabase(unittest.TestCase):
+
+    def test_construct_random_choice_list_with_remainder(self):
+
+        sites = np.array(["SLACA0000001", "SLACA0000002", "SLACA0000003"])
+
+        data_access = CassandraDataAccess('127.0.0.1')
+        actual_list = data_access._construct_random_choice_list(sites, 8)
+
+        # The remainder goes to the first sites, so that the list has one
+        # element per column:
+        expected_list = (["SLACA0000001"] * 3 + ["SLACA0000002"] * 3 +
+            ["SLACA0000003"] * 2)
+
+        np.testing.assert_array_equal(actual_list, expected_list)
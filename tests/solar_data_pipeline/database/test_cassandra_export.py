@@ -0,0 +1,190 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.utilities.fleet_store import FleetStore
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+from solar_data_pipeline.utilities.data_trainsformation import\
+    AbstractDataTransformation
+from solar_data_pipeline.utilities.dtype_policy import DtypePolicy
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager
+
+try:
+    from solar_data_pipeline.utilities.power_matrix_dataset import\
+        read_power_matrices
+    import pyarrow
+    PYARROW_IS_INSTALLED = True
+except ImportError:
+    PYARROW_IS_INSTALLED = False
+
+class PowerMatrixTransformation(AbstractDataTransformation):
+    """
+    Transformation without solar-data-tools, for testing.
+    """
+
+    def transform(self, data_array, datetimekey='Date-Time',
+        ac_power_key='ac_power'):
+        return self._get_dtype_policy().encode(make_power_matrix(
+            data_array.ts, data_array.meas_val_f, sensors=data_array.sensor,
+            sampling_interval_minutes=self._get_sampling_interval_minutes(),
+            localize_hours=-8))
+
+@unittest.skipIf(not PYARROW_IS_INSTALLED, "pyarrow is not installed.")
+class TestCassandraExport(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        # Five days from noon of 2018-12-31 in PST, with the values of the
+        # same times of day:
+        values = power_signals[:, :6].ravel(order='F')[144:144 + 288 * 5]
+        start_time = datetime(2018, 12, 31, 20, 0, 0)
+        rows = [{'site': 'SLACA0000001', 'meas_name': 'ac_power',
+                 'sensor': 'sensor_1',
+                 'ts': start_time + timedelta(minutes=5 * i),
+                 'meas_val_f': values[i]} for i in range(len(values))]
+        self._rows = rows
+        self._values = values
+        self._timestamps = np.array(start_time, dtype='datetime64[ms]') +\
+            np.arange(len(values)) * np.timedelta64(5, 'm')
+        self._data_access = CassandraDataAccess('127.0.0.1')
+        self._data_access._set_session_manager(FakeSessionManager(
+            FakeSession(rows)))
+        self._data_access.set_data_transformation(PowerMatrixTransformation())
+        self._temporary_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def test_export_power_matrices(self):
+
+        self._data_access.export_power_matrices(
+            self._temporary_directory.name, sites=['SLACA0000001'])
+
+        actual_data = read_power_matrices(self._temporary_directory.name)
+
+        site_data = actual_data['SLACA0000001']
+        self.assertEqual(site_data.power_matrix.shape, (288, 4))
+        np.testing.assert_array_equal(site_data.dates,
+            np.arange('2019-01-01', '2019-01-05', dtype='datetime64[D]'))
+
+    def test_export_records_time_shifts(self):
+
+        for time_shift_mode in [None, 'fast']:
+            self._data_access.export_power_matrices(
+                self._temporary_directory.name, sites=['SLACA0000001'],
+                time_shift_mode=time_shift_mode)
+
+            site_data = read_power_matrices(
+                self._temporary_directory.name)['SLACA0000001']
+
+            # No shift in four days:
+            np.testing.assert_array_equal(site_data.time_shifts, [0] * 4)
+            self.assertEqual(site_data.sampling_interval_minutes, 5)
+
+    def test_export_dates_start_after_first_used_sample(self):
+
+        # Missing values of the day before are not used by make_power_matrix,
+        # thus the power matrix starts on the same day:
+        start_time = self._rows[0]['ts'] - timedelta(days=1)
+        rows = [{'site': 'SLACA0000001', 'meas_name': 'ac_power',
+                 'sensor': 'sensor_1', 'ts': start_time + timedelta(
+                 minutes=5 * i), 'meas_val_f': -999999.0} for i in range(10)]
+        self._data_access._set_session_manager(FakeSessionManager(
+            FakeSession(rows + self._rows)))
+        fleet_store = FleetStore(self._temporary_directory.name)
+        dataset_directory = os.path.join(self._temporary_directory.name,
+            'dataset')
+
+        self._data_access.export_power_matrices(dataset_directory,
+            sites=['SLACA0000001'])
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'])
+
+        site_data = read_power_matrices(dataset_directory)['SLACA0000001']
+        np.testing.assert_array_equal(site_data.dates,
+            np.arange('2019-01-01', '2019-01-05', dtype='datetime64[D]'))
+        dates = fleet_store.get_dates()
+        np.testing.assert_array_equal(
+            fleet_store.get_array()[0][dates >= np.datetime64('2019-01-01')],
+            site_data.power_matrix.T)
+
+    def test_export_fleet_store(self):
+
+        fleet_store = FleetStore(self._temporary_directory.name)
+
+        exported_sites = self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001', 'SLACA0000002'])
+
+        self.assertEqual(exported_sites, ['SLACA0000001'])
+        self.assertEqual(fleet_store.get_array().shape, (2, 4, 288))
+        np.testing.assert_array_equal(fleet_store.get_dates(),
+            np.arange('2019-01-01', '2019-01-05', dtype='datetime64[D]'))
+        self.assertEqual(fleet_store.get_power_matrix('SLACA0000001').shape,
+            (288, 4))
+        self.assertTrue(np.all(np.isnan(fleet_store.get_array()[1])))
+
+    def test_export_int16_fleet_store(self):
+
+        fleet_store = FleetStore(self._temporary_directory.name)
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'])
+        power_matrix = np.array(fleet_store.get_power_matrix('SLACA0000001'))
+
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'], dtype=np.int16)
+
+        self.assertEqual(fleet_store.get_array().dtype, np.int16)
+        np.testing.assert_allclose(fleet_store.get_dtype_policy().decode(
+            fleet_store.get_power_matrix('SLACA0000001')), power_matrix,
+            atol=0.5)
+
+    def test_export_fleet_store_with_sampling_interval(self):
+
+        fleet_store = FleetStore(self._temporary_directory.name)
+        self._data_access.set_sampling_interval_minutes(60)
+
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'])
+
+        self.assertEqual(fleet_store.get_array().shape, (1, 4, 24))
+        # Same as the power matrix of the averages of the values of each
+        # hour:
+        hours, indices = np.unique(self._timestamps.astype('datetime64[h]'),
+            return_inverse=True)
+        np.testing.assert_allclose(
+            fleet_store.get_power_matrix('SLACA0000001'),
+            make_power_matrix(hours, np.bincount(indices,
+            weights=self._values) / np.bincount(indices),
+            sampling_interval_minutes=60, localize_hours=-8), atol=1e-6)
+        self.assertGreater(np.max(fleet_store.get_array()), 0)
+        with self.assertRaises(ValueError):
+            self._data_access.set_sampling_interval_minutes(7)
+
+    def test_export_in_watts_with_int16_dtype_policy(self):
+
+        fleet_store = FleetStore(self._temporary_directory.name)
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'])
+        power_matrix = np.array(fleet_store.get_power_matrix('SLACA0000001'))
+        self._data_access.set_dtype_policy(DtypePolicy(np.int16, scale=0.01))
+
+        self._data_access.export_fleet_store(fleet_store,
+            sites=['SLACA0000001'])
+        dataset_directory = os.path.join(self._temporary_directory.name,
+            'dataset')
+        self._data_access.export_power_matrices(dataset_directory,
+            sites=['SLACA0000001'])
+
+        np.testing.assert_allclose(
+            fleet_store.get_power_matrix('SLACA0000001'), power_matrix,
+            atol=0.005)
+        np.testing.assert_allclose(read_power_matrices(
+            dataset_directory)['SLACA0000001'].power_matrix,
+            power_matrix, atol=0.005)
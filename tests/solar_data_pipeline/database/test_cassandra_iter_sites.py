@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager
+
+class ColumnsDataTransformation:
+    """
+    Transformation without solar-data-tools, for testing.
+    """
+
+    def transform(self, data_array, datetimekey='Date-Time',
+        ac_power_key='ac_power'):
+        return make_power_matrix(data_array.ts, data_array.meas_val_f,
+            trim_start=False, trim_end=False, zero_nighttime=False,
+            interp_missing=False)
+
+class TestCassandraIterSites(unittest.TestCase):
+
+    def setUp(self):
+        start_time = datetime(2019, 1, 1, 0, 0, 0)
+        self._sites = ["SLACA000000{}".format(i) for i in range(1, 5)]
+        rows = []
+        for i, site in enumerate(self._sites):
+            rows.extend([{'site': site, 'meas_name': 'ac_power',
+                'sensor': 'sensor_1',
+                'ts': start_time + timedelta(minutes=5 * j),
+                'meas_val_f': float(i)} for j in range(288 * (i + 1))])
+        self._session = FakeSession(rows)
+        self._data_access = CassandraDataAccess('127.0.0.1')
+        self._data_access._set_session_manager(FakeSessionManager(
+            self._session))
+        self._data_access.set_data_transformation(ColumnsDataTransformation())
+
+    def test_iter_sites(self):
+
+        actual_sites = []
+        for site, power_matrix in self._data_access.iter_sites(
+            sites=self._sites, prefetch=2):
+            i = self._sites.index(site)
+            self.assertEqual(power_matrix.shape, (288, i + 1))
+            np.testing.assert_array_equal(power_matrix, float(i))
+            actual_sites.append(site)
+
+        self.assertEqual(actual_sites, self._sites)
+
+    def test_iter_sites_in_blocks_of_days(self):
+
+        blocks = list(self._data_access.iter_sites(sites=self._sites[2:],
+            days_per_block=2))
+
+        self.assertEqual([(site, block.shape[1]) for site, block in blocks],
+            [("SLACA0000003", 2), ("SLACA0000003", 1),
+             ("SLACA0000004", 2), ("SLACA0000004", 2)])
+
+    def test_iter_sites_stops_early(self):
+
+        site_iterator = self._data_access.iter_sites(sites=self._sites,
+            prefetch=1)
+        site, _ = next(site_iterator)
+        site_iterator.close()
+
+        self.assertEqual(site, "SLACA0000001")
+        # Timestamp bounds and window of at most the first three sites:
+        self.assertLessEqual(self._session.number_of_executions, 3 * 3)
@@ -0,0 +1,79 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+from solar_data_pipeline.utilities.power_matrix_store import PowerMatrixStore
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager, to_unix_timestamp
+
+class TestCassandraSync(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        self._values = power_signals[:, :6].ravel(order='F')
+        # Midnight of 2019-01-01 in PST:
+        self._start_time = datetime(2019, 1, 1, 8, 0, 0)
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._store = PowerMatrixStore(self._temporary_directory.name)
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def _make_rows(self, first_index, last_index):
+        return [{'site': 'SLACA0000001', 'meas_name': 'ac_power',
+                 'sensor': 'sensor_1',
+                 'ts': self._start_time + timedelta(minutes=5 * i),
+                 'meas_val_f': self._values[i]}
+                for i in range(first_index, last_index)]
+
+    def _make_data_access(self, session):
+        data_access = CassandraDataAccess('127.0.0.1', fetch_size=100)
+        data_access._set_session_manager(FakeSessionManager(session))
+        return data_access
+
+    def test_sync_appends_only_new_days(self):
+
+        # Half of first day to half of fourth day:
+        session = FakeSession(self._make_rows(144, 288 * 3 + 144))
+        data_access = self._make_data_access(session)
+
+        self.assertEqual(data_access.sync(self._store,
+            sites=['SLACA0000001']), {'SLACA0000001': 2})
+
+        # Rest of fourth day to half of sixth day. Rows of synchronized days
+        # are changed, which must not be scanned again:
+        rows = self._make_rows(144, 288 * 5 + 144)
+        session.rows = [dict(row, meas_val_f=1e6)
+            for row in rows[:288 * 3 - 144]] + rows[288 * 3 - 144:]
+
+        self.assertEqual(data_access.sync(self._store,
+            sites=['SLACA0000001']), {'SLACA0000001': 2})
+
+        metadata = self._store.get_metadata('SLACA0000001')
+        self.assertEqual(metadata['number_of_days'], 4)
+        self.assertEqual(metadata['high_water_mark'], to_unix_timestamp(
+            self._start_time + timedelta(days=5)))
+
+        expected_power_matrix = make_power_matrix(
+            np.array([to_unix_timestamp(row['ts']) for row in rows]),
+            np.array([row['meas_val_f'] for row in rows]),
+            localize_hours=-8)
+        np.testing.assert_allclose(self._store.get('SLACA0000001'),
+            expected_power_matrix)
+
+    def test_sync_without_new_days(self):
+
+        session = FakeSession(self._make_rows(144, 288 * 3 + 144))
+        data_access = self._make_data_access(session)
+        data_access.sync(self._store, sites=['SLACA0000001'])
+
+        self.assertEqual(data_access.sync(self._store,
+            sites=['SLACA0000001']), {'SLACA0000001': 0})
+        self.assertEqual(self._store.get('SLACA0000001').shape, (288, 2))
@@ -1,6 +1,20 @@
 import unittest
+import os
+import tempfile
+from datetime import datetime
+from datetime import timedelta
 import numpy as np
-from solar_data_pipeline.database.raw_cassandra import RawCassandraDataAccess
+from solar_data_pipeline.database.raw_cassandra import RawCassandraDataAccess,\
+    _make_day_ranges
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix,\
+    MILLISECONDS_PER_DAY, SENTINEL_VALUE
+from solar_data_pipeline.database.utilities.site_catalog import SiteCatalog
+from solar_data_pipeline.utilities.dtype_policy import DtypePolicy
+from solar_data_pipeline.utilities.instrumentation import Instrumentation
+from solar_data_pipeline.utilities.quality import QualityThresholds
+from solar_data_pipeline.utilities.sampling import SampleSpecification
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager
 
 class TestRawCassandraDataAccess(unittest.TestCase):
     """
@@ -26,3 +40,204 @@ class TestRawCassandraDataAccess(unittest.TestCase):
 
         self.assertEqual(actual_data.shape[1], number_of_sites *
             number_of_days_per_site)
+
+class TestRawCassandraDataAccessLazyRetrieve(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        # Two sites with 10 days each, from 4 AM of 2019-01-01 in PST:
+        start_time = datetime(2019, 1, 1, 12, 0, 0)
+        self._sites = ['SLACA0000001', 'SLACA0000002']
+        rows = []
+        for i, site in enumerate(self._sites):
+            values = power_signals[:, 10 * i:10 * (i + 1)].ravel(order='F')
+            rows.extend([{'site': site, 'meas_name': 'ac_power',
+                'sensor': 'sensor_1',
+                'ts': start_time + timedelta(minutes=5 * j),
+                'meas_val_f': values[j]} for j in range(len(values))])
+        self._rows = rows
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._data_access = self._make_data_access(5)
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def _make_data_access(self, random_generator):
+        data_access = RawCassandraDataAccess(ip_address='127.0.0.1',
+            random_generator=random_generator,
+            site_catalog_path=os.path.join(self._temporary_directory.name,
+            'site_catalog.npz'))
+        data_access._set_session_manager(FakeSessionManager(
+            FakeSession(self._rows)))
+        return data_access
+
+    def test_retrieve_queries_only_selected_days(self):
+
+        actual_data = self._data_access.retrieve(number_of_sites=2,
+            number_of_days_per_site=4, lazy=True)
+
+        self.assertEqual(actual_data.shape, (288, 8))
+        whole_power_matrices = [self._make_whole_power_matrix(site)
+            for site in self._sites]
+        for column in actual_data.T:
+            # Values below 0.5% of the maximum of the chosen days may differ:
+            self.assertTrue(any(np.any(np.all(np.isclose(
+                whole_power_matrix, column[:, np.newaxis],
+                atol=0.005 * np.max(whole_power_matrix)), axis=0))
+                for whole_power_matrix in whole_power_matrices))
+
+    def test_retrieve_is_reproducible_with_seed(self):
+
+        actual_data = []
+        for _ in range(2):
+            data_access = self._make_data_access(11)
+            actual_data.append(data_access.retrieve(number_of_sites=2,
+                number_of_days_per_site=3, lazy=True))
+
+        np.testing.assert_array_equal(actual_data[0], actual_data[1])
+
+    def test_retrieve_is_not_lazy_by_default(self):
+
+        spans = []
+        data_access = self._make_data_access(11)
+        data_access.set_instrumentation(Instrumentation(
+            exporters=[spans.append]))
+        expected_data = self._make_data_access(11).retrieve(number_of_sites=2,
+            number_of_days_per_site=3, lazy=False)
+
+        actual_data = data_access.retrieve(number_of_sites=2,
+            number_of_days_per_site=3)
+
+        np.testing.assert_array_equal(actual_data, expected_data)
+        self.assertEqual([span.attributes['lazy'] for span in spans
+            if span.name == 'cassandra.retrieve'], [False])
+
+    def test_retrieve_sample_specification_in_shards(self):
+
+        sample_specification = SampleSpecification(21, number_of_sites=3,
+            number_of_days_per_site=4)
+
+        for lazy in (True, False):
+            # Random generators of data access objects are not used:
+            expected_data = self._make_data_access(1).retrieve(lazy=lazy,
+                sample_specification=sample_specification)
+            shards = [self._make_data_access(2 + shard_index).retrieve(
+                lazy=lazy, sample_specification=sample_specification,
+                shard_index=shard_index, number_of_shards=2)
+                for shard_index in range(2)]
+
+            self.assertEqual(expected_data.shape, (288, 12))
+            # Shard 0 has sites 0 and 2, and shard 1 has site 1:
+            np.testing.assert_array_equal(shards[0],
+                expected_data[:, np.r_[0:4, 8:12]])
+            np.testing.assert_array_equal(shards[1], expected_data[:, 4:8])
+
+    def test_retrieve_with_compact_dtypes(self):
+
+        for lazy in (True, False):
+            expected_data = self._make_data_access(11).retrieve(
+                number_of_sites=2, number_of_days_per_site=3, lazy=lazy)
+            for dtype_policy in (DtypePolicy(np.float32),
+                DtypePolicy(np.int16, scale=0.01)):
+                data_access = self._make_data_access(11)
+                data_access.set_dtype_policy(dtype_policy)
+
+                actual_data = data_access.retrieve(number_of_sites=2,
+                    number_of_days_per_site=3, lazy=lazy)
+
+                self.assertEqual(actual_data.dtype, dtype_policy.dtype)
+                np.testing.assert_allclose(dtype_policy.decode(actual_data),
+                    expected_data, atol=0.01)
+
+    def test_retrieve_without_site_catalog(self):
+
+        data_access = RawCassandraDataAccess(ip_address='127.0.0.1',
+            random_generator=5)
+        data_access._set_session_manager(FakeSessionManager(
+            FakeSession(self._rows)))
+        data_access._select_sites = lambda number_of_sites=4, **kwargs:\
+            np.array(self._sites)
+
+        actual_data = data_access.retrieve(number_of_sites=2,
+            number_of_days_per_site=4, lazy=True)
+
+        # Time bounds are queried, since no catalog is attached by default:
+        self.assertIsNone(data_access._get_site_catalog())
+        self.assertEqual(actual_data.shape, (288, 8))
+
+    def test_retrieve_with_sampling_interval(self):
+
+        hourly_power_matrices = [self._make_hourly_power_matrix(site)
+            for site in self._sites]
+        power_matrices = []
+        for lazy in (True, False):
+            data_access = self._make_data_access(3)
+            data_access.set_sampling_interval_minutes(60)
+
+            power_matrices.append(data_access.retrieve(number_of_sites=2,
+                number_of_days_per_site=3, lazy=lazy))
+
+            self.assertEqual(power_matrices[-1].shape, (24, 6))
+        # Each day is a day of the matrix of hourly averages:
+        for column in power_matrices[1].T:
+            self.assertTrue(any(np.any(np.all(
+                hourly_power_matrix == column[:, np.newaxis], axis=0))
+                for hourly_power_matrix in hourly_power_matrices))
+        # Nighttime values are found with the maximum of the chosen days in
+        # the lazy mode, which may move sunrise and sunset by one hour:
+        np.testing.assert_allclose(np.max(power_matrices[0], axis=0),
+            np.max(power_matrices[1], axis=0))
+
+    def test_retrieve_with_quality_thresholds(self):
+
+        # Third whole local day of first site and all of second site missing:
+        for i, row in enumerate(self._rows):
+            if (240 + 288 * 2 <= i < 240 + 288 * 3 or
+                row['site'] == 'SLACA0000002'):
+                row['meas_val_f'] = SENTINEL_VALUE
+        quality_thresholds = QualityThresholds(max_sentinel_fraction=0.1)
+
+        for lazy in [True, False]:
+            data_access = self._make_data_access(13)
+            data_access.set_site_catalog(SiteCatalog(os.path.join(
+                self._temporary_directory.name, 'scored_site_catalog.npz'),
+                score_quality=True))
+
+            actual_data = data_access.retrieve(number_of_sites=2,
+                number_of_days_per_site=20, lazy=lazy,
+                quality_thresholds=quality_thresholds)
+
+            self.assertEqual(actual_data.shape, (288, 40))
+            self.assertTrue(np.all(np.max(actual_data, axis=0) > 0))
+
+    def test_make_day_ranges(self):
+
+        actual_ranges = _make_day_ranges(np.array([10, 11, 12, 15]),
+            -8 * 60 * 60 * 1000)
+
+        eight_hours = 8 * 60 * 60 * 1000
+        self.assertEqual(actual_ranges,
+            [(10 * MILLISECONDS_PER_DAY + eight_hours,
+              13 * MILLISECONDS_PER_DAY + eight_hours),
+             (15 * MILLISECONDS_PER_DAY + eight_hours,
+              16 * MILLISECONDS_PER_DAY + eight_hours)])
+
+    def _make_hourly_power_matrix(self, site):
+        rows = [row for row in self._rows if row['site'] == site]
+        hours = np.array([row['ts'] for row in rows],
+            dtype='datetime64[h]').astype('datetime64[ms]')
+        hours, indices = np.unique(hours, return_inverse=True)
+        values = np.array([row['meas_val_f'] for row in rows])
+        return make_power_matrix(hours,
+            np.bincount(indices, weights=values) / np.bincount(indices),
+            sampling_interval_minutes=60, localize_hours=-8)
+
+    def _make_whole_power_matrix(self, site):
+        rows = [row for row in self._rows if row['site'] == site]
+        return make_power_matrix(
+            np.array([row['ts'] for row in rows], dtype='datetime64[ms]'),
+            np.array([row['meas_val_f'] for row in rows]),
+            localize_hours=-8)
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+from solar_data_pipeline.database.session import SessionManager,\
+    get_session_manager
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+
+@patch('solar_data_pipeline.database.session.connection')
+@patch('solar_data_pipeline.database.session.Cluster')
+class TestSessionManager(unittest.TestCase):
+
+    def test_get_session_connects_once(self, mock_cluster, mock_connection):
+
+        session_manager = SessionManager(['127.0.0.1'])
+        mock_cluster.assert_not_called()
+
+        session_1 = session_manager.get_session()
+        session_2 = session_manager.get_session()
+
+        self.assertIs(session_1, session_2)
+        mock_cluster.assert_called_once()
+        mock_cluster.return_value.connect.assert_called_once_with(
+            'measurements')
+        mock_connection.set_session.assert_called_once_with(session_1)
+
+    def test_get_session_reconnects_after_fork(self, mock_cluster,
+        mock_connection):
+
+        session_manager = SessionManager(['127.0.0.1'])
+        session_manager.get_session()
+
+        with patch('solar_data_pipeline.database.session.os.getpid',
+                   return_value=-1):
+            session_manager.get_session()
+
+        self.assertEqual(mock_cluster.call_count, 2)
+        mock_cluster.return_value.shutdown.assert_not_called()
+
+    def test_close_with_context_manager(self, mock_cluster, mock_connection):
+
+        with SessionManager(['127.0.0.1']) as session_manager:
+            session_manager.get_session()
+
+        mock_cluster.return_value.shutdown.assert_called_once()
+
+@patch.dict('solar_data_pipeline.database.session._session_manager_options',
+    clear=True)
+@patch.dict('solar_data_pipeline.database.session._session_managers',
+    clear=True)
+class TestGetSessionManager(unittest.TestCase):
+
+    def test_data_access_passes_session_options(self):
+
+        data_access = CassandraDataAccess('127.0.0.2',
+            session_options={'local_dc': 'dc1', 'protocol_version': 4})
+
+        session_manager = data_access._get_session_manager()
+
+        self.assertIs(session_manager, get_session_manager('127.0.0.2'))
+        self.assertEqual(session_manager._local_dc, 'dc1')
+        self.assertEqual(session_manager._protocol_version, 4)
+
+    def test_get_session_manager_with_other_options(self):
+
+        get_session_manager('127.0.0.2', local_dc='dc1')
+
+        with self.assertRaises(ValueError):
+            get_session_manager('127.0.0.2', local_dc='dc2')
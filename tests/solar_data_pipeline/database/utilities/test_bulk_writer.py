@@ -0,0 +1,95 @@
+import unittest
+import os
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.database.utilities.bulk_writer import BulkWriter
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager, FakeBatchStatement, to_unix_timestamp
+
+class TestBulkWriter(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            self._power_matrix = np.loadtxt(file, delimiter=',')[:, :3]
+
+    def _make_bulk_writer(self, session, retries=2):
+        bulk_writer = BulkWriter(session, rows_per_batch=50,
+            batches_per_window=4, fetch_engine=ConcurrentFetchEngine(session,
+            max_in_flight=2, retries=retries))
+        bulk_writer._set_batch_factory(FakeBatchStatement)
+        return bulk_writer
+
+    def test_write_power_matrix_in_batches(self):
+
+        session = FakeSession([])
+        power_matrix = self._power_matrix.copy()
+        power_matrix[0, 0] = np.nan
+
+        number_of_rows = self._make_bulk_writer(session).write_power_matrix(
+            'SLACA0000001', power_matrix, date(2019, 1, 2), sensor='sensor_1')
+
+        self.assertEqual(number_of_rows, 288 * 3 - 1)
+        self.assertEqual(len(session.rows), 288 * 3 - 1)
+        # One batch of 50 rows per execution:
+        self.assertEqual(session.number_of_executions,
+            int(np.ceil((288 * 3 - 1) / 50)))
+        self.assertLessEqual(session.max_in_flight, 2)
+        rows = sorted(session.rows, key=lambda row: row['ts'])
+        # Midnight of 2019-01-02 in PST is skipped as NaN:
+        self.assertEqual(rows[0]['ts'], datetime(2019, 1, 2, 8, 5))
+        self.assertEqual(rows[0]['sensor'], 'sensor_1')
+        np.testing.assert_array_equal([row['meas_val_f'] for row in rows],
+            power_matrix.ravel(order='F')[1:])
+
+    def test_failed_batches_are_retried(self):
+
+        session = FakeSession([], failures=2)
+
+        self._make_bulk_writer(session).write_columns('SLACA0000001',
+            'ac_power', np.arange(120, dtype=np.int64) * 300000,
+            np.arange(120.0))
+
+        self.assertEqual(len(session.rows), 120)
+        self.assertEqual(session.number_of_executions, 5)
+
+    def test_write_data_frame(self):
+
+        session = FakeSession([])
+        data_frame = pd.DataFrame({
+            'ts': pd.date_range('2019-01-01 08:00', periods=3, freq='5min'),
+            'meas_val_f': [1.0, np.nan, 3.0],
+            'sensor': ['sensor_1', 'sensor_2', 'sensor_1']})
+
+        self._make_bulk_writer(session).write_data_frame('SLACA0000001',
+            data_frame, sensor_key='sensor')
+
+        rows = sorted(session.rows, key=lambda row: row['ts'])
+        self.assertEqual([to_unix_timestamp(row['ts']) for row in rows],
+            [to_unix_timestamp(datetime(2019, 1, 1, 8, 5 * i))
+             for i in range(3)])
+        self.assertEqual([row['meas_val_f'] for row in rows], [1.0, None, 3.0])
+        self.assertEqual([row['sensor'] for row in rows],
+            ['sensor_1', 'sensor_2', 'sensor_1'])
+
+    def test_written_power_matrix_is_scanned_by_data_access(self):
+
+        session = FakeSession([])
+        data_access = CassandraDataAccess('127.0.0.1', fetch_size=100)
+        data_access._set_session_manager(FakeSessionManager(session))
+        data_access._set_bulk_writer(self._make_bulk_writer(session))
+
+        data_access.write_power_matrix('SLACA0000001', self._power_matrix,
+            date(2019, 1, 2))
+        measurement_columns = data_access._query_power_for_given_site_helper(
+            'SLACA0000001')
+
+        np.testing.assert_array_equal(measurement_columns.meas_val_f,
+            self._power_matrix.ravel(order='F'))
+        self.assertEqual(measurement_columns.ts[0],
+            to_unix_timestamp(datetime(2019, 1, 2, 8)))
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from solar_data_pipeline.database.utilities.columnar import\
+    ColumnBuffer, DownsamplingBuffer, columnar_factory
+from solar_data_pipeline.utilities.power_matrix import SENTINEL_VALUE
+
+class TestColumnar(unittest.TestCase):
+
+    def test_columnar_factory(self):
+
+        page = columnar_factory(('sensor', 'ts_ms', 'meas_val_f'),
+            [('a', 1, 1.5), ('b', 2, None)])
+
+        np.testing.assert_array_equal(page['sensor'], ['a', 'b'])
+        np.testing.assert_array_equal(page['ts_ms'], [1, 2])
+
+    def test_column_buffer_grows(self):
+
+        buffer = ColumnBuffer({'ts_ms': np.int64, 'meas_val_f': np.float64},
+            capacity=1)
+        buffer.append_page({'ts_ms': np.arange(3),
+            'meas_val_f': np.array([0.0, 1.0, None])})
+        buffer.append_page({'ts_ms': np.ma.array(np.arange(3, 10)),
+            'meas_val_f': np.ma.array(np.arange(3, 10, dtype='>f4'),
+                mask=[True] + [False] * 6)})
+
+        self.assertEqual(len(buffer), 10)
+        columns = buffer.columns()
+        np.testing.assert_array_equal(columns['ts_ms'], np.arange(10))
+        np.testing.assert_array_equal(columns['meas_val_f'],
+            [0, 1, np.nan, np.nan, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(columns['meas_val_f'].dtype, np.float64)
+
+    def test_downsampling_buffer_averages_buckets_across_pages(self):
+
+        dtypes = {'sensor': object, 'ts_ms': np.int64,
+            'meas_val_f': np.float32}
+        buffer = DownsamplingBuffer(dtypes, 15, capacity=1)
+        five_minutes = 5 * 60 * 1000
+        # Two sensors of 5-minute samples over 30 minutes, split in pages
+        # within the first bucket:
+        ts = np.repeat(np.arange(6) * five_minutes, 2)
+        sensor = np.array(['b', 'a'] * 6, dtype=object)
+        values = np.arange(12, dtype=float)
+        values[[4, 11]] = [np.nan, SENTINEL_VALUE]
+        buffer.append_page({'sensor': sensor[:3], 'ts_ms': ts[:3],
+            'meas_val_f': values[:3]})
+        other_buffer = DownsamplingBuffer(dtypes, 15)
+        other_buffer.append_page({'sensor': sensor[3:], 'ts_ms': ts[3:],
+            'meas_val_f': values[3:]})
+        buffer.extend(other_buffer)
+
+        columns = buffer.columns()
+
+        np.testing.assert_array_equal(columns['ts_ms'],
+            [0, 0, 3 * five_minutes, 3 * five_minutes])
+        np.testing.assert_array_equal(columns['sensor'], ['a', 'b'] * 2)
+        np.testing.assert_array_equal(columns['meas_val_f'],
+            [(1 + 3 + 5) / 3, (0 + 2) / 2, (7 + 9) / 2, (6 + 8 + 10) / 3])
+        self.assertEqual(columns['meas_val_f'].dtype, np.float32)
+        with self.assertRaises(ValueError):
+            DownsamplingBuffer(dtypes, 7)
@@ -0,0 +1,35 @@
+import unittest
+import os
+import numpy as np
+from solar_data_pipeline.database.utilities.columnar import MeasurementColumns
+from solar_data_pipeline.database.utilities.data_transformation import\
+    AllDataTransformation
+
+class TestAllDataTransformation(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        random_state = np.random.RandomState(0)
+        values = np.concatenate([np.full(100, 3.0),
+            power_signals.ravel(order='F'), np.full(100, 3.0)])
+        values[random_state.rand(len(values)) < 0.05] = -999999.0
+        # 2018-01-01 08:00 UTC is midnight in PST:
+        ts = (1514793600000 - 100 * 300000 +
+            np.arange(len(values)) * 300000)
+        is_kept = random_state.rand(len(values)) > 0.02
+        self._measurement_columns = MeasurementColumns('site', 'ac_power',
+            np.full(np.count_nonzero(is_kept), 'sensor', dtype=object),
+            ts[is_kept], values[is_kept])
+
+    def test_fast_path_matches_pandas_path(self):
+
+        expected_power_matrix = AllDataTransformation(
+            fast_path=False).transform(self._measurement_columns)
+        actual_power_matrix = AllDataTransformation(
+            fast_path=True).transform(self._measurement_columns)
+
+        np.testing.assert_allclose(actual_power_matrix, expected_power_matrix,
+            atol=1e-9)
@@ -0,0 +1,59 @@
+import unittest
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine, FetchRequest
+from tests.solar_data_pipeline.database.fake_session import FakeSession
+
+CQL = "select site, ts from measurement_raw where site = ?"
+
+class RowBuffer:
+
+    def __init__(self):
+        self.rows = []
+
+    def append_page(self, rows):
+        self.rows.extend(rows)
+
+    def clear(self):
+        self.rows = []
+
+class TestConcurrentFetchEngine(unittest.TestCase):
+
+    def setUp(self):
+        self._rows = [{"site": "SITE{:03}".format(i % 20), "ts": i}
+            for i in range(1000)]
+
+    def test_fetch_in_order_with_bounded_concurrency(self):
+
+        session = FakeSession(self._rows, page_size=7)
+        engine = ConcurrentFetchEngine(session, max_in_flight=4)
+
+        sites = ["SITE{:03}".format(i) for i in reversed(range(20))]
+        buffers = engine.fetch(self._make_requests(session, sites))
+
+        self.assertEqual([buffer.rows[0].site for buffer in buffers], sites)
+        self.assertEqual([len(buffer.rows) for buffer in buffers], [50] * 20)
+        self.assertLessEqual(session.max_in_flight, 4)
+        self.assertEqual(session.in_flight, 0)
+
+    def test_fetch_retries_failed_query(self):
+
+        session = FakeSession(self._rows, failures=2)
+        engine = ConcurrentFetchEngine(session, max_in_flight=1, retries=2)
+
+        buffers = engine.fetch(self._make_requests(session, ["SITE001"]))
+
+        self.assertEqual(len(buffers[0].rows), 50)
+        self.assertEqual(session.number_of_executions, 3)
+
+    def test_fetch_raises_when_retries_are_exhausted(self):
+
+        session = FakeSession(self._rows, failures=3)
+        engine = ConcurrentFetchEngine(session, retries=2)
+
+        with self.assertRaises(RuntimeError):
+            engine.fetch(self._make_requests(session, ["SITE001"]))
+
+    def _make_requests(self, session, sites):
+        statement = session.prepare(CQL)
+        return [FetchRequest(statement.bind((site,)), RowBuffer())
+            for site in sites]
@@ -0,0 +1,127 @@
+import unittest
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.utilities.paged_scanner import\
+    PagedScanner
+from solar_data_pipeline.database.utilities.fetch_engine import\
+    ConcurrentFetchEngine
+from tests.solar_data_pipeline.database.fake_session import FakeSession
+
+class TestPagedScanner(unittest.TestCase):
+
+    def setUp(self):
+        self._start_time = datetime(2019, 1, 1, 0, 0, 0)
+        self._rows = (self._make_rows("SLACA0000001", 288 * 3) +
+            self._make_rows("SLACA0000002", 288 * 2))
+
+    def test_scan(self):
+
+        session = FakeSession(self._rows)
+        scanner = PagedScanner(session, fetch_size=100,
+            window=timedelta(days=1))
+
+        actual_data = scanner.scan("SLACA0000001")
+
+        self.assertEqual(len(actual_data), 288 * 3)
+        np.testing.assert_array_equal(actual_data.meas_val_f,
+            np.arange(288 * 3, dtype=float))
+        np.testing.assert_array_equal(np.diff(actual_data.ts),
+            [5 * 60 * 1000] * (288 * 3 - 1))
+        self.assertEqual(actual_data.ts.dtype, np.int64)
+
+    def test_scan_with_time_range(self):
+
+        session = FakeSession(self._rows)
+        scanner = PagedScanner(session, fetch_size=50,
+            window=timedelta(hours=7))
+
+        actual_data = scanner.scan("SLACA0000001",
+            start_time=self._start_time + timedelta(days=1),
+            end_time=self._start_time + timedelta(days=1, hours=23,
+                                                  minutes=55))
+
+        np.testing.assert_array_equal(actual_data.meas_val_f,
+            np.arange(288, 288 * 2, dtype=float))
+
+    def test_scan_sites(self):
+
+        session = FakeSession(self._rows)
+        fetch_engine = ConcurrentFetchEngine(session, max_in_flight=3)
+        scanner = PagedScanner(session, fetch_size=100,
+            window=timedelta(hours=12), fetch_engine=fetch_engine)
+
+        actual_data = scanner.scan_sites(
+            ["SLACA0000002", "SLACA9999999", "SLACA0000001"])
+
+        self.assertEqual([len(data_array) for data_array in actual_data],
+            [288 * 2, 0, 288 * 3])
+        self.assertEqual(actual_data[0].site, "SLACA0000002")
+        self.assertLessEqual(session.max_in_flight, 3)
+
+    def test_scan_with_sampling_interval(self):
+
+        session = FakeSession(self._rows)
+        # Windows are not aligned to hours, so that buckets span windows:
+        scanner = PagedScanner(session, fetch_size=7,
+            window=timedelta(minutes=100), sampling_interval_minutes=60)
+
+        actual_data = scanner.scan("SLACA0000001")
+
+        self.assertEqual(len(actual_data), 24 * 3)
+        np.testing.assert_array_equal(np.diff(actual_data.ts),
+            [60 * 60 * 1000] * (24 * 3 - 1))
+        np.testing.assert_array_equal(actual_data.meas_val_f,
+            np.arange(288 * 3, dtype=float).reshape(-1, 12).mean(axis=1))
+
+    def test_scan_measurements_in_one_pass(self):
+
+        rows = self._make_rows("SLACA0000001", 288) + [dict(row,
+            meas_name="irradiance", meas_val_f=-row["meas_val_f"])
+            for row in self._make_rows("SLACA0000001", 288 * 2)]
+        session = FakeSession(rows)
+        scanner = PagedScanner(session, fetch_size=1000,
+            window=timedelta(days=1))
+
+        actual_data = scanner.scan_measurements(["SLACA0000001"],
+            ["ac_power", "irradiance"])[0]
+
+        # Four queries of time bounds, and one query per window:
+        self.assertEqual(session.number_of_executions, 4 + 2)
+        is_ac_power = actual_data.meas_name == "ac_power"
+        np.testing.assert_array_equal(actual_data.meas_val_f[is_ac_power],
+            np.arange(288, dtype=float))
+        np.testing.assert_array_equal(actual_data.meas_val_f[~is_ac_power],
+            -np.arange(288 * 2, dtype=float))
+
+    def test_scan_partitions(self):
+
+        session = FakeSession(self._rows)
+        scanner = PagedScanner(session, fetch_size=100)
+
+        actual_data = scanner.scan_partitions(["SLACA0000001",
+            "SLACA0000002"])
+
+        self.assertEqual([len(data_array) for data_array in actual_data],
+            [288 * 3, 288 * 2])
+        self.assertEqual(session.number_of_executions, 2)
+
+    def test_to_data_frame(self):
+
+        self._rows[1]["meas_val_f"] = None
+        session = FakeSession(self._rows)
+        scanner = PagedScanner(session, fetch_size=100)
+
+        actual_data = scanner.scan_partitions(["SLACA0000001"])[0]
+        data_frame = actual_data.to_data_frame()
+
+        self.assertEqual(list(data_frame.columns),
+            ['site', 'meas_name', 'sensor', 'ts', 'meas_val_f'])
+        self.assertEqual(data_frame['ts'].iloc[1],
+            np.datetime64(self._start_time + timedelta(minutes=5)))
+        self.assertTrue(np.isnan(data_frame['meas_val_f'].iloc[1]))
+
+    def _make_rows(self, site, number_of_rows):
+        return [{"site": site, "meas_name": "ac_power", "sensor": "sensor_1",
+            "ts": self._start_time + timedelta(minutes=5 * i),
+            "meas_val_f": float(i)} for i in range(number_of_rows)]
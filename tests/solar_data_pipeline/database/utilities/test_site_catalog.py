@@ -0,0 +1,135 @@
+import unittest
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+from solar_data_pipeline.database.cassandra import CassandraDataAccess
+from solar_data_pipeline.database.utilities.site_catalog import SiteCatalog
+from solar_data_pipeline.utilities.quality import QualityThresholds
+from tests.solar_data_pipeline.database.fake_session import FakeSession,\
+    FakeSessionManager, to_unix_timestamp
+
+Geopoint = namedtuple('Geopoint', ['latitude', 'longitude'])
+
+class TestSiteCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self._start_time = datetime(2019, 1, 1, 0, 0, 0)
+        rows = []
+        for i, site in enumerate(['SLACA0000002', 'SLACA0000001']):
+            for meas_name in ['ac_power', 'dc_power']:
+                rows.extend([{'site': site, 'meas_name': meas_name,
+                    'sensor': 'sensor_1',
+                    'ts': self._start_time + timedelta(minutes=5 * j),
+                    'meas_val_f': 1.0,
+                    'lat_lon': Geopoint(37.0 + i, -122.0)}
+                    for j in range(10 * (i + 1))])
+        rows.append({'site': 'SLACA0000003', 'meas_name': 'irradiance',
+            'sensor': 'sensor_1', 'ts': self._start_time, 'meas_val_f': 1.0,
+            'lat_lon': None})
+        self._session = FakeSession(rows)
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._file_path = os.path.join(self._temporary_directory.name,
+            'catalog', 'site_catalog.npz')
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def test_refresh(self):
+
+        site_catalog = SiteCatalog(self._file_path)
+        site_catalog.refresh(self._session)
+
+        np.testing.assert_array_equal(site_catalog.get_sites(),
+            ['SLACA0000001', 'SLACA0000002', 'SLACA0000003'])
+        np.testing.assert_array_equal(site_catalog.get_sites(
+            meas_name='ac_power'), ['SLACA0000001', 'SLACA0000002'])
+        self.assertEqual(site_catalog.get_entry('SLACA0000002'), {
+            'site': 'SLACA0000002',
+            'first_timestamp': to_unix_timestamp(self._start_time),
+            'last_timestamp': to_unix_timestamp(self._start_time +
+                timedelta(minutes=5 * 9)),
+            'number_of_rows': 10,
+            'sampling_interval_minutes': 5.0,
+            'meas_names': ['ac_power', 'dc_power'],
+            'latitude': 37.0,
+            'longitude': -122.0})
+        entry = site_catalog.get_entry('SLACA0000003')
+        self.assertIsNone(entry['first_timestamp'])
+        self.assertEqual(entry['meas_names'], ['irradiance'])
+        self.assertTrue(np.isnan(entry['latitude']))
+        self.assertIsNone(site_catalog.get_entry('SLACA0000004'))
+
+    def test_load_saved_catalog(self):
+
+        SiteCatalog(self._file_path).refresh(self._session)
+
+        site_catalog = SiteCatalog(self._file_path)
+
+        self.assertFalse(site_catalog.is_stale())
+        np.testing.assert_array_equal(site_catalog.find_sites('SLACA0000001'),
+            ['SLACA0000001'])
+        self.assertEqual(len(site_catalog.find_sites('SLACA0000004')), 0)
+        self.assertEqual(site_catalog.get_time_bounds(
+            ['SLACA0000003', 'SLACA0000001', 'SLACA0000004']),
+            [(None, None),
+             (to_unix_timestamp(self._start_time),
+              to_unix_timestamp(self._start_time +
+                timedelta(minutes=5 * 19))),
+             (None, None)])
+
+    def test_refresh_with_quality_scores(self):
+
+        self._session.rows[0]['meas_val_f'] = -999999.0
+
+        SiteCatalog(self._file_path, score_quality=True).refresh(
+            self._session)
+        site_catalog = SiteCatalog(self._file_path)
+
+        # 2019-01-01 00:00 UTC is on 2018-12-31 in PST:
+        day = (to_unix_timestamp(self._start_time) // 86400000) - 1
+        scores = site_catalog.get_day_scores('SLACA0000001')
+        np.testing.assert_array_equal(scores['day'], [day])
+        np.testing.assert_array_almost_equal(scores['completeness'],
+            [20 / 288])
+        self.assertEqual(len(site_catalog.get_days('SLACA0000003')), 0)
+        self.assertEqual(site_catalog.get_entry('SLACA0000002')[
+            'sentinel_fraction'], 0.1)
+        np.testing.assert_array_equal(site_catalog.get_sites(
+            quality_thresholds=QualityThresholds(max_sentinel_fraction=0.0)),
+            ['SLACA0000001'])
+
+    def test_quality_scores_require_scored_catalog(self):
+
+        site_catalog = SiteCatalog(self._file_path)
+        site_catalog.refresh(self._session)
+
+        with self.assertRaises(ValueError):
+            site_catalog.get_days('SLACA0000001')
+
+    def test_is_stale(self):
+
+        self.assertTrue(SiteCatalog(self._file_path).is_stale())
+
+        SiteCatalog(self._file_path).refresh(self._session)
+
+        self.assertFalse(SiteCatalog(self._file_path).is_stale())
+        self.assertTrue(SiteCatalog(self._file_path,
+            max_age=timedelta(seconds=-1)).is_stale())
+
+    def test_cassandra_data_access_lists_sites_with_catalog(self):
+
+        data_access = CassandraDataAccess('127.0.0.1')
+        data_access._set_session_manager(FakeSessionManager(self._session))
+        data_access.set_site_catalog(SiteCatalog(self._file_path))
+
+        np.testing.assert_array_equal(data_access.get_sites(),
+            ['SLACA0000001', 'SLACA0000002', 'SLACA0000003'])
+        number_of_executions = self._session.number_of_executions
+        np.testing.assert_array_equal(data_access.find_sites('SLACA0000002'),
+            ['SLACA0000002'])
+        # The catalog is not built again while it is fresh:
+        self.assertEqual(self._session.number_of_executions,
+            number_of_executions)
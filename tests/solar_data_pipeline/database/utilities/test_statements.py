@@ -0,0 +1,22 @@
+import unittest
+from unittest.mock import Mock
+from solar_data_pipeline.database.utilities.statements import\
+    get_prepared_statement
+
+CQL = "select ts from measurement_raw where site = ? and meas_name = ?"
+
+class TestStatements(unittest.TestCase):
+
+    def test_get_prepared_statement_prepares_once_per_session(self):
+
+        session_1 = Mock()
+        session_2 = Mock()
+
+        statement_1 = get_prepared_statement(session_1, CQL)
+        statement_2 = get_prepared_statement(session_1, CQL)
+        statement_3 = get_prepared_statement(session_2, CQL)
+
+        self.assertIs(statement_1, statement_2)
+        self.assertIsNot(statement_1, statement_3)
+        session_1.prepare.assert_called_once_with(CQL)
+        session_2.prepare.assert_called_once_with(CQL)
@@ -1,7 +1,35 @@
 import unittest
 import os
+import shutil
+import tempfile
 import numpy as np
 from solar_data_pipeline.file.csv import CsvAccess
+from solar_data_pipeline.file.utilities.url_resolver import UrlResolver,\
+    LocalDirectoryHandler
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix,\
+    zero_nighttime_values, interpolate_missing_values, PowerMatrixBuilder
+
+class PowerMatrixTransformation:
+    """
+    Transformation without fix_time_shifts of solar-data-tools, for testing.
+    """
+
+    def transform(self, data_array, datetimekey='Date-Time',
+        ac_power_key='ac_power'):
+        return make_power_matrix(data_array.ts, data_array.meas_val_f,
+            sensors=data_array.sensor)
+
+class PagedPowerMatrixTransformation(PowerMatrixTransformation):
+    """
+    Transformation of chunks as they are read, for testing.
+    """
+
+    def transform_pages(self, pages, datetimekey='Date-Time',
+        ac_power_key='ac_power'):
+        builder = PowerMatrixBuilder()
+        for page in pages:
+            builder.append(page.ts, page.meas_val_f)
+        return builder.power_matrix()
 
 class TestCsvAccess(unittest.TestCase):
 
@@ -11,17 +39,61 @@ class TestCsvAccess(unittest.TestCase):
             "../../fixtures/one_year_power_signals_1.csv"))
         with open(input_power_signals_file_path) as file:
             self._power_signals = np.loadtxt(file, delimiter=',')
+        self._file_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__),
+            "../../fixtures/three_days_pvo_style_test_data.csv"))
+
+        # The fixture holds the first two days of the power signals between two
+        # half days, with zero at night. As make_2d, the transformation sets
+        # values below 0.5% of the maximum to missing, and interpolates the
+        # missing values next to sunrise and sunset, which changes four of
+        # these values:
+        self._expected_data = self._power_signals[:, :2].copy()
+        zero_nighttime_values(self._expected_data)
+        interpolate_missing_values(self._expected_data)
 
     def test_retrieve(self):
 
         # Note: In the production environment, this URL would start with "s3://"
-        file_url = "file://" + os.path.abspath(
-            os.path.join(os.path.dirname(__file__),
-            "../../fixtures/one_year_pvo_style_test_data.csv"))
+        file_url = "file://" + self._file_path
 
         access = CsvAccess(file_url)
         actual_data = access.retrieve()
 
-        expected_data = self._power_signals[:, :2]
+        np.testing.assert_array_equal(actual_data, self._expected_data)
+
+    def test_retrieve_in_chunks(self):
+
+        for data_transformation in [PowerMatrixTransformation(),
+            PagedPowerMatrixTransformation()]:
+            access = CsvAccess("file://" + self._file_path, chunk_size=100)
+            access.set_data_transformation(data_transformation)
+            actual_data = access.retrieve()
+
+            np.testing.assert_array_equal(actual_data, self._expected_data)
+
+    def test_retrieve_directory_from_s3_stand_in(self):
+
+        with tempfile.TemporaryDirectory() as root_directory:
+            directory = os.path.join(root_directory, "bucket", "PVOutput")
+            os.makedirs(directory)
+            for file_name in ["1001.csv", "1002.csv"]:
+                shutil.copy(self._file_path, os.path.join(directory,
+                    file_name))
+            url_resolver = UrlResolver()
+            url_resolver.register('s3', LocalDirectoryHandler(root_directory))
+
+            access = CsvAccess("s3://bucket/PVOutput/")
+            access.set_url_resolver(url_resolver)
+            access.set_data_transformation(PowerMatrixTransformation())
+            actual_data = access.retrieve()
+
+        np.testing.assert_array_equal(actual_data,
+            np.hstack([self._expected_data] * 2))
+
+    def test_retrieve_with_unknown_scheme(self):
+
+        access = CsvAccess("s3://bucket/PVOutput/1001.csv")
 
-        np.testing.assert_array_equal(actual_data, expected_data)
+        with self.assertRaises(ValueError):
+            access.retrieve()
@@ -5,6 +5,9 @@ import numpy as np
 from solar_data_pipeline.data_retrieval import DataRetrieval
 from solar_data_pipeline.database.cassandra import CassandraDataAccess
 from solar_data_pipeline.file.csv import CsvAccess
+from solar_data_pipeline.utilities.instrumentation import Instrumentation,\
+    JsonReportExporter
+from solar_data_pipeline.utilities.sampling import SampleSpecification
 
 class TestDataRetrieval(unittest.TestCase):
 
@@ -89,3 +92,73 @@ class TestDataRetrieval(unittest.TestCase):
         expected_list = ['cassandra'] * 2 + ['file'] * 2
 
         np.testing.assert_array_equal(actual_list, expected_list)
+
+    def test_get_is_reproducible_with_seed(self):
+
+        mock_cassandra_data_access = Mock(spec=CassandraDataAccess)
+        mock_cassandra_data_access.retrieve.return_value =\
+            self._power_signals[:, :100]
+        mock_csv_access = Mock(spec=CsvAccess)
+        mock_csv_access.retrieve.return_value =\
+            self._power_signals[:, 100:200]
+
+        actual_data = []
+        for _ in range(2):
+            data_retrieval = DataRetrieval(random_generator=3)
+            data_retrieval._set_cassandra_data_access(
+                mock_cassandra_data_access)
+            data_retrieval._set_csv_access(mock_csv_access)
+            actual_data.append(data_retrieval.get(
+                partition_ratio={"cassandra": 0.5, "file": 0.5}))
+
+        np.testing.assert_array_equal(actual_data[0], actual_data[1])
+
+    def test_get_sample_specification(self):
+
+        mock_cassandra_data_access = Mock(spec=CassandraDataAccess)
+        mock_cassandra_data_access.retrieve.return_value =\
+            self._power_signals[:, :100]
+        mock_csv_access = Mock(spec=CsvAccess)
+        mock_csv_access.retrieve.return_value =\
+            self._power_signals[:, 100:200]
+        sample_specification = SampleSpecification(3, sites=['site_1'],
+            partition_ratio={"cassandra": 0.5, "file": 0.5})
+
+        actual_data = []
+        for seed in range(2):
+            # Random generators of data retrieval objects are not used:
+            data_retrieval = DataRetrieval(random_generator=seed)
+            data_retrieval._set_cassandra_data_access(
+                mock_cassandra_data_access)
+            data_retrieval._set_csv_access(mock_csv_access)
+            actual_data.append(data_retrieval.get(
+                sample_specification=sample_specification))
+
+        np.testing.assert_array_equal(actual_data[0], actual_data[1])
+        self.assertEqual(actual_data[0].shape, (288, 100))
+        _, keyword_arguments = mock_cassandra_data_access.retrieve.call_args
+        self.assertEqual(keyword_arguments['sites'], ['site_1'])
+
+    def test_get_records_stages(self):
+
+        mock_cassandra_data_access = Mock(spec=CassandraDataAccess)
+        mock_cassandra_data_access.retrieve.return_value =\
+            self._power_signals[:, :10]
+        mock_csv_access = Mock(spec=CsvAccess)
+        mock_csv_access.retrieve.return_value =\
+            self._power_signals[:, 10:20]
+        json_report_exporter = JsonReportExporter()
+
+        data_retrieval = DataRetrieval(random_generator=0,
+            instrumentation=Instrumentation(exporters=[json_report_exporter]))
+        data_retrieval._set_cassandra_data_access(mock_cassandra_data_access)
+        data_retrieval._set_csv_access(mock_csv_access)
+        data_retrieval.get(partition_ratio={"cassandra": 0.5, "file": 0.5})
+
+        stages = json_report_exporter.get_report()['stages']
+        self.assertEqual(set(stages), {'data_retrieval.get',
+            'data_retrieval.cassandra', 'data_retrieval.file',
+            'data_retrieval.sample'})
+        self.assertEqual(stages['data_retrieval.cassandra']['rows'], 10)
+        self.assertEqual(stages['data_retrieval.get']['bytes'],
+            288 * 10 * 8)
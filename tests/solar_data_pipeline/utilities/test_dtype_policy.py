@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from solar_data_pipeline.utilities.dtype_policy import DtypePolicy,\
+    get_dtype_policy, INT16_NAN_SENTINEL
+
+class TestDtypePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self._power_matrix = np.array([[0.0, 1.234], [np.nan, 5000.0]])
+
+    def test_int16_keeps_missing_values_as_sentinel(self):
+
+        dtype_policy = DtypePolicy(np.int16, scale=0.1)
+
+        encoded_power_matrix = dtype_policy.encode(self._power_matrix)
+        decoded_power_matrix = dtype_policy.decode(encoded_power_matrix)
+
+        self.assertEqual(encoded_power_matrix.dtype, np.int16)
+        self.assertEqual(encoded_power_matrix[1, 0], INT16_NAN_SENTINEL)
+        # 5000 is beyond 32767 counts of 0.1:
+        np.testing.assert_array_equal(encoded_power_matrix,
+            [[0, 12], [INT16_NAN_SENTINEL, 32767]])
+        self.assertEqual(decoded_power_matrix.dtype, np.float32)
+        np.testing.assert_allclose(decoded_power_matrix,
+            [[0.0, 1.2], [np.nan, 3276.7]], rtol=1e-6)
+
+    def test_float32(self):
+
+        dtype_policy = get_dtype_policy(np.float32)
+
+        encoded_power_matrix = dtype_policy.encode(self._power_matrix)
+
+        self.assertEqual(encoded_power_matrix.dtype, np.float32)
+        self.assertIs(dtype_policy.encode(encoded_power_matrix),
+            encoded_power_matrix)
+        np.testing.assert_allclose(dtype_policy.decode(encoded_power_matrix),
+            self._power_matrix, rtol=1e-6)
+        self.assertEqual(dtype_policy.empty().shape, (288, 0))
+
+    def test_get_dtype_policy(self):
+
+        self.assertEqual(get_dtype_policy().dtype, np.float64)
+        self.assertEqual(get_dtype_policy().get_key(), 'float64')
+        self.assertEqual(DtypePolicy('int16', scale=0.5).get_key(),
+            'int16*0.5')
+        with self.assertRaises(ValueError):
+            DtypePolicy(np.int32)
@@ -0,0 +1,113 @@
+import unittest
+import tempfile
+from datetime import date
+import numpy as np
+from solar_data_pipeline.utilities.fleet_store import FleetStore
+from solar_data_pipeline.utilities.dtype_policy import DtypePolicy,\
+    INT16_NAN_SENTINEL
+
+class TestFleetStore(unittest.TestCase):
+
+    def setUp(self):
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._power_matrix = np.arange(288 * 5, dtype=float).reshape(288, 5)
+        self._fleet_store = FleetStore(self._temporary_directory.name)
+        self._fleet_store.create(['site_1', 'site_2', 'site_3'],
+            date(2019, 1, 1), 10)
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def test_get_power_matrix_is_view_of_array(self):
+
+        self._fleet_store.write('site_2', self._power_matrix,
+            date(2018, 12, 30))
+
+        power_matrix = self._fleet_store.get_power_matrix('site_2')
+        # Days before the first date of the store are not written:
+        np.testing.assert_array_equal(power_matrix,
+            self._power_matrix[:, 2:])
+        self.assertTrue(np.shares_memory(power_matrix,
+            self._fleet_store.get_array()))
+        self.assertFalse(power_matrix.flags.writeable)
+        np.testing.assert_array_equal(self._fleet_store.get_power_matrix(
+            'site_2', start_date=date(2019, 1, 2), end_date=date(2019, 1, 2)),
+            self._power_matrix[:, 3:4])
+        self.assertTrue(np.all(np.isnan(self._fleet_store.get_power_matrix(
+            'site_1', start_date=date(2019, 1, 1),
+            end_date=date(2019, 1, 10)))))
+
+    def test_dates_outside_of_store_are_rejected(self):
+
+        with self.assertRaises(ValueError):
+            self._fleet_store.get_power_matrix('site_1',
+                start_date=date(2018, 12, 31))
+        with self.assertRaises(ValueError):
+            self._fleet_store.get_power_matrix('site_4')
+
+    def test_sample_written_days(self):
+
+        self._fleet_store.write('site_1', self._power_matrix,
+            date(2019, 1, 1))
+        self._fleet_store.write('site_3', self._power_matrix + 10000,
+            date(2019, 1, 6))
+
+        sampled_power_matrix = self._fleet_store.sample(4,
+            random_generator=0)
+
+        self.assertEqual(sampled_power_matrix.shape, (288, 8))
+        # Each sampled day is a day written for its site:
+        for column in range(4):
+            self.assertIn(sampled_power_matrix[0, column],
+                self._power_matrix[0])
+            self.assertIn(sampled_power_matrix[0, 4 + column],
+                self._power_matrix[0] + 10000)
+        np.testing.assert_array_equal(sampled_power_matrix,
+            self._fleet_store.sample(4, random_generator=0))
+
+    def test_reader_reads_days_written_by_another_writer(self):
+
+        reader = FleetStore(self._temporary_directory.name)
+        self.assertEqual(reader.get_sites(), ['site_1', 'site_2', 'site_3'])
+
+        self._fleet_store.write('site_3', self._power_matrix,
+            date(2019, 1, 1))
+        reader.refresh()
+
+        np.testing.assert_array_equal(reader.get_power_matrix('site_3'),
+            self._power_matrix)
+
+    def test_writes_in_chunks_keep_written_days(self):
+
+        self._fleet_store.write('site_1', self._power_matrix[:, :2],
+            date(2019, 1, 1))
+        self._fleet_store.write('site_1', self._power_matrix[:, 2:],
+            date(2019, 1, 3))
+
+        np.testing.assert_array_equal(
+            self._fleet_store.get_power_matrix('site_1'), self._power_matrix)
+
+    def test_int16_store(self):
+
+        self._fleet_store.create(['site_1', 'site_2'], date(2019, 1, 1), 10,
+            dtype=DtypePolicy(np.int16, scale=0.5))
+        self._fleet_store.write('site_1', self._power_matrix / 100,
+            date(2019, 1, 1))
+
+        reader = FleetStore(self._temporary_directory.name)
+        dtype_policy = reader.get_dtype_policy()
+        self.assertEqual(reader.get_array().dtype, np.int16)
+        self.assertEqual(dtype_policy.get_key(), 'int16*0.5')
+        np.testing.assert_allclose(dtype_policy.decode(
+            reader.get_power_matrix('site_1')), self._power_matrix / 100,
+            atol=0.25)
+        np.testing.assert_array_equal(reader.get_array()[1],
+            INT16_NAN_SENTINEL)
+        # Sampled days are decoded:
+        sampled_power_matrix = reader.sample(3, sites=['site_1'],
+            random_generator=0)
+        self.assertEqual(sampled_power_matrix.dtype, dtype_policy.value_dtype)
+        for column in range(3):
+            self.assertTrue(np.any(np.all(np.abs(
+                sampled_power_matrix[:, [column]] -
+                self._power_matrix / 100) <= 0.25, axis=0)))
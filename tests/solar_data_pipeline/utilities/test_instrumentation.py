@@ -0,0 +1,115 @@
+import unittest
+import json
+import os
+import tempfile
+import tracemalloc
+import numpy as np
+from solar_data_pipeline.database.utilities.columnar import\
+    MeasurementColumns
+from solar_data_pipeline.utilities.instrumentation import Instrumentation,\
+    LoggingExporter, JsonReportExporter, OtlpJsonExporter
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_nested_spans_record_rows_and_bytes(self):
+
+        spans = []
+        instrumentation = Instrumentation(exporters=[spans.append])
+        measurement_columns = MeasurementColumns('site_1', 'ac_power',
+            np.zeros(10, dtype=np.int64), np.arange(10, dtype=np.int64),
+            np.ones(10))
+
+        with instrumentation.span('retrieve') as outer_span:
+            with instrumentation.span('fetch', site='site_1') as span:
+                span.add_data([measurement_columns])
+            outer_span.add_data(np.zeros((288, 3)))
+
+        fetch_span, retrieve_span = spans
+        self.assertEqual(fetch_span.name, 'fetch')
+        self.assertEqual(fetch_span.rows, 10)
+        self.assertEqual(fetch_span.bytes, 240)
+        self.assertEqual(fetch_span.attributes, {'site': 'site_1'})
+        self.assertEqual(fetch_span.parent_id, retrieve_span.span_id)
+        self.assertEqual(fetch_span.trace_id, retrieve_span.trace_id)
+        self.assertIsNone(retrieve_span.parent_id)
+        self.assertEqual(retrieve_span.rows, 3)
+        self.assertGreaterEqual(retrieve_span.duration, fetch_span.duration)
+        self.assertIsNone(retrieve_span.peak_allocated_bytes)
+
+    @unittest.skipIf(not hasattr(tracemalloc, 'reset_peak'),
+        "tracemalloc cannot reset its peak before Python 3.9.")
+    def test_peak_allocation_is_recorded_while_tracing(self):
+
+        spans = []
+        instrumentation = Instrumentation(exporters=[spans.append],
+            trace_memory=True)
+        try:
+            with instrumentation.span('outer'):
+                with instrumentation.span('inner'):
+                    data = np.ones(1000000)
+                    del data
+        finally:
+            instrumentation.close()
+
+        inner_span, outer_span = spans
+        self.assertGreaterEqual(inner_span.peak_allocated_bytes, 8000000)
+        # The peak of the inner span is also the peak of the outer span:
+        self.assertGreaterEqual(outer_span.peak_allocated_bytes, 8000000)
+
+    def test_failed_span_is_exported_with_error(self):
+
+        spans = []
+        instrumentation = Instrumentation(exporters=[spans.append])
+
+        with self.assertRaises(ValueError):
+            with instrumentation.span('fetch'):
+                raise ValueError("Failure")
+
+        self.assertEqual(spans[0].error, 'ValueError')
+
+    def test_exporters(self):
+
+        json_report_exporter = JsonReportExporter()
+        with tempfile.TemporaryDirectory() as directory:
+            otlp_path = os.path.join(directory, 'traces.jsonl')
+            instrumentation = Instrumentation(exporters=[LoggingExporter(),
+                json_report_exporter, OtlpJsonExporter(otlp_path)])
+
+            with self.assertLogs(
+                'solar_data_pipeline.utilities.instrumentation') as logs:
+                with instrumentation.span('get'):
+                    for _ in range(2):
+                        with instrumentation.span('fetch') as span:
+                            span.add_rows(5)
+
+            with open(otlp_path) as file:
+                requests = [json.loads(line) for line in file]
+
+        self.assertEqual(len(logs.output), 3)
+        self.assertIn('fetch: ', logs.output[0])
+        stages = json_report_exporter.get_report()['stages']
+        self.assertEqual(stages['fetch']['count'], 2)
+        self.assertEqual(stages['fetch']['rows'], 10)
+        self.assertEqual(stages['get']['count'], 1)
+
+        self.assertEqual(len(requests), 3)
+        fetch_span = requests[0]['resourceSpans'][0]['scopeSpans'][0][
+            'spans'][0]
+        get_span = requests[2]['resourceSpans'][0]['scopeSpans'][0][
+            'spans'][0]
+        self.assertEqual(fetch_span['parentSpanId'], get_span['spanId'])
+        self.assertEqual(len(get_span['traceId']), 32)
+        self.assertNotIn('parentSpanId', get_span)
+        self.assertIn({'key': 'rows', 'value': {'intValue': '5'}},
+            fetch_span['attributes'])
+        self.assertLessEqual(int(fetch_span['startTimeUnixNano']),
+            int(fetch_span['endTimeUnixNano']))
+
+    def test_spans_are_not_recorded_without_exporters(self):
+
+        instrumentation = Instrumentation()
+
+        with instrumentation.span('fetch') as span:
+            span.add_data(np.zeros((288, 3)))
+
+        self.assertFalse(hasattr(span, 'rows'))
@@ -0,0 +1,39 @@
+import unittest
+import os
+import numpy as np
+from solar_data_pipeline.database.utilities.columnar import MeasurementColumns
+from solar_data_pipeline.utilities.parallel_transformation import\
+    ParallelTransformation
+from solar_data_pipeline.utilities.power_matrix import make_power_matrix
+
+class TestParallelTransformation(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_signals = np.loadtxt(file, delimiter=',')
+        values = power_signals[:, :30].ravel(order='F')
+        ts = 1546329600000 + np.arange(len(values)) * 5 * 60 * 1000
+        self._measurement_columns_list = [
+            MeasurementColumns('SLACA000000{}'.format(i), 'ac_power',
+                np.array(['b', 'a'] * (len(values) // 2), dtype=object),
+                ts, values * (i + 1)) for i in range(3)] + [
+            MeasurementColumns('SLACA0000004', 'ac_power',
+                np.array([], dtype=object), np.array([], dtype=np.int64),
+                np.array([]))]
+
+    def test_make_power_matrices(self):
+
+        with ParallelTransformation(number_of_workers=2) as transformation:
+            actual_power_matrices = transformation.make_power_matrices(
+                self._measurement_columns_list, localize_hours=-8)
+
+        self.assertEqual(len(actual_power_matrices), 4)
+        for measurement_columns, actual_power_matrix in zip(
+            self._measurement_columns_list, actual_power_matrices):
+            expected_power_matrix = make_power_matrix(measurement_columns.ts,
+                measurement_columns.meas_val_f,
+                sensors=measurement_columns.sensor, localize_hours=-8)
+            np.testing.assert_array_equal(actual_power_matrix,
+                expected_power_matrix)
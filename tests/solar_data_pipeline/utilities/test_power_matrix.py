@@ -0,0 +1,208 @@
+import unittest
+import os
+import numpy as np
+import pandas as pd
+from solar_data_pipeline.utilities.power_matrix import\
+    make_power_matrix, make_channel_matrices, interpolate_missing_values,\
+    zero_nighttime_values, get_first_day, PowerMatrixBuilder,\
+    MILLISECONDS_PER_DAY
+
+FIVE_MINUTES = 5 * 60 * 1000
+
+class TestPowerMatrix(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            self._power_signals = np.loadtxt(file, delimiter=',')
+
+    def _make_samples(self, power_matrix, first_day=17532):
+        """
+        Samples of the matrix with one partial day before and after it.
+        """
+        values = np.concatenate([np.full(144, 1.0),
+            power_matrix.ravel(order='F'), np.full(144, 1.0)])
+        timestamps = ((first_day - 1) * MILLISECONDS_PER_DAY +
+            144 * FIVE_MINUTES + np.arange(len(values)) * FIVE_MINUTES)
+        return timestamps, values
+
+    def test_make_power_matrix_reproduces_fixture(self):
+
+        timestamps, values = self._make_samples(self._power_signals)
+
+        actual_power_matrix = make_power_matrix(timestamps, values,
+            zero_nighttime=False, interp_missing=False)
+
+        np.testing.assert_array_equal(actual_power_matrix,
+            self._power_signals)
+
+    def test_make_power_matrix_drops_sentinel_and_duplicates(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :3])
+        values[300] = -999999.0
+        # Duplicate timestamp and sample off the time axis come last:
+        timestamps = np.concatenate([timestamps, [timestamps[301],
+            timestamps[302] + 1000]])
+        values = np.concatenate([values, [-1.0, -1.0]])
+
+        actual_power_matrix = make_power_matrix(timestamps, values,
+            zero_nighttime=False, interp_missing=False)
+
+        expected_power_matrix = self._power_signals[:, :3].copy()
+        expected_power_matrix[300 - 144, 0] = np.nan
+        np.testing.assert_array_equal(actual_power_matrix,
+            expected_power_matrix)
+
+    def test_make_power_matrix_selects_sensor_and_localizes(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :3])
+        sensors = np.full(len(values), 'b', dtype=object)
+        timestamps = np.concatenate([timestamps, timestamps[:10]])
+        values = np.concatenate([values, np.full(10, 5.0)])
+        sensors = np.concatenate([sensors, np.full(10, 'a', dtype=object)])
+
+        actual_power_matrix = make_power_matrix(
+            timestamps.astype('datetime64[ms]'), values, sensors=sensors,
+            localize_hours=-8, trim_start=False, trim_end=False,
+            zero_nighttime=False, interp_missing=False)
+
+        # Samples start at noon UTC, or at 4 AM local time:
+        flat_values = actual_power_matrix.ravel(order='F')
+        np.testing.assert_array_equal(flat_values[:48], np.nan)
+        np.testing.assert_array_equal(flat_values[48:192], 1.0)
+        np.testing.assert_array_equal(flat_values[192:192 + 288 * 3],
+            self._power_signals[:, :3].ravel(order='F'))
+
+    def test_get_first_day_skips_unused_samples(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :3])
+        # Missing values and another sensor with few values, a day earlier:
+        timestamps = np.concatenate([timestamps[:20] - MILLISECONDS_PER_DAY,
+            timestamps])
+        values = np.concatenate([np.full(10, np.nan), np.full(10, 1.0),
+            values])
+        sensors = np.array(['a'] * 20 + ['b'] * (len(values) - 20))
+
+        first_day = get_first_day(timestamps, values, sensors=sensors)
+
+        self.assertEqual(first_day, 17531)
+        self.assertEqual(make_power_matrix(timestamps, values,
+            sensors=sensors, first_day=first_day).shape,
+            make_power_matrix(timestamps, values, sensors=sensors).shape)
+        self.assertIsNone(get_first_day(timestamps[:10], values[:10]))
+
+    def test_make_channel_matrices_are_aligned(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :4])
+        sensors = np.where(np.arange(len(values)) % 5 == 0, 'b', 'a')
+        # Temperature starts one day later:
+        temperatures = np.linspace(-5, 20, len(values) - 144 - 288)
+        all_timestamps = np.concatenate([timestamps, timestamps[144 + 288:]])
+        all_values = np.concatenate([values, temperatures])
+        meas_names = np.array(['ac_power'] * len(values) +
+            ['temperature'] * len(temperatures), dtype=object)
+        all_sensors = np.concatenate([sensors,
+            np.full(len(temperatures), 't')])
+
+        actual_power_matrices = make_channel_matrices(all_timestamps,
+            all_values, meas_names, all_sensors, [('ac_power', None),
+            ('ac_power', 'b'), ('temperature', None)],
+            zero_nighttime=[True, True, False])
+
+        self.assertEqual(actual_power_matrices.shape, (288, 4, 3))
+        np.testing.assert_array_equal(actual_power_matrices[:, :, 0],
+            make_power_matrix(timestamps, values, sensors=sensors))
+        np.testing.assert_array_equal(actual_power_matrices[:, :, 1],
+            make_power_matrix(timestamps[sensors == 'b'],
+            values[sensors == 'b']))
+        # Temperature is on the same days, without values in the first day:
+        np.testing.assert_array_equal(actual_power_matrices[:, 0, 2], np.nan)
+        np.testing.assert_array_equal(
+            actual_power_matrices[:, 1:, 2].ravel(order='F'),
+            temperatures[:288 * 3])
+
+    def test_make_channel_matrices_of_mixed_cadences(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :4])
+        # One-minute irradiance from one minute before the first sample of
+        # power, thus off the phase of its 5-minute grid:
+        irradiance_timestamps = (timestamps[0] - FIVE_MINUTES // 5 +
+            np.arange(len(timestamps) * 5) * (FIVE_MINUTES // 5))
+        irradiances = np.linspace(0, 1000, len(irradiance_timestamps))
+        meas_names = np.array(['ac_power'] * len(values) +
+            ['irradiance'] * len(irradiances), dtype=object)
+
+        actual_power_matrices = make_channel_matrices(
+            np.concatenate([timestamps, irradiance_timestamps]),
+            np.concatenate([values, irradiances]), meas_names,
+            np.full(len(meas_names), 'a'), [('ac_power', None),
+            ('irradiance', None)],
+            zero_nighttime=[True, False])
+
+        np.testing.assert_array_equal(actual_power_matrices[:, :, 0],
+            make_power_matrix(timestamps, values))
+        np.testing.assert_array_equal(actual_power_matrices[:, :, 1],
+            make_power_matrix(irradiance_timestamps, irradiances,
+            zero_nighttime=False))
+
+    def test_power_matrix_builder_matches_make_power_matrix(self):
+
+        timestamps, values = self._make_samples(self._power_signals[:, :5])
+        values[300] = -999999.0
+        values[400] = np.nan
+        # Duplicate timestamp and sample off the time axis in later pages:
+        timestamps = np.concatenate([timestamps, [timestamps[301],
+            timestamps[302] + 1000]])
+        values = np.concatenate([values, [-1.0, -1.0]])
+        expected_power_matrix = make_power_matrix(timestamps, values,
+            sensors=np.zeros(len(values)), localize_hours=-8)
+
+        builder = PowerMatrixBuilder(localize_hours=-8)
+        for start in range(0, len(values), 77):
+            builder.append(timestamps[start:start + 77],
+                values[start:start + 77])
+
+        np.testing.assert_array_equal(builder.power_matrix(),
+            expected_power_matrix)
+
+    def test_power_matrix_builder_filters_short_signals(self):
+
+        builder = PowerMatrixBuilder()
+        builder.append(np.arange(200) * FIVE_MINUTES, np.ones(200))
+
+        self.assertEqual(builder.power_matrix().shape, (288, 0))
+
+    def test_interpolate_missing_values(self):
+
+        random_state = np.random.RandomState(0)
+        power_matrix = random_state.rand(20, 6)
+        power_matrix[random_state.rand(20, 6) < 0.3] = np.nan
+        power_matrix[:, 4] = np.nan
+        power_matrix[:3, 5] = np.nan
+        expected_power_matrix = pd.DataFrame(power_matrix).interpolate().values
+
+        interpolate_missing_values(power_matrix)
+
+        np.testing.assert_allclose(power_matrix, expected_power_matrix)
+
+    def test_zero_nighttime_values(self):
+
+        power_matrix = np.array([
+            [0.0, 0.0, np.nan],
+            [0.0, 1.0, np.nan],
+            [2.0, 4.0, np.nan],
+            [3.0, 2.0, np.nan],
+            [0.0, 1.0, np.nan],
+            [0.0, 0.0, np.nan]])
+
+        zero_nighttime_values(power_matrix)
+
+        # Values next to the first and last values are left missing:
+        np.testing.assert_array_equal(power_matrix, [
+            [0.0, np.nan, 0.0],
+            [np.nan, 1.0, 0.0],
+            [2.0, 4.0, 0.0],
+            [3.0, 2.0, 0.0],
+            [np.nan, 1.0, 0.0],
+            [0.0, np.nan, 0.0]])
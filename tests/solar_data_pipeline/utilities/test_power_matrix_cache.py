@@ -0,0 +1,98 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix_cache import PowerMatrixCache
+from solar_data_pipeline.utilities.data_trainsformation import\
+    SimpleDataTransformation
+
+class TestPowerMatrixCache(unittest.TestCase):
+
+    def setUp(self):
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._directory = self._temporary_directory.name
+        self._data_transformation = SimpleDataTransformation()
+        self._power_matrix = np.arange(288 * 3, dtype=float).reshape(288, 3)
+        self._start_time = datetime(2019, 1, 1)
+        self._end_time = datetime(2019, 1, 3, 23, 55)
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def test_get_returns_memory_mapped_power_matrix(self):
+
+        cache = PowerMatrixCache(self._directory)
+        cache.put('site_1', self._start_time, self._end_time,
+            self._data_transformation, self._power_matrix)
+
+        actual_power_matrix = cache.get('site_1', self._start_time,
+            self._end_time, self._data_transformation)
+
+        self.assertIsInstance(actual_power_matrix, np.memmap)
+        np.testing.assert_array_equal(actual_power_matrix, self._power_matrix)
+        self.assertIsNone(cache.get('site_1', None, None,
+            self._data_transformation))
+        self.assertIsNone(cache.get('site_2', self._start_time,
+            self._end_time, self._data_transformation))
+
+    def test_get_misses_after_transformation_version_changes(self):
+
+        cache = PowerMatrixCache(self._directory)
+        cache.put('site_1', None, None, self._data_transformation,
+            self._power_matrix)
+
+        self._data_transformation.version = 2
+
+        self.assertIsNone(cache.get('site_1', None, None,
+            self._data_transformation))
+
+    def test_put_evicts_least_recently_used(self):
+
+        max_bytes = self._power_matrix.nbytes * 2 + 1000
+        cache = PowerMatrixCache(self._directory, max_bytes=max_bytes)
+        for site in ['site_1', 'site_2']:
+            cache.put(site, None, None, self._data_transformation,
+                self._power_matrix)
+        self._set_last_use('site_1', 100)
+        self._set_last_use('site_2', 50)
+        cache.get('site_1', None, None, self._data_transformation)
+
+        cache.put('site_3', None, None, self._data_transformation,
+            self._power_matrix)
+
+        self.assertIsNone(cache.get('site_2', None, None,
+            self._data_transformation))
+        self.assertIsNotNone(cache.get('site_1', None, None,
+            self._data_transformation))
+        self.assertLessEqual(cache.size(), max_bytes)
+
+    def test_invalidate_removes_overlapping_time_ranges(self):
+
+        cache = PowerMatrixCache(self._directory)
+        cache.put('site_1', self._start_time, self._end_time,
+            self._data_transformation, self._power_matrix)
+        cache.put('site_1', datetime(2019, 2, 1), datetime(2019, 2, 3),
+            self._data_transformation, self._power_matrix)
+        cache.put('site_1', None, None, self._data_transformation,
+            self._power_matrix)
+        cache.put('site_2', self._start_time, self._end_time,
+            self._data_transformation, self._power_matrix)
+
+        number_of_removed_entries = cache.invalidate('site_1',
+            start_time=datetime(2019, 1, 2), end_time=datetime(2019, 1, 10))
+
+        self.assertEqual(number_of_removed_entries, 2)
+        self.assertIsNone(cache.get('site_1', self._start_time,
+            self._end_time, self._data_transformation))
+        self.assertIsNone(cache.get('site_1', None, None,
+            self._data_transformation))
+        self.assertIsNotNone(cache.get('site_1', datetime(2019, 2, 1),
+            datetime(2019, 2, 3), self._data_transformation))
+        self.assertIsNotNone(cache.get('site_2', self._start_time,
+            self._end_time, self._data_transformation))
+
+    def _set_last_use(self, site, time):
+        file_path = PowerMatrixCache(self._directory)._get_file_path(site,
+            None, None, self._data_transformation)
+        os.utime(file_path + '.npy', (time, time))
@@ -0,0 +1,88 @@
+import unittest
+import os
+import tempfile
+from datetime import date
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix_dataset import\
+    write_power_matrix, read_power_matrices
+
+try:
+    import pyarrow
+    PYARROW_IS_INSTALLED = True
+except ImportError:
+    PYARROW_IS_INSTALLED = False
+
+@unittest.skipIf(not PYARROW_IS_INSTALLED, "pyarrow is not installed.")
+class TestPowerMatrixDataset(unittest.TestCase):
+
+    def setUp(self):
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            self._power_signals = np.loadtxt(file, delimiter=',')
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._directory = self._temporary_directory.name
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def _write(self, file_format):
+        write_power_matrix(self._directory, "SLACA/0001",
+            self._power_signals[:, :100], first_date=date(2019, 1, 1),
+            time_shifts=np.arange(100), file_format=file_format)
+        write_power_matrix(self._directory, "1002",
+            self._power_signals[:, 100:150], file_format=file_format)
+
+    def test_parquet(self):
+
+        self._write('parquet')
+
+        actual_data = read_power_matrices(self._directory)
+
+        self.assertEqual(sorted(actual_data.keys()), ["1002", "SLACA/0001"])
+        np.testing.assert_array_equal(actual_data["SLACA/0001"].power_matrix,
+            self._power_signals[:, :100])
+        np.testing.assert_array_equal(actual_data["1002"].power_matrix,
+            self._power_signals[:, 100:150])
+        self.assertEqual(actual_data["1002"].sampling_interval_minutes, 5)
+        np.testing.assert_array_equal(actual_data["1002"].time_shifts, -1)
+        self.assertTrue(np.all(np.isnat(actual_data["1002"].dates)))
+
+    def test_parquet_with_predicates(self):
+
+        self._write('parquet')
+
+        actual_data = read_power_matrices(self._directory,
+            sites=["SLACA/0001"], start_date=date(2019, 2, 1),
+            end_date=date(2019, 2, 10))
+
+        self.assertEqual(list(actual_data.keys()), ["SLACA/0001"])
+        site_data = actual_data["SLACA/0001"]
+        np.testing.assert_array_equal(site_data.power_matrix,
+            self._power_signals[:, 31:41])
+        np.testing.assert_array_equal(site_data.day_indices, np.arange(31, 41))
+        np.testing.assert_array_equal(site_data.time_shifts, np.arange(31, 41))
+        self.assertEqual(site_data.dates[0], np.datetime64('2019-02-01'))
+
+    def test_arrow_is_memory_mapped(self):
+
+        self._write('arrow')
+
+        actual_data = read_power_matrices(self._directory, sites=["1002"],
+            file_format='arrow')
+
+        power_matrix = actual_data["1002"].power_matrix
+        np.testing.assert_array_equal(power_matrix,
+            self._power_signals[:, 100:150])
+        self.assertFalse(power_matrix.flags.owndata)
+        self.assertFalse(power_matrix.flags.writeable)
+
+    def test_partition_is_replaced(self):
+
+        self._write('parquet')
+        write_power_matrix(self._directory, "1002",
+            self._power_signals[:, :3])
+
+        actual_data = read_power_matrices(self._directory, sites=["1002"])
+
+        self.assertEqual(actual_data["1002"].power_matrix.shape, (288, 3))
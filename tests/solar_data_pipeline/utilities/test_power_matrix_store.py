@@ -0,0 +1,34 @@
+import unittest
+import tempfile
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix_store import PowerMatrixStore
+
+class TestPowerMatrixStore(unittest.TestCase):
+
+    def setUp(self):
+        self._temporary_directory = tempfile.TemporaryDirectory()
+        self._power_matrix = np.arange(288 * 5, dtype=float).reshape(288, 5)
+
+    def tearDown(self):
+        self._temporary_directory.cleanup()
+
+    def test_append(self):
+
+        store = PowerMatrixStore(self._temporary_directory.name)
+        store.append('site/1', self._power_matrix[:, :3], 100, 1000)
+        store.append('site/1', self._power_matrix[:, 3:], 103, 2000)
+
+        np.testing.assert_array_equal(store.get('site/1'),
+            self._power_matrix)
+        self.assertEqual(store.get_metadata('site/1'),
+            {'number_of_days': 5, 'first_day': 100, 'high_water_mark': 2000})
+        self.assertIsNone(store.get('site/2'))
+
+    def test_append_requires_following_day(self):
+
+        store = PowerMatrixStore(self._temporary_directory.name)
+        store.append('site_1', self._power_matrix[:, :3], 100, 1000)
+
+        with self.assertRaises(ValueError):
+            store.append('site_1', self._power_matrix[:, 3:], 104, 2000)
+        self.assertEqual(store.get('site_1').shape, (288, 3))
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from solar_data_pipeline.utilities.power_matrix import SENTINEL_VALUE,\
+    MILLISECONDS_PER_DAY
+from solar_data_pipeline.utilities.quality import score_days,\
+    QualityThresholds
+
+class TestQuality(unittest.TestCase):
+
+    def setUp(self):
+        # Three days from local midnight of day 100, with a clear sky shape:
+        self._timestamps = (100 * MILLISECONDS_PER_DAY +
+            np.arange(288 * 3) * 5 * 60 * 1000)
+        self._values = np.tile(np.maximum(np.sin(
+            np.linspace(0, 2 * np.pi, 288)), 0), 3) * 10
+
+    def test_score_days(self):
+
+        values = self._values.copy()
+        # Half of second day missing:
+        values[288:288 + 144] = SENTINEL_VALUE
+        # Third day clipped by an inverter:
+        values[576:] = np.minimum(values[576:], 7.0)
+
+        actual_scores = score_days(self._timestamps, values)
+
+        np.testing.assert_array_equal(actual_scores['day'], [100, 101, 102])
+        np.testing.assert_array_almost_equal(actual_scores['completeness'],
+            [1.0, 0.5, 1.0])
+        np.testing.assert_array_almost_equal(
+            actual_scores['sentinel_fraction'], [0.0, 0.5, 0.0])
+        self.assertGreater(actual_scores['clipping_fraction'][2],
+            actual_scores['clipping_fraction'][0])
+        self.assertEqual(actual_scores['clipping_fraction'][1], 0.0)
+
+    def test_score_days_with_localize_hours_and_missing_rows(self):
+
+        actual_scores = score_days(self._timestamps[::2], self._values[::2],
+            localize_hours=-8)
+
+        np.testing.assert_array_equal(actual_scores['day'],
+            [99, 100, 101, 102])
+        np.testing.assert_array_almost_equal(
+            actual_scores['completeness'], [1 / 6, 0.5, 0.5, 1 / 3])
+
+    def test_select_days(self):
+
+        scores = {'completeness': np.array([1.0, 0.5, 1.0]),
+            'sentinel_fraction': np.array([0.0, 0.5, 0.0]),
+            'clipping_fraction': np.array([0.0, 0.0, 0.3])}
+
+        quality_thresholds = QualityThresholds(min_completeness=0.9,
+            max_clipping_fraction=0.2)
+
+        np.testing.assert_array_equal(quality_thresholds.select_days(scores),
+            [True, False, False])
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+from solar_data_pipeline.utilities.sampling import get_random_generator,\
+    repeat_sources, choose_sources, gather_columns, SampleSpecification,\
+    DAYS_STREAM
+
+class TestSampling(unittest.TestCase):
+
+    def test_repeat_sources(self):
+
+        np.testing.assert_array_equal(repeat_sources([2, 0, 3]),
+            [0, 0, 2, 2, 2])
+
+    def test_choose_sources_is_reproducible_with_seed(self):
+
+        source_indices = repeat_sources([500, 500])
+
+        sample_1 = choose_sources(source_indices, 1000,
+            get_random_generator(7))
+        sample_2 = choose_sources(source_indices, 1000,
+            get_random_generator(7))
+
+        np.testing.assert_array_equal(sample_1, sample_2)
+        self.assertEqual(np.sum(sample_1 == 0), 500)
+
+    def test_gather_columns(self):
+
+        source_1 = np.arange(12, dtype=float).reshape(3, 4)
+        source_2 = -np.arange(12, dtype=float).reshape(3, 4)
+        source_indices = np.array([1, 0, 0, 1])
+
+        actual = gather_columns([source_1, source_2], source_indices)
+
+        expected = np.array([source_2[:, 0], source_1[:, 1], source_1[:, 2],
+            source_2[:, 3]]).T
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_gather_columns_with_column_indices_into_output(self):
+
+        source_1 = np.arange(12, dtype=float).reshape(3, 4)
+        source_2 = -np.arange(12, dtype=float).reshape(3, 4)
+        output = np.zeros((3, 2))
+
+        actual = gather_columns([source_1, source_2], np.array([1, 0]),
+            column_indices=np.array([3, 3]), out=output)
+
+        self.assertIs(actual, output)
+        np.testing.assert_array_equal(output,
+            np.array([source_2[:, 3], source_1[:, 3]]).T)
+
+    def test_equal_sample_specifications_have_same_key(self):
+
+        specification = SampleSpecification(5, sites=['site_1', 'site_2'],
+            partition_ratio={'file': 0.5, 'cassandra': 0.5})
+        same_specification = SampleSpecification(5,
+            sites=('site_1', 'site_2'),
+            partition_ratio={'cassandra': 0.5, 'file': 0.5})
+
+        self.assertEqual(specification, same_specification)
+        self.assertEqual(len({specification, same_specification}), 1)
+        self.assertEqual(specification.get_key(),
+            same_specification.get_key())
+        self.assertNotEqual(specification.get_key(),
+            SampleSpecification(6, sites=['site_1', 'site_2'],
+            partition_ratio={'file': 0.5, 'cassandra': 0.5}).get_key())
+
+    def test_streams_of_sample_specification(self):
+
+        specification = SampleSpecification(5, number_of_sites=5)
+
+        draws = [specification.make_random_generator(DAYS_STREAM,
+            position).random(4) for position in range(2)]
+
+        np.testing.assert_array_equal(draws[0],
+            specification.make_random_generator(DAYS_STREAM, 0).random(4))
+        self.assertFalse(np.any(draws[0] == draws[1]))
+        np.testing.assert_array_equal(specification.get_shard(1, 2), [1, 3])
+        with self.assertRaises(ValueError):
+            specification.get_shard(2, 2)
@@ -0,0 +1,119 @@
+import unittest
+import os
+import numpy as np
+from solar_data_pipeline.utilities.time_shifts import fix_time_shifts,\
+    estimate_solar_noon, find_rolls
+
+try:
+    from solardatatools.data_transforms import fix_time_shifts as\
+        fix_time_shifts_of_solar_data_tools
+    _HAS_SOLAR_DATA_TOOLS = True
+except ImportError:
+    _HAS_SOLAR_DATA_TOOLS = False
+
+class TestTimeShifts(unittest.TestCase):
+
+    def setUp(self):
+        # One year of clear and cloudy days, with solar noon at 12:00:
+        random_state = np.random.RandomState(0)
+        hours = np.arange(288) / 12
+        widths = 3 + np.sin(2 * np.pi * (np.arange(365) - 80) / 365)
+        self._power_matrix = 5 * np.clip(np.cos(
+            (hours[:, np.newaxis] - 12) / widths * np.pi / 4), 0, None)
+        is_cloudy = random_state.rand(365) < 0.5
+        self._power_matrix[:, is_cloudy] *= random_state.rand(288,
+            np.sum(is_cloudy))
+
+    def test_matrix_without_shift_is_not_changed(self):
+
+        fixed_power_matrix, index_set = fix_time_shifts(self._power_matrix,
+            return_ixs=True)
+
+        self.assertIs(fixed_power_matrix, self._power_matrix)
+        self.assertEqual(len(index_set), 0)
+
+    def test_daylight_saving_time_is_fixed(self):
+
+        shifted_power_matrix = self._power_matrix.copy()
+        shifted_power_matrix[:, 70:308] = np.roll(
+            self._power_matrix[:, 70:308], -12, axis=0)
+
+        fixed_power_matrix, index_set = fix_time_shifts(shifted_power_matrix,
+            return_ixs=True)
+
+        self.assertEqual(len(index_set), 2)
+        np.testing.assert_allclose(index_set, [70, 308], atol=3)
+        is_fixed = np.all(fixed_power_matrix == self._power_matrix, axis=0)
+        self.assertGreater(np.mean(is_fixed), 0.98)
+
+    def test_reset_of_clock_is_fixed(self):
+
+        shifted_power_matrix = self._power_matrix.copy()
+        shifted_power_matrix[:, 200:] = np.roll(
+            self._power_matrix[:, 200:], 6, axis=0)
+
+        fixed_power_matrix, index_set = fix_time_shifts(shifted_power_matrix,
+            return_ixs=True)
+
+        np.testing.assert_allclose(index_set, [200], atol=3)
+        is_fixed = np.all(fixed_power_matrix == self._power_matrix, axis=0)
+        self.assertGreater(np.mean(is_fixed), 0.98)
+
+    def test_find_rolls(self):
+
+        shifted_power_matrix = self._power_matrix.copy()
+        shifted_power_matrix[:, 70:308] = np.roll(
+            self._power_matrix[:, 70:308], -12, axis=0)
+        fixed_power_matrix, index_set = fix_time_shifts(shifted_power_matrix,
+            return_ixs=True)
+
+        rolls = find_rolls(shifted_power_matrix, fixed_power_matrix,
+            index_set)
+
+        np.testing.assert_array_equal(rolls[:index_set[0]], 0)
+        np.testing.assert_array_equal(rolls[index_set[0]:index_set[1]], 12)
+        np.testing.assert_array_equal(rolls[index_set[1]:], 0)
+
+    def test_estimate_solar_noon(self):
+
+        solar_noon = estimate_solar_noon(np.roll(self._power_matrix[:, :3],
+            -12, axis=0))
+
+        np.testing.assert_allclose(solar_noon, 11, atol=0.1)
+
+    def test_unknown_mode_is_rejected(self):
+
+        with self.assertRaises(ValueError):
+            fix_time_shifts(self._power_matrix, mode='exact')
+
+    @unittest.skipUnless(_HAS_SOLAR_DATA_TOOLS,
+        "solar-data-tools is not importable")
+    def test_matrix_is_fixed_as_solar_data_tools_fixes_it(self):
+
+        file_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+            "../../fixtures/one_year_power_signals_1.csv"))
+        with open(file_path) as file:
+            power_matrix = np.loadtxt(file, delimiter=',')
+        shifted_power_matrix = power_matrix.copy()
+        shifted_power_matrix[:, 70:308] = np.roll(power_matrix[:, 70:308],
+            -12, axis=0)
+
+        for matrix in (power_matrix, shifted_power_matrix):
+            fixed_power_matrix, index_set = fix_time_shifts(matrix,
+                return_ixs=True)
+            expected_power_matrix, expected_index_set =\
+                fix_time_shifts_of_solar_data_tools(matrix, return_ixs=True)
+
+            # Each shift found by solar-data-tools is found within a window:
+            for expected_index in expected_index_set:
+                self.assertLessEqual(np.min(np.abs(
+                    index_set - expected_index)), 15)
+            # Days are rolled as solar-data-tools rolls them, except days
+            # between the shifts found by either correction:
+            self.assertEqual(fixed_power_matrix.shape,
+                expected_power_matrix.shape)
+            is_same = np.all(np.isclose(fixed_power_matrix,
+                expected_power_matrix, atol=1e-6), axis=0)
+            self.assertGreater(np.mean(is_same), 0.95)
+            np.testing.assert_allclose(np.sum(fixed_power_matrix, axis=0),
+                np.sum(expected_power_matrix, axis=0), rtol=1e-6)